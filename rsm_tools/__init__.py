@@ -0,0 +1,9 @@
+"""
+Purpose:
+Shared helpers for the RS Metrics weekly signal and balancing scripts (weekly-signal-generation.py,
+user_script_balance.py and statistical-balancing-multithreaded.py).
+
+The scripts themselves are hyphenated/stand-alone and cannot import each other, so anything that more than
+one of them needs lives in this package. Like the balancing classes, this package is assumed to sit in the
+same directory as the script that imports it.
+"""
@@ -0,0 +1,185 @@
+"""
+Purpose:
+Batch mode of user_script_balance.py: type-balance many (ticker, start date, window) combinations in one run instead
+of one interactive run per combination.
+
+A job file (.csv or .xlsx) holds one job per row with the columns of job_columns, i.e. the answers to the prompts
+of the interactive mode:
+    ticker, start_date (M/D/YYYY or YYYY-MM-DD), wk_window, wk_window_u_limit, l_bound, u_bound
+
+The weekly reports are listed once and parsed once into the report_store cache by the parent process (see
+report_store.py); the jobs are then fanned out to a process pool whose workers only memory-map the cached reports.
+The balanced samples of all jobs are collated into a single table, each row prefixed by its job number and job
+columns. A job that fails (e.g. a ticker without reports in its window) does not stop the batch: it is reported in
+a separate table of failed jobs with the error message.
+
+Usage:
+    python user_script_balance.py <report directory> <job file> --workers 4 --output balanced.csv
+"""
+
+##############################################################
+# Imports:                                                   #
+##############################################################
+
+import os
+import sys
+import argparse
+import importlib
+import multiprocessing
+
+import pandas as pd
+
+from rsm_tools import ticker_pool
+from rsm_tools import report_index
+from rsm_tools import report_loader
+from rsm_tools.report_store import report_store
+
+##############################################################
+# Parameters                                                 #
+##############################################################
+
+# the columns of a job file, in the order of the interactive prompts
+job_columns = ['ticker', 'start_date', 'wk_window', 'wk_window_u_limit', 'l_bound', 'u_bound']
+# module name under which the workers load user_script_balance.py
+worker_module = "rsm_balance_worker"
+# the balancing module that the interactive mode imports from the report directory
+balance_module_name = "class_Wk_Type_Balance_client"
+default_output = "Type_Balanced_Batch.csv"
+
+# (script module, balancing module, report_store, report_index) of a worker process (see _init_worker)
+_worker = None
+
+##############################################################
+# Non-class Methods                                          #
+##############################################################
+
+def read_jobs(path):
+    """
+    Purpose: read a job file
+    :param path: a .csv or .xlsx file with the columns of job_columns (other columns are ignored)
+    :return: a list of job dictionaries; start dates are normalized to M/D/YYYY
+    """
+    if os.path.splitext(path)[1] == ".xlsx":
+        frame = pd.read_excel(path)
+    else:
+        frame = pd.read_csv(path, dtype={'ticker': str, 'start_date': str})
+    missing = [name for name in job_columns if name not in frame.columns]
+    if missing:
+        raise ValueError("job file {} is missing the columns {}".format(path, missing))
+    jobs = []
+    for row in frame[job_columns].itertuples(index=False):
+        job = dict(zip(job_columns, row))
+        job['ticker'] = str(job['ticker']).strip()
+        start = pd.Timestamp(job['start_date'])
+        job['start_date'] = "{}/{}/{}".format(start.month, start.day, start.year)
+        for name in job_columns[2:]:
+            job[name] = int(job[name])
+        jobs.append(job)
+    return jobs
+
+#-------------------------------
+
+def _init_worker(script_path, directory):
+    global _worker
+    module = ticker_pool.load_script(script_path, worker_module)
+    # the balancing module lives in the report directory (see the interactive mode)
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    balance_module = importlib.import_module(balance_module_name)
+    store = report_store(directory, module.gen_data, report_loader.balancing_cache_dir(directory))
+    wk_index = report_index.from_directory(directory, module.input_prefix, ".csv")
+    _worker = (module, balance_module, store, wk_index)
+
+#-------------------------------
+
+def _balance_job(numbered_job):
+    n, job = numbered_job
+    module, balance_module, store, wk_index = _worker
+    try:
+        pooled_wk_rep, start_date_raw = module.pool_window(store, wk_index, job['ticker'], job['start_date'],
+                                                           job['wk_window'], job['wk_window_u_limit'],
+                                                           job['l_bound'], job['u_bound'])
+        balanced = module.sampledf(module.type_balance_window(balance_module, pooled_wk_rep))
+    except Exception as e:
+        return n, None, "{}: {}".format(type(e).__name__, e)
+    return n, balanced, None
+
+#-------------------------------
+
+def balance_jobs(script_path, directory, jobs, workers=1):
+    """
+    Purpose: run the type balancing of every job
+    :param script_path: full path of user_script_balance.py
+    :param directory: the directory of the weekly reports (and of class_Wk_Type_Balance_client.py)
+    :param jobs: a list of job dictionaries (see read_jobs())
+    :param workers: the number of worker processes (1: run in this process)
+    :return: (balanced, failed): a pd df with the balanced samples of all jobs, prefixed by the columns 'job' and
+    job_columns, and a pd df of the failed jobs with their 'error'
+    """
+    # (1) parse every report once, so that the workers only memory-map the cache
+    module = ticker_pool.load_script(script_path, worker_module)
+    wk_index = report_index.from_directory(directory, module.input_prefix, ".csv")
+    report_store(directory, module.gen_data, report_loader.balancing_cache_dir(directory)).warm(wk_index.reports)
+
+    # (2) balance the jobs
+    numbered = list(enumerate(jobs))
+    if workers > 1 and len(jobs) > 1:
+        pool = multiprocessing.Pool(processes=min(workers, len(jobs)), initializer=_init_worker,
+                                    initargs=(script_path, directory))
+        try:
+            results = list(pool.imap_unordered(_balance_job, numbered))
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+    else:
+        _init_worker(script_path, directory)
+        results = [_balance_job(job) for job in numbered]
+
+    # (3) collate, in job order
+    frames = []
+    failed = []
+    for n, balanced, error in sorted(results, key=lambda result: result[0]):
+        if error is not None:
+            failed.append(dict(jobs[n], job=n, error=error))
+            continue
+        balanced = balanced.reset_index(drop=True)
+        for position, name in enumerate(['job'] + job_columns):
+            balanced.insert(position, name, n if name == 'job' else jobs[n][name])
+        frames.append(balanced)
+    if frames:
+        balanced = pd.concat(frames, ignore_index=True)
+    else:
+        balanced = pd.DataFrame([], columns=['job'] + job_columns)
+    failed = pd.DataFrame(failed, columns=['job'] + job_columns + ['error'])
+    return balanced, failed
+
+#-------------------------------
+
+def main(script_path, argv=None):
+    parser = argparse.ArgumentParser(description="Type-balance a batch of (ticker, start date, window) jobs")
+    parser.add_argument("directory", help="directory of the weekly reports and class_Wk_Type_Balance_client.py")
+    parser.add_argument("jobs", help="job file (.csv or .xlsx) with the columns " + ", ".join(job_columns))
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(),
+                        help="number of worker processes (default: the number of cores)")
+    parser.add_argument("--output", default=None,
+                        help="output .csv (default: <directory>/" + default_output + ")")
+    args = parser.parse_args(argv)
+
+    directory = os.path.abspath(args.directory.replace("\"", ""))
+    output = args.output or os.path.join(directory, default_output)
+    jobs = read_jobs(args.jobs)
+    balanced, failed = balance_jobs(script_path, directory, jobs, args.workers)
+
+    balanced.to_csv(output, index=False)
+    print("{} of {} jobs balanced ({} rows): {}".format(len(jobs) - len(failed), len(jobs), len(balanced), output))
+    if len(failed) > 0:
+        failed_path = os.path.splitext(output)[0] + "_failed.csv"
+        failed.to_csv(failed_path, index=False)
+        print("{} jobs failed: {}".format(len(failed), failed_path))
+    return balanced, failed
+
+# END MODULE
+# -------------------------------------------------------------
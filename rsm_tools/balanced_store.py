@@ -0,0 +1,281 @@
+"""
+Purpose:
+Columnar store of the balanced datasets of statistical-balancing-multithreaded.py, one compressed file per report:
+
+    <working directory>/<report name>_Balanced.npz
+
+Every model used to copy its balanced sample into a DataFrame, drop the 'index' column and write a full csv
+(<report name>_<dataset>.csv), i.e. dozens of csvs per report that mostly hold the same columns for different row
+subsets. The balancing classes sample rows of the report, and the 'index' field of a sample is the row number of the
+source report (see report_loader.index_field). A balanced dataset is therefore stored as a selection over the
+source report:
+- rows: the source rows of the sample (the 'index' column), in sample order
+- the output columns, in csv order; a column whose values are those of the source rows is not stored, only the
+  columns that differ from the source (or that the source does not have) are
+
+The 'index' values cannot tell a sample of the report from a re-indexed dataset (e.g. the ZUM_* input of some
+hybrids, renumbered from 0): both hold row numbers of the report. A re-indexed dataset is therefore stored as a
+selection too, and what keeps it exact is the comparison of every column with the source rows: a column whose values
+differ is stored. Only a dataset whose 'index' column is not a row number of the report at all keeps all of its
+columns. Stored text columns are written as fixed-width strings ('' for missing values), so that the file never
+needs pickling; this is what the csv would hold anyway.
+
+update() only buffers the datasets of a model; flush() writes the store file, once per report (see the driver).
+
+The csv files are materialized on demand, from the store and the source report:
+
+    python -m rsm_tools.balanced_store "<report directory>/<report name>" [dataset ...] [--output <directory>]
+
+The store keeps the fingerprint of its source report (see checkpoint_store.fingerprint()). If the report changes,
+the datasets of the old version are dropped the next time the store is opened.
+"""
+
+##############################################################
+# Imports:                                                   #
+##############################################################
+
+import os
+import sys
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from rsm_tools import report_loader
+from rsm_tools import frame_views
+from rsm_tools import checkpoint_store
+from rsm_tools.report_store import _replace_file
+
+##############################################################
+# Parameters                                                 #
+##############################################################
+
+# bump this whenever the layout of the store files changes
+store_version = 1
+# suffix of the store file of a report
+store_suffix = "_Balanced.npz"
+# the column of a balanced sample that holds the source row numbers
+rows_column = report_loader.index_field
+
+_version_key = "__version__"
+_source_key = "__source__"
+
+try:
+    _string_types = basestring
+except NameError:       # python 3
+    _string_types = str
+
+##############################################################
+# Non-class Methods                                          #
+##############################################################
+
+def store_path(directory, report_name):
+    """
+    :return: the path of the store file of a report
+    """
+    return os.path.join(directory, os.path.splitext(report_name)[0] + store_suffix)
+
+#-------------------------------
+
+def load_source(path):
+    """
+    Purpose: read a source report the way gen_data() of statistical-balancing-multithreaded.py does
+    :param path: full path of the report
+    :return: a np record array
+    """
+    directory, name = os.path.split(path)
+    return report_loader.load_report(name, directory, columns=None, parse_notes=False)
+
+#-------------------------------
+
+def _text(values):
+    return values.dtype.kind in 'SUO'
+
+#-------------------------------
+
+def _same(values, source):
+    """
+    Purpose: True if a column of a sample holds the values of the source rows and would be written to csv the same way
+    """
+    if _text(source):
+        if not _text(values) or (values.dtype.kind == 'O' and
+                                 not all(isinstance(value, _string_types) for value in values)):
+            return False
+        try:
+            return np.array_equal(values.astype(str), source.astype(str))
+        except UnicodeError:
+            return False
+    if values.dtype.kind != source.dtype.kind:
+        # e.g. int64 -> float64 changes the csv text (5 -> 5.0)
+        return False
+    if values.dtype.kind in 'fc':
+        same = (values == source) | (np.isnan(values) & np.isnan(source))
+        return bool(np.all(same))
+    return np.array_equal(values, source)
+
+#-------------------------------
+
+def _stored_column(values):
+    # a column that np.savez stores without pickling (see report_loader._sidecar_column())
+    if values.dtype.kind != 'O':
+        return values
+    return np.array(['' if pd.isnull(value) else report_loader._text_value(value) for value in values], dtype=str)
+
+#-------------------------------
+
+def _source_rows(frame, source):
+    """
+    :return: the source rows of a sample (its rows_column), or None if the column does not hold row numbers of the
+    source (see the module docstring)
+    """
+    if rows_column not in frame_views.field_names(frame):
+        return None
+    rows = frame_views.column(frame, rows_column)
+    if rows.dtype.kind not in 'iu' or (len(rows) > 0 and (rows.min() < 0 or rows.max() >= len(source))):
+        return None
+    return rows.astype(np.int64)
+
+#-------------------------------
+
+def selection(frame, source, columns=None):
+    """
+    Purpose: express a balanced sample as a selection over its source report (see the module docstring)
+    :param frame: the balanced sample (a pd df or a np rec array)
+    :param source: the source report (a np record array, see load_source())
+    :param columns: (optional) the output columns, in csv order. Defaults to every column of frame
+    :return: a dictionary with the 'rows' (None: every column is stored), the output 'columns' and the 'stored'
+    columns {name: values}
+    """
+    columns = list(columns if columns is not None else frame_views.field_names(frame))
+    rows = _source_rows(frame, source)
+    fields = source.dtype.names
+    stored = {}
+    for column in columns:
+        name = str(column)
+        values = frame_views.column(frame, column)
+        if rows is None or name not in fields or not _same(values, np.asarray(source[name])[rows]):
+            stored[name] = _stored_column(values)
+    return {'rows': rows, 'columns': [str(column) for column in columns], 'stored': stored}
+
+#-------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write the balanced datasets of a report as csv files")
+    parser.add_argument("report", help="path of the source report")
+    parser.add_argument("datasets", nargs="*", help="the datasets to write (default: all)")
+    parser.add_argument("--output", default=None, help="output directory (default: the report directory)")
+    args = parser.parse_args(argv)
+
+    report = args.report.replace("\"", "")
+    directory, report_name = os.path.split(os.path.abspath(report))
+    store = balanced_store(store_path(directory, report_name), checkpoint_store.fingerprint(report))
+    source = load_source(report)
+    for name in args.datasets or store.datasets():
+        path = os.path.join(args.output or directory, "{}_{}.csv".format(os.path.splitext(report_name)[0], name))
+        store.to_csv(name, source, path)
+        print(path)
+
+##############################################################
+# Class Declarations:                                        #
+##############################################################
+
+class balanced_store:
+    """
+    class balanced_store() takes the path of the store file of a report and the fingerprint of the report, and
+    keeps the datasets of the store in memory. Only one process may write a store (the driver of the balancing
+    script; the workers compute the selections, see selection())
+
+    METHODS:
+        1) datasets, which returns the names of the stored datasets
+        2) update, which adds/replaces datasets (in memory)
+        3) flush, which rewrites the store file if datasets were updated since the last flush
+        4) frame, which materializes a dataset as a pd df
+        5) to_csv, which materializes a dataset as the csv that the model used to write
+    """
+
+    def __init__(self, path, fingerprint):
+        self.path = path
+        self.fingerprint = fingerprint
+        # dataset -> selection (see selection()), and the datasets that have not been written yet
+        self.selections = {}
+        self.unwritten = set()
+        if os.path.exists(path):
+            with np.load(path, allow_pickle=False) as data:
+                if int(data[_version_key]) == store_version and str(data[_source_key]) == fingerprint:
+                    self._read(data)
+
+    #-----------------------------#
+    def _read(self, data):
+        for key in data.files:
+            if not key.endswith(".columns"):
+                continue
+            name = key[:-len(".columns")]
+            columns = [str(column) for column in data[key]]
+            stored = dict((column, data["{}.c{}".format(name, i)]) for i, column in enumerate(columns)
+                          if "{}.c{}".format(name, i) in data.files)
+            rows = data["{}.rows".format(name)] if "{}.rows".format(name) in data.files else None
+            self.selections[name] = {'rows': rows, 'columns': columns, 'stored': stored}
+
+    #-----------------------------#
+    def _write(self):
+        arrays = {_version_key: np.array(store_version), _source_key: np.array(self.fingerprint)}
+        for name, dataset in self.selections.items():
+            arrays["{}.columns".format(name)] = np.array(dataset['columns'], dtype=str)
+            if dataset['rows'] is not None:
+                arrays["{}.rows".format(name)] = dataset['rows']
+            for i, column in enumerate(dataset['columns']):
+                if column in dataset['stored']:
+                    arrays["{}.c{}".format(name, i)] = dataset['stored'][column]
+        # write to a temporary file first so that a half-written store is never picked up
+        tmp_path = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(tmp_path, 'wb') as fh:
+            np.savez_compressed(fh, **arrays)
+        _replace_file(tmp_path, self.path)
+
+    #-----------------------------#
+    def datasets(self):
+        return sorted(self.selections)
+
+    #-----------------------------#
+    def update(self, selections):
+        """
+        Purpose: add (or replace) datasets; the store file is written by flush()
+        :param selections: a dictionary of dataset -> selection (see selection())
+        """
+        self.selections.update(selections)
+        self.unwritten.update(selections)
+
+    #-----------------------------#
+    def flush(self):
+        if self.unwritten:
+            self._write()
+        self.unwritten = set()
+
+    #-----------------------------#
+    def frame(self, name, source):
+        """
+        Purpose: materialize a dataset
+        :param source: the source report (see load_source())
+        :return: a pd df with the output columns of the dataset
+        """
+        dataset = self.selections[name]
+        rows = dataset['rows']
+        columns = []
+        for column in dataset['columns']:
+            if column in dataset['stored']:
+                columns.append(dataset['stored'][column])
+            else:
+                columns.append(np.asarray(source[column])[rows])
+        return pd.DataFrame(dict(zip(dataset['columns'], columns)), columns=dataset['columns'])
+
+    #-----------------------------#
+    def to_csv(self, name, source, path):
+        self.frame(name, source).to_csv(path, index=False)
+
+#-------------------------------
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
+
+# END MODULE
+# -------------------------------------------------------------
@@ -0,0 +1,244 @@
+"""
+Purpose:
+Benchmark harness for the weekly signal pipeline (weekly-signal-generation.py), run on synthetic reports (see
+synthetic_reports.py) so that it does not need the proprietary RS_Metrics weekly reports.
+
+Stages that are timed:
+- gen_data: parsing every weekly report (cold, no report_store cache)
+- ticker_stitch: a full rehash of all tickers, end to end (report parsing, all windows, signals, Metrics_Log.xlsx)
+- metric_calc: every full_rehash() window of one ticker, pooling the reports
+- metric_calc_window_sums: the same windows from the ticker's window_sums grid (what full_rehash() runs)
+- yoy_calc: the yoy of every pooled window of that ticker
+- write_data: writing every window's row of that ticker
+- calc_signal_rsm: the signals of the stitched panel
+
+Each run is appended to a JSON history file (a list of runs), together with the data scale and the python/numpy/
+pandas versions, so that regressions and optimization gains can be tracked over time. The stage timings are compared
+with the last run of the same scale in the history.
+
+Usage:
+    python -m rsm_tools.benchmark weekly-signal-generation.py --tickers 3 --weeks 70 --stores 20
+        --history benchmark_history.json --label "<what changed>"
+"""
+
+##############################################################
+# Imports:                                                   #
+##############################################################
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import datetime
+import platform
+import tempfile
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from rsm_tools import ticker_pool
+from rsm_tools import synthetic_reports
+
+##############################################################
+# Parameters                                                 #
+##############################################################
+
+# module name under which the benchmark loads the (hyphenated) script
+benchmark_module = "rsm_benchmark_script"
+default_history = "benchmark_history.json"
+
+##############################################################
+# Non-class Methods                                          #
+##############################################################
+
+def load_history(path):
+    """
+    :return: the list of runs in the history file (empty if the file does not exist)
+    """
+    if path is None or not os.path.exists(path):
+        return []
+    with open(path) as fh:
+        return json.load(fh)
+
+#-------------------------------
+
+def append_history(path, entry):
+    """
+    Purpose: append a run to the history file (the file is replaced atomically)
+    """
+    history = load_history(path) + [entry]
+    with open(path + ".tmp", 'w') as fh:
+        json.dump(history, fh, indent=1, sort_keys=True)
+    if os.path.exists(path):
+        os.remove(path)
+    os.rename(path + ".tmp", path)
+
+#-------------------------------
+
+def previous_run(history, scale):
+    """
+    :return: the last run in history with the same scale, or None
+    """
+    for entry in reversed(history):
+        if entry.get('scale') == scale:
+            return entry
+    return None
+
+#-------------------------------
+
+def summary(entry, previous=None):
+    """
+    Purpose: a text table of the stage timings of a run, with the ratio to a previous run
+    :return: a string
+    """
+    lines = ["{:<26}{:>10}{:>8}{:>12}{:>10}".format("stage", "seconds", "calls", "ms/call", "vs prev")]
+    for name in sorted(entry['stages']):
+        stage = entry['stages'][name]
+        ratio = ""
+        if previous is not None and name in previous['stages'] and previous['stages'][name]['seconds'] > 0:
+            ratio = "{:.2f}x".format(stage['seconds'] / previous['stages'][name]['seconds'])
+        lines.append("{:<26}{:>10.3f}{:>8}{:>12.3f}{:>10}".format(name, stage['seconds'], stage['calls'],
+                                                                 1000 * stage['per_call'], ratio))
+    return "\n".join(lines)
+
+#-------------------------------
+
+def run(script_path, tickers=3, weeks=70, stores=20, date_interval=1, directory=None, history=None, label="",
+        seed=0, keep=False, class_name="quant_metrics"):
+    """
+    Purpose: run the benchmark once
+    :param script_path: full path of weekly-signal-generation.py
+    :param tickers, weeks, stores, seed: the scale of the synthetic data (see synthetic_reports.write_reports())
+    :param date_interval: see full_rehash()
+    :param directory: (optional) the data directory. Defaults to a new temporary directory
+    :param history: (optional) the JSON history file that the run is appended to
+    :param label: (optional) a note that is stored with the run (e.g. the change being measured)
+    :param keep: (optional) keep the data directory
+    :return: the run (a dictionary)
+    """
+    module = ticker_pool.load_script(script_path, benchmark_module)
+    temporary = directory is None
+    if temporary:
+        directory = tempfile.mkdtemp(prefix="rsm_benchmark_")
+    timer = stage_timer()
+    try:
+        reports = synthetic_reports.write_reports(directory, tickers, weeks, stores, seed=seed,
+                                                  prefix=module.input_prefix)
+        ticker_list = synthetic_reports.ticker_names(tickers) if isinstance(tickers, int) else list(tickers)
+        metrics_log = os.path.join(directory, "Metrics_Log.xlsx")
+
+        # (1) report parsing
+        records = 0
+        for report in reports:
+            records += len(timer.time('gen_data', module.gen_data, report, directory))
+
+        # (2) the full rehash, end to end
+        qm = getattr(module, class_name)(metrics_log)
+        empty_log = qm.load_metrics_log()[:0]
+        qm.ticker_list = ticker_list
+        timer.time('ticker_stitch', qm.ticker_stitch, rehash=True, date_interval=date_interval)
+        panel = pd.concat([qm.dict_collate[ticker] for ticker in qm.dict_collate])
+
+        # (3) the stages of full_rehash() for the first ticker
+        ticker = ticker_list[0]
+        qm.ticker_df = empty_log
+        qm.ticker_table = None
+        for date_start, date_end in qm.rehash_windows(date_interval):
+            timer.time('metric_calc', qm.metric_calc, ticker, date_start, date_end)
+            if len(qm.pooled_wk_rep) > 0:
+                try:
+                    timer.time('yoy_calc', qm.yoy_calc, qm.pooled_wk_rep)
+                except ZeroDivisionError:
+                    pass
+            timer.time('metric_calc_window_sums', qm.metric_calc, ticker, date_start, date_end,
+                       use_window_sums=True)
+            # as in full_rehash(): the rows are exported to ticker_df once, after the last window
+            timer.time('write_data', qm.write_data, ticker, materialize=False)
+
+        # (4) signals of the stitched panel
+        timer.time('calc_signal_rsm', qm.calc_signal_rsm, panel.copy(), module.signal_stdh, module.signal_window,
+                   module.signal_block_off)
+    finally:
+        if temporary and not keep:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    entry = {
+        'timestamp': datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),
+        'label': label,
+        'script': os.path.basename(script_path),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'scale': {'tickers': len(ticker_list), 'weeks': weeks, 'stores': stores, 'date_interval': date_interval,
+                  'seed': seed},
+        'records': records,
+        'stages': timer.stages(),
+    }
+    if history is not None:
+        previous = previous_run(load_history(history), entry['scale'])
+        append_history(history, entry)
+    else:
+        previous = None
+    print(summary(entry, previous))
+    return entry
+
+#-------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the weekly signal pipeline on synthetic reports")
+    parser.add_argument("script", help="path of weekly-signal-generation.py")
+    parser.add_argument("--tickers", type=int, default=3)
+    parser.add_argument("--weeks", type=int, default=70)
+    parser.add_argument("--stores", type=int, default=20)
+    parser.add_argument("--date-interval", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--directory", default=None, help="data directory (default: a temporary directory)")
+    parser.add_argument("--keep", action="store_true", help="keep the data directory")
+    parser.add_argument("--history", default=default_history, help="JSON history file")
+    parser.add_argument("--label", default="", help="note stored with the run")
+    args = parser.parse_args(argv)
+    run(os.path.abspath(args.script), args.tickers, args.weeks, args.stores, args.date_interval, args.directory,
+        args.history, args.label, args.seed, args.keep)
+
+
+##############################################################
+# Class Declarations:                                        #
+##############################################################
+
+class stage_timer:
+    """
+    class stage_timer() accumulates the wall time and the number of calls of named stages
+
+    METHODS:
+        1) time, which runs a function and adds its wall time to a stage
+        2) stages, which returns {stage: {'seconds', 'calls', 'per_call'}}
+    """
+
+    def __init__(self):
+        self.seconds = {}
+        self.calls = {}
+
+    #-----------------------------#
+    def time(self, name, function, *args, **kwargs):
+        start = timeit.default_timer()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + timeit.default_timer() - start
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    #-----------------------------#
+    def stages(self):
+        return dict((name, {'seconds': round(self.seconds[name], 6), 'calls': self.calls[name],
+                            'per_call': round(self.seconds[name] / self.calls[name], 6)})
+                    for name in self.seconds)
+
+#-------------------------------
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
+
+# END MODULE
+# -------------------------------------------------------------
@@ -0,0 +1,145 @@
+"""
+Purpose:
+Checkpoint store of the balancing driver of statistical-balancing-multithreaded.py, so that a run that died or was
+interrupted can be resumed instead of redoing hours of balancing.
+
+A unit is one model of one report: (ticker, year, month, model). Every unit that finishes or fails is appended as
+one JSON line to the checkpoint file:
+
+    {"unit": [ticker, year, month, model], "fingerprint": ..., "status": "done" | "failed",
+     "summary": [[yoy, summary name], ...], "files": [balanced output, ...], "error": <traceback>, "time": ...}
+
+The last line of a unit wins. The fingerprint identifies the inputs of the unit (see fingerprint(): the size and
+mtime of the report, the variant of the balancing classes), so a unit only counts as finished if its report has not
+changed since. The file is only ever appended to and flushed after every line: a run that dies loses at most the
+line it was writing, which is skipped when the file is read again.
+"""
+
+##############################################################
+# Imports:                                                   #
+##############################################################
+
+import os
+import json
+import time
+import hashlib
+
+##############################################################
+# Parameters                                                 #
+##############################################################
+
+# file name of the checkpoint store in the working directory
+default_name = "balancing_checkpoint.jsonl"
+
+##############################################################
+# Non-class Methods                                          #
+##############################################################
+
+def fingerprint(path, *extra):
+    """
+    Purpose: build the fingerprint of the inputs of a unit
+    :param path: full path of the report
+    :param extra: (optional) anything else the results depend on (e.g. the avg_option of the balancing classes)
+    :return: a short hex string
+    """
+    raw = "|".join([str(os.path.getsize(path)), repr(os.path.getmtime(path))] + [str(e) for e in extra])
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+#-------------------------------
+
+def _plain(value):
+    # numpy scalars (e.g. a yoy) -> python scalars, which json can write
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+#-------------------------------
+
+def _unit(unit):
+    ticker, year, month, model = unit
+    return str(ticker), int(year), int(month), model
+
+##############################################################
+# Class Declarations:                                        #
+##############################################################
+
+class checkpoint_store:
+    """
+    class checkpoint_store() takes the path of a checkpoint file and reads the units recorded in it
+
+    METHODS:
+        1) finished, which returns the record of a unit if it finished with the given fingerprint
+        2) finish / fail, which append the result of a unit
+        3) failures, which returns the records of the units whose last result is a failure
+        4) clear, which removes the checkpoint file (a run that starts over)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # unit -> its last record
+        self.records = {}
+        if os.path.exists(path):
+            with open(path) as fh:
+                for line in fh:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:      # the line a dying run was writing
+                        continue
+                    self.records[_unit(record['unit'])] = record
+
+    #-----------------------------#
+    def _append(self, unit, record):
+        record['unit'] = list(unit)
+        record['time'] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        line = json.dumps(record, sort_keys=True)
+        with open(self.path, 'a') as fh:
+            fh.write(line + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+        self.records[unit] = record
+
+    #-----------------------------#
+    def finished(self, unit, fingerprint):
+        """
+        :return: the record of unit if its last result is a success with this fingerprint, else None
+        """
+        record = self.records.get(_unit(unit))
+        if record is not None and record['status'] == 'done' and record['fingerprint'] == fingerprint:
+            return record
+        return None
+
+    #-----------------------------#
+    def finish(self, unit, fingerprint, summary, files=()):
+        """
+        Purpose: record a unit that finished
+        :param summary: its summary entries, a list of (yoy, summary name)
+        :param files: the locations of the balanced outputs it wrote
+        """
+        self._append(_unit(unit), {'fingerprint': fingerprint, 'status': 'done',
+                                   'summary': [[_plain(yoy), name] for yoy, name in summary], 'files': list(files)})
+
+    #-----------------------------#
+    def fail(self, unit, fingerprint, error):
+        """
+        Purpose: record a unit that failed, with its traceback
+        """
+        self._append(_unit(unit), {'fingerprint': fingerprint, 'status': 'failed', 'error': error})
+
+    #-----------------------------#
+    def failures(self, units=None):
+        """
+        :param units: (optional) the units to look at. Defaults to every unit of the store
+        :return: the records of the units whose last result is a failure, in the order of units
+        """
+        units = sorted(self.records, key=str) if units is None else [_unit(unit) for unit in units]
+        return [self.records[unit] for unit in units
+                if unit in self.records and self.records[unit]['status'] == 'failed']
+
+    #-----------------------------#
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.records = {}
+
+# END MODULE
+# -------------------------------------------------------------
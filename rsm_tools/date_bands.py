@@ -0,0 +1,151 @@
+"""
+Purpose:
+Vectorized py/cy classification and date-band filtering of pooled weekly observations.
+
+quant_metrics.metric_calc() (weekly-signal-generation.py) and user_script_balance.py used to walk the pooled
+record array row by row, calling pd.to_datetime() on every 'Notes' value and rebuilding the opposite-year date from
+zero-padded strings. This module parses the 'Notes' column once and does the same work with datetime64 arithmetic.
+
+Rules (unchanged from the original loops):
+1) an observation is a py observation (999998) if its date is on or before start_date - 182 days, otherwise it is a
+   cy observation (999999)
+2) the opposite-year date of an observation is the same month/day one year later (py) or earlier (cy). Feb 29 maps
+   to Feb 28.
+3) an observation is kept (flag 999999) if its cy date (own date for cy, opposite date for py) falls within
+   [start + l_bound weeks, end - u_bound weeks] and its py date falls within the same band shifted back one year;
+   otherwise it is flagged (flag 0)
+"""
+
+##############################################################
+# Imports:                                                   #
+##############################################################
+
+import numpy as np
+import pandas as pd
+
+##############################################################
+# Parameters                                                 #
+##############################################################
+
+# py/cy identifiers (see Addendum 2 in metric_calc)
+py_id = 999998
+cy_id = 999999
+# default value of a numeric field appended with recfunctions.rec_append_fields(..., [], int), i.e. "keep"
+keep_id = 999999
+# heuristic distance between the window start and the py/cy divide
+mid_divide_days = 182
+# the fields that band_selector() fills, as report_store.pool_slices() extra fields
+band_fields = [('py_cy', int), ('flag', int)]
+
+_day = np.timedelta64(1, 'D')
+
+##############################################################
+# Non-class Methods                                          #
+##############################################################
+
+def parse_notes(notes):
+    """
+    Purpose: parse the 'Notes' column (observation dates) once
+    :param notes: an array of date strings (or datetime64 values)
+    :return: a datetime64[ns] np array (NaT where a date could not be parsed)
+    """
+    notes = np.asarray(notes)
+    if notes.dtype.kind == 'M':
+        return notes.astype('datetime64[ns]')
+    return pd.to_datetime(pd.Series(notes), errors='coerce').values
+
+#-------------------------------
+
+def shift_year(dates, years):
+    """
+    Purpose: move dates by whole calendar years, keeping month and day. Feb 29 becomes Feb 28.
+    Any time of day is dropped, exactly like the original string reconstruction (month + day + year).
+    :param dates: datetime64 np array (or a scalar pd.Timestamp)
+    :param years: +1 or -1
+    :return: datetime64[ns] np array
+    """
+    days = np.asarray(dates, dtype='datetime64[ns]').astype('datetime64[D]')
+    months = days.astype('datetime64[M]')
+    day_of_month = (days - months).astype(int)     # 0-based
+    month_of_year = months.astype(int) % 12         # 0-based; 1 is February
+    # leap year: 02-29 has no equivalent in the opposite year, set the day to 28
+    day_of_month = np.where((month_of_year == 1) & (day_of_month == 28), 27, day_of_month)
+    shifted = (months + np.timedelta64(12 * years, 'M')).astype('datetime64[D]') + day_of_month * _day
+    return shifted.astype('datetime64[ns]')
+
+#-------------------------------
+
+def _as_datetime64(ts):
+    return np.datetime64(pd.Timestamp(ts).to_datetime64(), 'ns')
+
+#-------------------------------
+
+def classify_py_cy(rec_dates, start_date_s):
+    """
+    Purpose: py/cy classification (Addendum 2 in metric_calc)
+    :param rec_dates: datetime64 np array of observation dates (see parse_notes)
+    :param start_date_s: the (adjusted) window start date, a pd.Timestamp
+    :return: an int np array of 999998 (py) / 999999 (cy)
+    """
+    mid_divide = _as_datetime64(start_date_s) - np.timedelta64(mid_divide_days, 'D')
+    return np.where(np.asarray(rec_dates) <= mid_divide, py_id, cy_id)
+
+#-------------------------------
+
+def band_flags(rec_dates, py_cy, start_date_s, end_date_s, l_bound, u_bound):
+    """
+    Purpose: date-band filter (Addendum 1 in metric_calc)
+    :param rec_dates: datetime64 np array of observation dates (see parse_notes)
+    :param py_cy: the output of classify_py_cy
+    :param start_date_s: the (adjusted) window start date, a pd.Timestamp
+    :param end_date_s: the window end date, a pd.Timestamp
+    :param l_bound: lower bound in weeks (e.g. -3)
+    :param u_bound: upper bound in weeks (e.g. 0)
+    :return: an int np array of 999999 (keep) / 0 (flagged, i.e. outside the date band)
+    """
+    rec_dates = np.asarray(rec_dates, dtype='datetime64[ns]')
+    start_s = _as_datetime64(start_date_s)
+    end_s = _as_datetime64(end_date_s)
+    # prior year equivalents of the window start/end
+    start_ts = shift_year(np.array([start_s]), -1)[0]
+    end_ts = shift_year(np.array([end_s]), -1)[0]
+    lower = np.timedelta64(7 * int(l_bound), 'D')
+    upper = np.timedelta64(7 * int(u_bound), 'D')
+
+    is_py = np.asarray(py_cy) == py_id
+    opp_dates = np.where(is_py, shift_year(rec_dates, 1), shift_year(rec_dates, -1))
+    cy_dates = np.where(is_py, opp_dates, rec_dates)
+    py_dates = np.where(is_py, rec_dates, opp_dates)
+
+    check_cy = (cy_dates >= start_s + lower) & (cy_dates <= end_s - upper)
+    check_py = (py_dates >= start_ts + lower) & (py_dates <= end_ts - upper)
+    return np.where(check_cy & check_py, keep_id, 0)
+
+#-------------------------------
+
+def py_cy_flags(notes, start_date_s, end_date_s, l_bound, u_bound):
+    """
+    Purpose: single-pass replacement of both per-row loops in metric_calc/user_script_balance
+    :param notes: the 'Notes' column of the pooled records
+    :return: (py_cy, flag) int np arrays
+    """
+    rec_dates = parse_notes(notes)
+    py_cy = classify_py_cy(rec_dates, start_date_s)
+    flag = band_flags(rec_dates, py_cy, start_date_s, end_date_s, l_bound, u_bound)
+    return py_cy, flag
+
+#-------------------------------
+
+def band_selector(start_date_s, end_date_s, l_bound, u_bound):
+    """
+    Purpose: the select function of report_store.pool_slices() for a window: the observations within the date band
+    (flag != 0), with their py_cy and flag fields
+    :return: a function of a record array with a 'Notes' field
+    """
+    def select(records):
+        py_cy, flag = py_cy_flags(records['Notes'], start_date_s, end_date_s, l_bound, u_bound)
+        return flag != 0, {'py_cy': py_cy, 'flag': flag}
+    return select
+
+# END MODULE
+# -------------------------------------------------------------
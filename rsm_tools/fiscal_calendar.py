@@ -0,0 +1,164 @@
+"""
+Purpose:
+Lookup tables of the fiscal-quarter matrix (RS Metrics_Fiscal_Quarter_Dates_Matrix.xlsx) for det_qtr() and
+det_wk_weights() of statistical-balancing-multithreaded.py.
+
+Both functions used to filter the matrix with a boolean mask for every report, split the month lists of the quarter
+columns and parse every month with strptime(month, '%b') (det_wk_weights() split and mapped the 'Cadence' column
+in the same way). The fiscal_calendar parses the matrix once:
+- quarters: an int8 array of shape (tickers, 13), quarters[ticker row, month] = fiscal quarter (0: none)
+- weights: ticker -> cadence weights (week cadence 5 -> 0.4, 4 -> 0.3, 'Calendar' -> 1)
+
+The whole matrix is validated at load time: every problem (a missing column, a duplicate company, a month that
+cannot be parsed, a month that is missing or in two quarters, an implausible cadence) is collected and raised as
+one ValueError, instead of the first affected report failing in the middle of a run.
+
+Matrix layout: a 'Company' column, the quarter columns (month abbreviations, ", "-separated) and a 'Cadence' column
+("-"-separated week counts, e.g. 4-4-5, or 'Calendar'). As in the former det_qtr(), the quarter columns are taken by
+position, whatever their headers: columns 1-4 (after 'Company') are fiscal quarters 1-4.
+"""
+
+##############################################################
+# Imports:                                                   #
+##############################################################
+
+import calendar
+
+import numpy as np
+import pandas as pd
+
+##############################################################
+# Parameters                                                 #
+##############################################################
+
+company_column = 'Company'
+# the positions of the quarter columns in the matrix (column n is fiscal quarter n)
+quarter_positions = range(1, 5)
+cadence_column = 'Cadence'
+# week cadence -> weight in the weighted average of the months of a quarter
+week_weights = {'5': 0.4, '4': 0.3, 'Calendar': 1}
+
+# month abbreviation (lower case, as strptime(month, '%b') accepts it) -> month number
+_month_numbers = dict((calendar.month_abbr[n].lower(), n) for n in range(1, 13))
+
+##############################################################
+# Non-class Methods                                          #
+##############################################################
+
+def from_excel(path):
+    """
+    Purpose: read and validate a fiscal-quarter matrix
+    :param path: full path of the matrix (.xlsx)
+    :return: a fiscal_calendar
+    """
+    return fiscal_calendar(pd.read_excel(path))
+
+#-------------------------------
+
+def month_number(month):
+    """
+    Purpose: int(strptime(month, '%b').tm_mon) without the strptime call (e.g. for the month of a report name)
+    :param month: a month abbreviation (e.g. 'Jan', case-insensitive)
+    :return: the month number (1-12). Raises ValueError if month is not a month abbreviation
+    """
+    try:
+        return _month_numbers[month.strip().lower()]
+    except KeyError:
+        raise ValueError("implausible month '{}'".format(month))
+
+#-------------------------------
+
+def _cell(value):
+    return '' if pd.isnull(value) else str(value).strip()
+
+##############################################################
+# Class Declarations:                                        #
+##############################################################
+
+class fiscal_calendar:
+    """
+    class fiscal_calendar() takes the fiscal-quarter matrix (a pd df, see the module docstring), validates it and
+    builds its lookup tables. Raises ValueError with every problem of the matrix
+
+    METHODS:
+        1) quarter, which returns the fiscal quarter of a ticker and month
+        2) quarter_array, which does the same for arrays of tickers and months
+        3) cadence_weights, which returns the cadence weights of a ticker
+    """
+
+    def __init__(self, matrix):
+        errors = []
+        missing = [column for column in [company_column, cadence_column] if column not in matrix.columns]
+        if missing:
+            raise ValueError("the fiscal-quarter matrix is missing the columns {}".format(missing))
+        if len(matrix.columns) <= max(quarter_positions):
+            raise ValueError("the fiscal-quarter matrix has no quarter columns {}".format(list(quarter_positions)))
+
+        self.tickers = [_cell(ticker) for ticker in matrix[company_column]]
+        self.rows = {}
+        self.quarters = np.zeros((len(self.tickers), 13), dtype=np.int8)
+        self.weights = {}
+        for row, ticker in enumerate(self.tickers):
+            if ticker in self.rows:
+                errors.append("{}: the company is listed twice".format(ticker))
+                continue
+            self.rows[ticker] = row
+            for quarter, position in enumerate(quarter_positions, 1):
+                for month in _cell(matrix.iloc[row, position]).split(", "):
+                    n = _month_numbers.get(month.strip().lower())
+                    if n is None:
+                        errors.append("{}: Q{} holds the implausible month '{}'".format(ticker, quarter, month))
+                    elif self.quarters[row, n] != 0:
+                        errors.append("{}: {} is in Q{} and Q{}".format(ticker, month, self.quarters[row, n], quarter))
+                    else:
+                        self.quarters[row, n] = quarter
+            unassigned = [calendar.month_abbr[n] for n in range(1, 13) if self.quarters[row, n] == 0]
+            if unassigned:
+                errors.append("{}: months in no quarter: {}".format(ticker, ", ".join(unassigned)))
+
+            cadence = _cell(matrix[cadence_column].iloc[row]).split("-")
+            if any(element not in week_weights for element in cadence):
+                errors.append("{}: implausible week cadence '{}'".format(ticker, "-".join(cadence)))
+            else:
+                self.weights[ticker] = [week_weights[element] for element in cadence]
+        if errors:
+            raise ValueError("invalid fiscal-quarter matrix:\n" + "\n".join(errors))
+
+    #-----------------------------#
+    def _row(self, ticker):
+        try:
+            return self.rows[ticker]
+        except KeyError:
+            raise KeyError("ticker {} does not exist in the fiscal-quarter matrix".format(ticker))
+
+    #-----------------------------#
+    def quarter(self, ticker, month):
+        """
+        :param ticker: a string
+        :param month: the month number (1-12)
+        :return: the fiscal quarter (1-4)
+        """
+        if not 1 <= month <= 12:
+            raise ValueError("implausible month {}".format(month))
+        return int(self.quarters[self._row(ticker), month])
+
+    #-----------------------------#
+    def quarter_array(self, tickers, months):
+        """
+        :param tickers: a sequence of tickers
+        :param months: a sequence (or np array) of month numbers of the same length
+        :return: a np int array of the fiscal quarters
+        """
+        rows = np.array([self._row(ticker) for ticker in tickers], dtype=np.intp)
+        return self.quarters[rows, np.asarray(months, dtype=np.intp)].astype(int)
+
+    #-----------------------------#
+    def cadence_weights(self, ticker):
+        """
+        :return: the cadence weights of a ticker (a new list)
+        """
+        self._row(ticker)
+        return list(self.weights[ticker])
+
+# END MODULE
+# -------------------------------------------------------------
@@ -0,0 +1,83 @@
+"""
+Purpose:
+Conversions between the np structured (record) arrays of the reports and pandas DataFrames, shared by sampledf() and
+df_to_sarray() of the scripts and by the balancing chain of statistical-balancing-multithreaded.py.
+
+- to_frame() (sampledf()) used to build a Python list index, [i for i in range(1, n + 1)], for every conversion; it
+  now uses a RangeIndex, which holds no per-row data.
+- to_records() (df_to_sarray()) used to fill the array from df.values, which materializes the whole frame as one
+  2-D object array when the dtypes are mixed; it now copies every column from its own (typed) array.
+- field_names()/column() read the columns of either representation without converting it: the column of a record
+  array is a view of its field, the column of a DataFrame the array of its block. The balancing chain uses them to
+  read a balanced sample in whatever form its model returned it (it used to convert np rec array output to a
+  DataFrame only to read its columns).
+
+A DataFrame cannot share memory with a record array (pandas consolidates the columns of a dtype into one 2-D block,
+a record array interleaves the fields of a row), so every to_frame()/to_records() still copies the data once; the
+column views are where the copies are avoided.
+"""
+
+##############################################################
+# Imports:                                                   #
+##############################################################
+
+import numpy as np
+import pandas as pd
+
+##############################################################
+# Parameters                                                 #
+##############################################################
+
+# first label of the row index that to_frame() creates (sampledf() numbers the rows from 1)
+index_start = 1
+
+##############################################################
+# Non-class Methods                                          #
+##############################################################
+
+def field_names(data):
+    """
+    :param data: a pd df or a np structured array
+    :return: the list of its column (field) names
+    """
+    if isinstance(data, pd.DataFrame):
+        return list(data.columns)
+    return list(data.dtype.names)
+
+#-------------------------------
+
+def column(data, name):
+    """
+    Purpose: a column of a pd df or of a np structured array, without converting the container
+    :return: a 1-D np array (a view where the container allows it)
+    """
+    return np.asarray(data[name])
+
+#-------------------------------
+
+def to_frame(records, start=index_start):
+    """
+    Purpose: a np structured array -> pd df, with the rows labelled start, start + 1, ...
+    :param records: a np structured (record) array
+    :return: a pd df with one column per field
+    """
+    return pd.DataFrame(records, index=pd.RangeIndex(start, start + len(records)))
+
+#-------------------------------
+
+def to_records(frame):
+    """
+    Purpose: a pd df -> np structured array (without the index), one field per column, with the dtype of the column
+    (object for text)
+    :param frame: a pd df
+    :return: a np structured array
+    """
+    names = [str(name) for name in frame.columns]
+    arrays = [np.asarray(frame.iloc[:, i]) for i in range(len(names))]
+    records = np.empty(len(frame), dtype=[(name, values.dtype) for name, values in zip(names, arrays)])
+    for name, values in zip(names, arrays):
+        records[name] = values
+    return records
+
+# END MODULE
+# -------------------------------------------------------------
@@ -0,0 +1,335 @@
+"""
+Purpose:
+Append-only columnar store for the Metrics_Log panel, used by the incremental mode of quant_metrics.ticker_stitch()
+(weekly-signal-generation.py).
+
+ticker_stitch() used to read all of Metrics_Log.xlsx, rebuild every ticker subset, recompute every signal and write
+the whole workbook back. With the store, a weekly update only touches the last few rows of each ticker: the rows
+that have to be recomputed are appended as a new chunk, and Metrics_Log.xlsx is only written when asked for.
+
+Layout:
+- <log directory>/.rsm_metrics_log/hwm.json                       high-water mark of every ticker (see below)
+- <log directory>/.rsm_metrics_log/<ticker>/<chunk number>.npz    one array per column of the Metrics_Log
+
+Rules:
+1) evaluation_id is the 1..n row number of a ticker's series (this is how write_data() assigns it)
+2) chunks are never rewritten (except by compact()/reset()). A row that appears in several chunks is taken from the
+   newest chunk, and rows with an evaluation_id above the high-water mark are ignored. Truncating and re-appending
+   the tail of a series is therefore just another append.
+3) hwm.json is replaced (atomically) after the chunk has been written, so an interrupted append leaves the store
+   at its previous state.
+
+The high-water mark of a ticker holds: evaluation_id, period_id and date of the last row, the date of the latest
+weekly report that had been processed (last_report), the date_interval of the series and the number of chunks.
+"""
+
+##############################################################
+# Imports:                                                   #
+##############################################################
+
+import os
+import json
+import shutil
+
+import numpy as np
+import pandas as pd
+
+##############################################################
+# Parameters                                                 #
+##############################################################
+
+# name of the store folder that is created next to Metrics_Log.xlsx
+store_folder = ".rsm_metrics_log"
+# the columns of Metrics_Log.xlsx, in the order in which they are exported
+log_columns = ['date', 'evaluation_id', 'month', 'period_id', 'signal', 'ticker', 'week', 'year', 'yoy_change']
+# number of chunks of a ticker after which append() compacts them into one
+max_chunks = 64
+
+##############################################################
+# Non-class Methods                                          #
+##############################################################
+
+def _replace_file(tmp_path, final_path):
+    # os.rename() does not overwrite an existing file on Windows
+    if os.path.exists(final_path):
+        os.remove(final_path)
+    os.rename(tmp_path, final_path)
+
+#-------------------------------
+
+def _text(values):
+    return np.array(pd.Series(values).fillna('').astype(str).tolist(), dtype=str)
+
+#-------------------------------
+
+def frame_to_columns(frame):
+    """
+    Purpose: convert a ticker's Metrics_Log rows to the fixed dtypes of the store
+    :param frame: a pd df with (a subset of) log_columns
+    :return: a dictionary of np arrays, one per column in log_columns
+    """
+    n = len(frame)
+    columns = {}
+    for name in log_columns:
+        if name not in frame.columns:
+            values = pd.Series([np.nan] * n)
+        else:
+            values = frame[name]
+        if name in ('period_id', 'ticker'):
+            columns[name] = _text(values)
+        elif name == 'date':
+            columns[name] = pd.to_datetime(pd.Series(np.asarray(values, dtype=object))).values \
+                .astype('datetime64[D]')
+        elif name == 'evaluation_id':
+            columns[name] = np.asarray(values, dtype=np.int64)
+        else:
+            columns[name] = np.asarray(values, dtype=np.float64)
+    return columns
+
+#-------------------------------
+
+def columns_to_frame(columns):
+    """
+    Purpose: inverse of frame_to_columns(). Dates are returned as datetime.date objects, which is what write_data()
+    writes into the 'date' column.
+    :return: a pd df with a 0..n-1 index
+    """
+    frame = pd.DataFrame({name: columns[name] for name in log_columns}, columns=log_columns)
+    frame['date'] = [d.date() if not pd.isnull(d) else np.nan for d in pd.to_datetime(frame['date'])]
+    return frame
+
+##############################################################
+# Class Declarations:                                        #
+##############################################################
+
+class metrics_log_store:
+    """
+    class metrics_log_store() takes the following arguments:
+        1) the directory of Metrics_Log.xlsx
+        2) (optional) the store directory. Defaults to <directory>/.rsm_metrics_log
+
+    METHODS:
+        1) high_water_mark, which returns the high-water mark of a ticker (None if the ticker is not in the store)
+        2) tail, which returns the rows of a ticker from some date onwards plus a number of look-back rows
+           (head, the first rows of a ticker)
+        3) rows, which returns all rows of a ticker
+        4) append, which adds (or replaces) rows at the end of a ticker's series
+        5) reset, which replaces a ticker's series entirely (full_rehash() / bootstrap from Metrics_Log.xlsx)
+        6) compact, which merges the chunks of a ticker into one
+        7) to_frame/export_xlsx, which collate the panel of several tickers (the on-demand Metrics_Log.xlsx)
+    """
+
+    def __init__(self, directory, store_dir=None):
+        self.directory = directory
+        if store_dir is None:
+            store_dir = os.path.join(directory, store_folder)
+        self.store_dir = store_dir
+        self._hwm = None
+
+    #-----------------------------#
+    def _hwm_path(self):
+        return os.path.join(self.store_dir, "hwm.json")
+
+    #-----------------------------#
+    def _marks(self):
+        if self._hwm is None:
+            if os.path.exists(self._hwm_path()):
+                with open(self._hwm_path()) as fh:
+                    self._hwm = json.load(fh)
+            else:
+                self._hwm = {}
+        return self._hwm
+
+    #-----------------------------#
+    def _write_marks(self):
+        # a ticker without rows writes no chunk, so the store folder may not exist yet
+        if not os.path.isdir(self.store_dir):
+            os.makedirs(self.store_dir)
+        path = self._hwm_path()
+        with open(path + ".tmp", 'w') as fh:
+            json.dump(self._marks(), fh, indent=1, sort_keys=True)
+        _replace_file(path + ".tmp", path)
+
+    #-----------------------------#
+    def _chunk_path(self, ticker, n):
+        return os.path.join(self.store_dir, ticker, "{:06d}.npz".format(n))
+
+    #-----------------------------#
+    def _read_chunk(self, ticker, n):
+        with np.load(self._chunk_path(ticker, n)) as data:
+            return dict((name, data[name]) for name in log_columns)
+
+    #-----------------------------#
+    def _write_chunk(self, ticker, n, columns):
+        folder = os.path.join(self.store_dir, ticker)
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        path = self._chunk_path(ticker, n)
+        # np.savez appends .npz to any other file name
+        tmp_path = path[:-len(".npz")] + ".tmp.npz"
+        np.savez(tmp_path, **columns)
+        _replace_file(tmp_path, path)
+
+    #-----------------------------#
+    def high_water_mark(self, ticker):
+        """
+        :return: a dictionary (see the module docstring), or None if the ticker is not in the store
+        """
+        mark = self._marks().get(ticker)
+        return dict(mark) if mark is not None else None
+
+    #-----------------------------#
+    def _collect(self, ticker, enough=None):
+        """
+        Read the chunks of a ticker newest first (the newest version of a row wins) until enough(rows) is True
+        :param enough: a function of the pd df of the rows collected so far (None: read every chunk)
+        :return: a pd df ordered by evaluation_id
+        """
+        mark = self._marks().get(ticker)
+        empty = frame_to_columns(pd.DataFrame())
+        if mark is None:
+            return columns_to_frame(empty)
+        chunks = []
+        seen = set()
+        frame = columns_to_frame(empty)
+        for n in range(mark['chunks'] - 1, -1, -1):
+            columns = self._read_chunk(ticker, n)
+            eids = columns['evaluation_id']
+            keep = np.array([eid <= mark['evaluation_id'] and eid not in seen for eid in eids], dtype=bool)
+            seen.update(eids[keep].tolist())
+            chunks.append(dict((name, columns[name][keep]) for name in log_columns))
+            if enough is not None or n == 0:
+                merged = dict((name, np.concatenate([c[name] for c in chunks] + [empty[name][:0]]))
+                              for name in log_columns)
+                order = np.argsort(merged['evaluation_id'], kind='mergesort')
+                frame = columns_to_frame(dict((name, merged[name][order]) for name in log_columns))
+                if enough is not None and enough(frame):
+                    break
+        return frame
+
+    #-----------------------------#
+    def tail(self, ticker, since_date, lookback):
+        """
+        Purpose: the rows of a ticker dated on/after since_date plus the lookback rows right before them. Only the
+        newest chunks that contain these rows are read.
+        :param ticker: a ticker string
+        :param since_date: a date
+        :param lookback: the number of rows before since_date to include
+        :return: a pd df ordered by evaluation_id
+        """
+        since = pd.Timestamp(since_date).date()
+
+        def enough(frame):
+            return int(np.sum([d < since for d in frame['date']])) >= lookback
+
+        frame = self._collect(ticker, enough)
+        first = int(np.sum([d < since for d in frame['date']]))
+        return frame.iloc[max(0, first - lookback):].reset_index(drop=True)
+
+    #-----------------------------#
+    def head(self, ticker, count):
+        """
+        Purpose: the first count rows of a ticker (evaluation_id 1..count)
+        :return: a pd df ordered by evaluation_id
+        """
+        mark = self._marks().get(ticker)
+        count = min(count, mark['evaluation_id']) if mark is not None else 0
+
+        def enough(frame):
+            return int(np.sum(frame['evaluation_id'] <= count)) >= count
+
+        frame = self._collect(ticker, enough)
+        return frame[frame['evaluation_id'] <= count].reset_index(drop=True)
+
+    #-----------------------------#
+    def rows(self, ticker):
+        """
+        :return: all rows of a ticker as a pd df, ordered by evaluation_id
+        """
+        return self._collect(ticker)
+
+    #-----------------------------#
+    def append(self, ticker, frame, last_report, date_interval):
+        """
+        Purpose: add rows to the end of a ticker's series. Rows whose evaluation_id already exists replace the
+        stored rows; the new last row becomes the high-water mark (rows after it are dropped).
+        :param ticker: a ticker string
+        :param frame: a pd df of Metrics_Log rows of this ticker, ordered by evaluation_id
+        :param last_report: the date of the latest weekly report that went into these rows
+        :param date_interval: the date_interval of the series (see full_rehash())
+        """
+        mark = self._marks().get(ticker)
+        if mark is None:
+            return self.reset(ticker, frame, last_report, date_interval)
+        if len(frame) > 0:
+            self._write_chunk(ticker, mark['chunks'], frame_to_columns(frame))
+            mark['chunks'] += 1
+            self._set_last_row(mark, frame)
+        mark['last_report'] = str(pd.Timestamp(last_report).date())
+        mark['date_interval'] = date_interval
+        self._marks()[ticker] = mark
+        self._write_marks()
+        if mark['chunks'] > max_chunks:
+            self.compact(ticker)
+
+    #-----------------------------#
+    def _set_last_row(self, mark, frame):
+        last = frame.iloc[-1]
+        mark['evaluation_id'] = int(last['evaluation_id'])
+        mark['period_id'] = str(last['period_id'])
+        mark['date'] = str(pd.Timestamp(last['date']).date())
+
+    #-----------------------------#
+    def reset(self, ticker, frame, last_report, date_interval):
+        """
+        Purpose: replace all rows of a ticker with frame (a single chunk)
+        """
+        # drop the ticker from hwm.json first, so that an interrupted reset leaves no dangling high-water mark
+        if self._marks().pop(ticker, None) is not None:
+            self._write_marks()
+        folder = os.path.join(self.store_dir, ticker)
+        if os.path.isdir(folder):
+            shutil.rmtree(folder)
+        mark = {'evaluation_id': 0, 'period_id': '', 'date': '', 'chunks': 0}
+        if len(frame) > 0:
+            self._write_chunk(ticker, 0, frame_to_columns(frame))
+            mark['chunks'] = 1
+            self._set_last_row(mark, frame)
+        mark['last_report'] = str(pd.Timestamp(last_report).date())
+        mark['date_interval'] = date_interval
+        self._marks()[ticker] = mark
+        self._write_marks()
+
+    #-----------------------------#
+    def compact(self, ticker):
+        """
+        Purpose: merge all chunks of a ticker into one
+        """
+        mark = self.high_water_mark(ticker)
+        if mark is None or mark['chunks'] <= 1:
+            return
+        frame = self.rows(ticker)
+        self.reset(ticker, frame, mark['last_report'], mark['date_interval'])
+
+    #-----------------------------#
+    def to_frame(self, tickers):
+        """
+        Purpose: collate the panel of several tickers, in the layout ticker_stitch() writes to Metrics_Log.xlsx
+        (every ticker has its own 0..n-1 index)
+        :param tickers: a list of ticker strings
+        :return: a pd df
+        """
+        frames = [self.rows(ticker) for ticker in tickers if ticker in self._marks()]
+        if len(frames) == 0:
+            return columns_to_frame(frame_to_columns(pd.DataFrame()))
+        return pd.concat(frames)
+
+    #-----------------------------#
+    def export_xlsx(self, path, tickers):
+        """
+        Purpose: write the panel of several tickers to an .xlsx file (e.g. Metrics_Log.xlsx)
+        """
+        self.to_frame(tickers).to_excel(path, encoding='utf-8')
+
+# END MODULE
+# -------------------------------------------------------------
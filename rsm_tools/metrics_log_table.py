@@ -0,0 +1,288 @@
+"""
+Purpose:
+In-memory table of a ticker's Metrics_Log rows for quant_metrics.write_data() (weekly-signal-generation.py).
+
+write_data() used to append a row with pd.concat for every new evaluation_id, then write seven columns one at a time
+with metrics_log.loc[metrics_log.evaluation_id == eid, ...]. Every write scanned the whole column and every append
+copied the whole frame, so a full rehash was O(n^2) in the number of rows. The metrics_log_table keeps:
+- preallocated column arrays (capacity doubles when full), so an append is amortized O(1). The numeric columns
+  (numeric_columns and the numeric columns of the source frame) are float64 arrays with NaN for missing values, the
+  others (period_id, date, ticker) object arrays
+- an index of evaluation_id -> row positions, so an upsert only touches the rows of that evaluation_id
+- the count of every period_id (missing values are not counted), so "does period_id already exist" is a dictionary
+  lookup
+- the running maximum evaluation_id and the running maximum week-Monday of the rows (see last_monday())
+
+The rows are keyed by evaluation_id, not by (ticker, period_id): write_data() decides the evaluation_id of a write
+(an existing period_id overrides the row of the last evaluation_id, not the row of that period_id) and the table
+only has to find its rows.
+
+to_frame() exports the rows as a pd df in the layout write_data() used to produce: the columns of the source frame
+(new columns are added at the end in the order write_data() created them), and the source frame's index until the
+first row is appended (pd.concat(...).reset_index(drop=True) renumbered the rows from then on). A numeric column is
+exported as int64 if every value is an integer (a column of the source frame: if its dtype is an integer dtype) and
+none is missing, as float64 otherwise, which is what infer_objects() made of the former object columns (a table
+without rows exports object columns).
+"""
+
+##############################################################
+# Imports:                                                   #
+##############################################################
+
+import numbers
+
+import numpy as np
+import pandas as pd
+
+from rsm_tools.week_calendar import week_mondays
+
+##############################################################
+# Parameters                                                 #
+##############################################################
+
+# the columns that write_data() writes, in the order it used to create them in an empty frame
+write_columns = ['evaluation_id', 'month', 'period_id', 'week', 'year', 'yoy_change', 'date', 'ticker']
+# the write_columns that are stored as float64 arrays
+numeric_columns = ['evaluation_id', 'month', 'week', 'year', 'yoy_change']
+# initial number of rows allocated
+default_capacity = 64
+
+##############################################################
+# Non-class Methods                                          #
+##############################################################
+
+def _row_mondays(years, weeks):
+    """
+    Purpose: week_mondays() of (year, week) rows; rows without a year or week get NaT
+    """
+    years = np.asarray(pd.to_numeric(pd.Series(years), errors='coerce'), dtype=float)
+    weeks = np.asarray(pd.to_numeric(pd.Series(weeks), errors='coerce'), dtype=float)
+    mondays = np.empty(len(years), dtype='datetime64[D]')
+    mondays[:] = np.datetime64('NaT')
+    valid = ~(np.isnan(years) | np.isnan(weeks))
+    if np.any(valid):
+        mondays[valid] = week_mondays(years[valid].astype(int), weeks[valid].astype(int))
+    return mondays
+
+#-------------------------------
+
+def _numeric_value(value):
+    # a value that a float64 column holds as it is (None and NaN are missing values)
+    return value is None or (isinstance(value, numbers.Real) and not isinstance(value, bool))
+
+#-------------------------------
+
+def _empty_column(numeric, capacity):
+    column = np.empty(capacity, dtype=np.float64 if numeric else object)
+    column[:] = np.nan
+    return column
+
+##############################################################
+# Class Declarations:                                        #
+##############################################################
+
+class metrics_log_table:
+    """
+    class metrics_log_table() takes the following arguments:
+        1) (optional) a pd df of a ticker's Metrics_Log rows (e.g. quant_metrics.ticker_df). Defaults to no rows
+        2) (optional) the initial capacity in rows
+
+    ATTRIBUTES:
+        source: the frame the table was built from, or the frame last returned by to_frame()
+
+    METHODS:
+        1) has_period, which checks whether a period_id exists
+        2) append, which adds a row with only an evaluation_id
+        3) upsert, which writes values to the rows of an evaluation_id
+        4) last_eid, max_eid, last_monday: the lookups of write_data()
+        5) to_frame, the bulk export
+    """
+
+    def __init__(self, frame=None, capacity=default_capacity):
+        if frame is None:
+            frame = pd.DataFrame()
+        self.source = frame
+        self.columns = list(frame.columns) + [c for c in write_columns if c not in frame.columns]
+        self.n = len(frame)
+        self.capacity = max(capacity, self.n)
+        self.data = {}
+        # numeric column -> True while every value of the column is an integer (see to_frame())
+        self.integral = {}
+        for name in self.columns:
+            if name in frame.columns:
+                kind = frame[name].dtype.kind
+                # an empty frame (e.g. the first full_rehash() of a ticker) has object columns
+                numeric = kind in 'iuf' or (self.n == 0 and name in numeric_columns)
+                self.data[name] = _empty_column(numeric, self.capacity)
+                self.data[name][:self.n] = frame[name].values if numeric else frame[name].astype(object).values
+                if numeric:
+                    self.integral[name] = kind != 'f'
+            else:
+                self.data[name] = _empty_column(name in numeric_columns, self.capacity)
+                if name in numeric_columns:
+                    self.integral[name] = True
+        self.index = frame.index
+        self.reindexed = False
+
+        # (1) evaluation_id -> row positions
+        self.eid_rows = {}
+        for position, eid in enumerate(self.data['evaluation_id'][:self.n]):
+            self.eid_rows.setdefault(eid, []).append(position)
+        # computed on first use (see max_eid())
+        self._max_eid = None
+        # (2) period_id -> number of rows
+        self.periods = {}
+        for pid in self.data['period_id'][:self.n]:
+            self._count_period(pid, 1)
+        # (3) week-Monday of every row
+        self.mondays = np.empty(self.capacity, dtype='datetime64[D]')
+        self.mondays[:] = np.datetime64('NaT')
+        self.mondays[:self.n] = _row_mondays(self.data['year'][:self.n], self.data['week'][:self.n])
+        self._last_monday = self._max_monday()
+
+    #-----------------------------#
+    def __len__(self):
+        return self.n
+
+    #-----------------------------#
+    def _count_period(self, pid, step):
+        # a missing period_id (NaN never equals itself) is not a key
+        if pd.isnull(pid):
+            return
+        count = self.periods.get(pid, 0) + step
+        if count > 0:
+            self.periods[pid] = count
+        else:
+            self.periods.pop(pid, None)
+
+    #-----------------------------#
+    def _set(self, name, position, value):
+        """
+        Purpose: write a value to a cell; a column that gets a value that is not a number is turned into an object
+        column
+        """
+        column = self.data[name]
+        if column.dtype != object:
+            if not _numeric_value(value):
+                self.data[name] = column = column.astype(object)
+                del self.integral[name]
+            elif not (value is None or isinstance(value, numbers.Integral)):
+                self.integral[name] = False
+        column[position] = value
+
+    #-----------------------------#
+    def _max_monday(self):
+        mondays = self.mondays[:self.n]
+        mondays = mondays[~pd.isnull(mondays)]
+        return mondays.max() if len(mondays) > 0 else None
+
+    #-----------------------------#
+    def _grow(self):
+        self.capacity *= 2
+        for name in self.columns:
+            column = _empty_column(self.data[name].dtype != object, self.capacity)
+            column[:self.n] = self.data[name][:self.n]
+            self.data[name] = column
+        mondays = np.empty(self.capacity, dtype='datetime64[D]')
+        mondays[:] = np.datetime64('NaT')
+        mondays[:self.n] = self.mondays[:self.n]
+        self.mondays = mondays
+
+    #-----------------------------#
+    def has_period(self, pid):
+        """
+        :return: True if a row with this period_id exists, whatever its ticker (write_data() checks the period_id
+        column of ticker_df)
+        """
+        return pid in self.periods
+
+    #-----------------------------#
+    def last_eid(self):
+        """
+        :return: the evaluation_id of the last row
+        """
+        return self.data['evaluation_id'][self.n - 1]
+
+    #-----------------------------#
+    def max_eid(self):
+        """
+        :return: the largest evaluation_id (int)
+        """
+        if self._max_eid is None:
+            self._max_eid = int(np.nanmax(self.data['evaluation_id'][:self.n]))
+        return self._max_eid
+
+    #-----------------------------#
+    def last_monday(self):
+        """
+        :return: the latest week-Monday (week_mondays() of year/week) over all rows, as a Timestamp('')
+        """
+        return pd.Timestamp(self._last_monday) if self._last_monday is not None else None
+
+    #-----------------------------#
+    def append(self, eid):
+        """
+        Purpose: add a row at the end with only an evaluation_id (the other columns are NaN)
+        """
+        if self.n == self.capacity:
+            self._grow()
+        self._set('evaluation_id', self.n, eid)
+        self.eid_rows.setdefault(eid, []).append(self.n)
+        if self._max_eid is not None:
+            self._max_eid = max(self._max_eid, int(eid))
+        self.n += 1
+        self.reindexed = True
+
+    #-----------------------------#
+    def upsert(self, eid, values):
+        """
+        Purpose: write values to every row with this evaluation_id
+        :param values: a dictionary of column -> value
+        """
+        positions = self.eid_rows.get(eid, [])
+        for position in positions:
+            self._count_period(self.data['period_id'][position], -1)
+            for name, value in values.items():
+                if name not in self.data:
+                    self.columns.append(name)
+                    self.data[name] = _empty_column(False, self.capacity)
+                self._set(name, position, value)
+            self._count_period(self.data['period_id'][position], 1)
+
+            old_monday = self.mondays[position]
+            try:
+                new_monday = week_mondays([int(self.data['year'][position])], [int(self.data['week'][position])])[0]
+            except (TypeError, ValueError):     # no year/week (NaN)
+                new_monday = np.datetime64('NaT')
+            self.mondays[position] = new_monday
+            if not pd.isnull(new_monday) and (self._last_monday is None or new_monday > self._last_monday):
+                self._last_monday = new_monday
+            elif not pd.isnull(old_monday) and old_monday == self._last_monday and \
+                    (pd.isnull(new_monday) or new_monday < old_monday):
+                # the latest row moved back: recompute the maximum
+                self._last_monday = self._max_monday()
+
+    #-----------------------------#
+    def to_frame(self):
+        """
+        Purpose: export the rows as a pd df (see the module docstring). The table keeps the returned frame as its
+        source.
+        """
+        columns = {}
+        for name in self.columns:
+            values = self.data[name][:self.n]
+            if self.n == 0:
+                # no rows: the object columns of an empty frame, as before
+                values = values.astype(object)
+            elif self.integral.get(name) and not np.any(np.isnan(values)):
+                values = values.astype(np.int64)
+            columns[name] = values
+        frame = pd.DataFrame(columns, columns=self.columns)
+        if not self.reindexed:
+            frame.index = self.index
+        frame = frame.infer_objects()
+        self.source = frame
+        return frame
+
+# END MODULE
+# -------------------------------------------------------------
@@ -0,0 +1,179 @@
+"""
+Purpose:
+Persistent catalog of the monthly RS Metrics reports in the working directory of statistical-balancing-multithreaded.py
+(RS Metrics_<ticker>_<Mon>_<year>.xlsx/.csv; "..._Final.csv" reports have already been balanced).
+
+The driver used to regex-scan os.listdir() on every run, split every file name, grow two DataFrames one cell at a
+time with set_value() and then probe every ticker x year x month combination with try/except. The catalog keeps the
+parsed file names in
+
+    <directory>/.rsm_cache/report_catalog.json
+
+and is updated incrementally: if the modification time of the directory is unchanged since the last scan (no file
+was added, removed or renamed), the directory is not listed at all; otherwise only the names that are not in the
+catalog yet are parsed, and the names that are gone are dropped. The fiscal quarter is not stored, it is looked up
+in the fiscal_calendar when the reports are listed (see reports()), so that an edited quarter matrix takes effect.
+
+A file name is a report if, as in the former scan:
+- it contains the keyword (case-insensitive) and ends with .xlsx or .csv
+- its second "_"-separated part (the ticker) has at most 4 characters
+- its third and fourth parts are the month abbreviation and the year
+Names that pass the first two tests but not the third are kept in the catalog as skipped (see skipped()).
+"""
+
+##############################################################
+# Imports:                                                   #
+##############################################################
+
+import os
+import re
+import json
+import time
+
+from rsm_tools import fiscal_calendar
+from rsm_tools.report_store import cache_folder, _replace_file
+
+##############################################################
+# Parameters                                                 #
+##############################################################
+
+# bump this whenever the layout of the catalog file (or the parsing of the names) changes
+catalog_version = 1
+catalog_name = "report_catalog.json"
+default_keyword = "RS Metrics_"
+report_extensions = (".xlsx", ".csv")
+# the last part of the name of a report that has already been balanced
+final_suffix = "Final.csv"
+# a directory mtime this close to the time of the scan may hide a change made during the same clock tick: rescan
+racy_seconds = 2.0
+
+##############################################################
+# Non-class Methods                                          #
+##############################################################
+
+def parse_name(name, keyword=default_keyword):
+    """
+    Purpose: parse the file name of a report
+    :return: [ticker, year, month, final] (final: 1 for a "..._Final.csv" report), 'skip' if the name looks like a
+    report but cannot be parsed, or None if it is not a report
+    """
+    if re.search(re.escape(keyword), name, re.IGNORECASE) is None or not name.endswith(report_extensions):
+        return None
+    parts = name.split("_")
+    if len(parts) < 2 or len(parts[1]) > 4:
+        return None
+    try:
+        month = fiscal_calendar.month_number(parts[2])
+        year = int(parts[3].split(".")[0])
+    except (IndexError, ValueError):
+        return 'skip'
+    return [parts[1], year, month, int(parts[-1] == final_suffix)]
+
+#-------------------------------
+
+def from_directory(directory, keyword=default_keyword):
+    """
+    Purpose: open the catalog of a directory and bring it up to date
+    :return: a report_catalog
+    """
+    catalog = report_catalog(directory, keyword)
+    catalog.refresh()
+    return catalog
+
+##############################################################
+# Class Declarations:                                        #
+##############################################################
+
+class report_catalog:
+    """
+    class report_catalog() takes the following arguments:
+        1) the report directory
+        2) (optional) the keyword of the report names
+        3) (optional) the path of the catalog file. Defaults to <directory>/.rsm_cache/report_catalog.json
+
+    METHODS:
+        1) refresh, which brings the catalog up to date with the directory (and saves it)
+        2) reports, which lists the (ticker, year, month, quarter, report name) of the reports
+        3) skipped, which lists the names that look like reports but cannot be parsed
+    """
+
+    def __init__(self, directory, keyword=default_keyword, path=None):
+        self.directory = directory
+        self.keyword = keyword
+        self.path = path or os.path.join(directory, cache_folder, catalog_name)
+        # file name -> parse_name() of every name in the directory
+        self.files = {}
+        self.mtime = None
+        self.scanned = None
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as fh:
+                    data = json.load(fh)
+            except ValueError:
+                data = {}
+            if data.get('version') == catalog_version and data.get('keyword') == keyword:
+                self.files = data['files']
+                self.mtime = data['mtime']
+                self.scanned = data['scanned']
+
+    #-----------------------------#
+    def refresh(self):
+        """
+        Purpose: list the directory if it changed since the last scan, parse the new names and save the catalog
+        :return: True if the directory was listed
+        """
+        mtime = os.path.getmtime(self.directory)
+        if self.mtime is not None and mtime == self.mtime and self.scanned - mtime > racy_seconds:
+            return False
+        scanned = time.time()
+        names = os.listdir(self.directory)
+        files = {}
+        for name in names:
+            files[name] = self.files[name] if name in self.files else parse_name(name, self.keyword)
+        self.files, self.mtime, self.scanned = files, mtime, scanned
+        self._save()
+        return True
+
+    #-----------------------------#
+    def _save(self):
+        cache_dir = os.path.dirname(self.path)
+        if not os.path.isdir(cache_dir):
+            try:
+                os.makedirs(cache_dir)
+            except OSError:
+                if not os.path.isdir(cache_dir):
+                    raise
+        tmp_path = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(tmp_path, 'w') as fh:
+            json.dump({'version': catalog_version, 'keyword': self.keyword, 'mtime': self.mtime,
+                       'scanned': self.scanned, 'files': self.files}, fh, sort_keys=True)
+        _replace_file(tmp_path, self.path)
+
+    #-----------------------------#
+    def reports(self, calendar, final=False):
+        """
+        Purpose: the reports of the catalog, one per (ticker, year, month): if several files share a key, the first
+        name in sorted order (which is what the former groupby(...).index[0] picked)
+        :param calendar: the fiscal_calendar of the quarter matrix (see fiscal_calendar.py)
+        :param final: True lists the "..._Final.csv" reports instead of the unbalanced ones
+        :return: a list of (ticker, year, month, quarter, report name) tuples, sorted by (ticker, year, month)
+        """
+        first = {}
+        for name in sorted(self.files):
+            parsed = self.files[name]
+            if isinstance(parsed, list) and parsed[3] == int(final):
+                first.setdefault((parsed[0], parsed[1], parsed[2]), name)
+        keys = sorted(first)
+        quarters = calendar.quarter_array([key[0] for key in keys], [key[2] for key in keys]) if keys else []
+        return [(str(ticker), year, month, int(quarter), str(first[(ticker, year, month)]))
+                for (ticker, year, month), quarter in zip(keys, quarters)]
+
+    #-----------------------------#
+    def skipped(self):
+        """
+        :return: the names that contain the keyword but cannot be parsed, sorted
+        """
+        return sorted(name for name, parsed in self.files.items() if parsed == 'skip')
+
+# END MODULE
+# -------------------------------------------------------------
@@ -0,0 +1,119 @@
+"""
+Purpose:
+Sorted report-date index of the RS Metrics weekly reports in a directory.
+
+quant_metrics.metric_calc() (weekly-signal-generation.py) and the report pooling of user_script_balance.py used to
+select the reports of a window with a linear scan over zip(weekly_reports, report_dt), once per window and per
+ticker. The report_index sorts the report dates once; the reports dated within [lower, upper) are then found with
+two binary searches (np.searchsorted).
+
+The reports are returned in directory listing order (the order of the original scan), so that the pooled record
+arrays are stacked in exactly the same order as before.
+
+from_directory() keeps one index per (directory, prefix, extension) in memory and rebuilds it only when the
+listing of the matching reports changes (i.e. when reports are added, removed or renamed).
+"""
+
+##############################################################
+# Imports:                                                   #
+##############################################################
+
+import os
+
+import numpy as np
+import pandas as pd
+
+##############################################################
+# Parameters                                                 #
+##############################################################
+
+# (directory, prefix, extension) -> report_index
+_directory_cache = {}
+
+##############################################################
+# Non-class Methods                                          #
+##############################################################
+
+def report_date(report_name):
+    """
+    Purpose: obtain the date of a report from all alphanumerics after the last underscore of its file name
+    :param report_name: e.g. RS_Metrics_weekly_20160711.csv
+    :return: a Timestamp('')
+    """
+    datestr = report_name[report_name.rindex('_')+1:].split(".")[0]
+    return pd.to_datetime(datestr)
+
+#-------------------------------
+
+def from_directory(directory, prefix, extension=".csv"):
+    """
+    Purpose: the (cached) report_index of all reports in directory whose name starts with prefix and ends with
+    extension
+    :return: a report_index
+    """
+    key = (os.path.abspath(directory), prefix, extension)
+    reports = [f for f in os.listdir(directory) if f.startswith(prefix) and f.endswith(extension)]
+    cached = _directory_cache.get(key)
+    if cached is not None and cached.reports == reports:
+        return cached
+    index = report_index(reports)
+    _directory_cache[key] = index
+    return index
+
+##############################################################
+# Class Declarations:                                        #
+##############################################################
+
+class report_index:
+    """
+    class report_index() takes the following arguments:
+        1) a list of report file names
+        2) (optional) the list of their dates. Defaults to report_date() of every name
+
+    ATTRIBUTES:
+        reports, dates: the report names and their dates (Timestamp('')) in the order they were given
+
+    METHODS:
+        1) between, which returns the reports dated within [lower, upper)
+        2) span/sorted_reports, the same selection as a [lo, hi) range of the reports sorted by date
+    """
+
+    def __init__(self, reports, dates=None):
+        self.reports = list(reports)
+        if dates is None:
+            dates = [report_date(report) for report in self.reports]
+        self.dates = list(dates)
+        # stable sort, so that reports with the same date keep their relative order
+        self._order = np.argsort(np.array(self.dates, dtype='datetime64[ns]'), kind='mergesort')
+        self._sorted_dates = np.array(self.dates, dtype='datetime64[ns]')[self._order]
+
+    #-----------------------------#
+    def sorted_reports(self):
+        """
+        :return: the list of report names sorted by date (the positions used by span())
+        """
+        return [self.reports[i] for i in self._order]
+
+    #-----------------------------#
+    def span(self, lower, upper):
+        """
+        :param lower: a Timestamp(''); reports dated on/after lower are included
+        :param upper: a Timestamp(''); reports dated before upper are included
+        :return: (lo, hi), the reports sorted_reports()[lo:hi]
+        """
+        lo = np.searchsorted(self._sorted_dates, np.datetime64(pd.Timestamp(lower).to_datetime64(), 'ns'), 'left')
+        hi = np.searchsorted(self._sorted_dates, np.datetime64(pd.Timestamp(upper).to_datetime64(), 'ns'), 'left')
+        return int(lo), int(hi)
+
+    #-----------------------------#
+    def between(self, lower, upper):
+        """
+        :param lower: a Timestamp(''); reports dated on/after lower are included
+        :param upper: a Timestamp(''); reports dated before upper are included
+        :return: a list of report names, in the order of self.reports
+        """
+        lo, hi = self.span(lower, upper)
+        return [self.reports[i] for i in sorted(self._order[lo:hi])]
+
+# END MODULE
+# -------------------------------------------------------------
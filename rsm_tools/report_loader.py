@@ -0,0 +1,290 @@
+"""
+Purpose:
+Typed loader of RS Metrics weekly reports, shared by weekly-signal-generation.py, user_script_balance.py and
+statistical-balancing-multithreaded.py (their gen_data()).
+
+gen_data() used to let pandas infer every dtype, run two Python-level str.replace passes over 'Address' (see the
+former df_str_replace()) and convert the frame with to_records(), which copies all columns once more into object
+fields. load_report() instead:
+- reads only the columns of report_columns (the columns that the signal and the type balancing use)
+- encodes the text columns (Ticker, Address) and 'Notes' as categoricals (pd.factorize), so that the ',' / '#'
+  translation of 'Address' and the date parsing of 'Notes' run once per distinct value instead of once per row.
+  The fields themselves are decoded back to fixed-width strings: a structured array cannot hold a pd.Categorical,
+  and the consumers of the records (the signal path, the balancing classes) compare and write them as text
+- parses 'Notes' to datetime64[D] (NaT where a date cannot be parsed)
+- writes every column straight into one preallocated structured array with fixed dtypes (report_schema)
+
+The integer columns of report_schema are stored as int64 unless a value is missing, fractional or not a number
+(e.g. '--'), in which case the column is float64 (NaN). Text fields are fixed-width strings, missing values are ''.
+
+.xlsx reports (the monthly reports of statistical-balancing-multithreaded.py) are parsed with pd.read_excel only the
+first time they are seen: the 'Data' sheet is then converted to a columnar sidecar file, one array per column,
+
+    <report directory>/.rsm_cache/<report name>.<key>.npz
+
+and every later load_report() call reads the sidecar instead. The key is built from the workbook's size and mtime,
+so an edited/re-downloaded workbook is converted again (older sidecars of the same workbook are removed).
+
+The narrow, parsed form is only for the signal path of weekly-signal-generation.py. Records that are handed to a
+balancing class (class_Wk_Type_Balance_*, the classes of statistical-balancing-multithreaded.py) live outside this
+tree and may read any column of the report and expect 'Notes' as text, so they are loaded with
+load_balancing_report(): every column, 'Notes' unparsed (text, or datetime64 if the sheet holds date cells). A
+report_store of that form keeps its cache in balancing_cache_dir(), apart from the cache of the narrow form.
+"""
+
+##############################################################
+# Imports:                                                   #
+##############################################################
+
+import os
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from rsm_tools.report_store import cache_folder, _replace_file
+
+try:
+    from string import maketrans as _maketrans
+except ImportError:     # python 3
+    _maketrans = str.maketrans
+
+try:
+    _unicode = unicode
+except NameError:       # python 3
+    _unicode = None
+
+##############################################################
+# Parameters                                                 #
+##############################################################
+
+# the columns read by default, see load_report()
+report_columns = ['Ticker', 'Notes', 'Week End', 'Cars', 'Spaces', 'Year', 'Address']
+# column -> kind: 'text' (categorical, fixed-width string), 'date' (datetime64[D]) or 'int' (int64, float64 if
+# values are missing)
+report_schema = {
+    'Ticker': 'text',
+    'Notes': 'date',
+    'Week End': 'int',
+    'Cars': 'int',
+    'Spaces': 'int',
+    'Year': 'int',
+    'Address': 'text',
+}
+# the text columns in which ',' and '#' are replaced by ' ' (the former df_str_replace(dataframe, ['Address']))
+replace_columns = ['Address']
+# the row number field that to_records() used to add in front of the columns
+index_field = 'index'
+
+# the folder (inside the report_store cache folder) of the cached reports in the form of load_balancing_report()
+balancing_cache_folder = "balancing"
+
+# bump this whenever the layout of the xlsx sidecar files changes
+sidecar_version = 1
+# name of the sidecar array that holds the column order
+_columns_key = '__columns__'
+
+_translation = _maketrans(',#', '  ')
+
+##############################################################
+# Non-class Methods                                          #
+##############################################################
+
+def _text_value(value):
+    """
+    Purpose: a cell -> str. In python 2, read_excel returns non-ASCII text as unicode, which str() cannot encode:
+    it is encoded as utf-8 (the bytes that read_csv returns for the same text)
+    """
+    if _unicode is not None and isinstance(value, _unicode):
+        return value.encode('utf-8')
+    return str(value)
+
+#-------------------------------
+
+def _text_field(values, translate=False):
+    """
+    Purpose: text values -> fixed-width string array; the translation runs on the distinct values only
+    """
+    codes, categories = pd.factorize(values)
+    categories = np.array([_text_value(value) for value in categories] + [''], dtype=str)
+    if translate and len(categories) > 1:
+        categories = np.char.translate(categories, _translation)
+    # code -1 (missing) picks the trailing ''
+    return categories[codes]
+
+#-------------------------------
+
+def _date_field(values):
+    """
+    Purpose: date text -> datetime64[D] array; every distinct date is parsed once
+    """
+    codes, categories = pd.factorize(values)
+    categories = pd.to_datetime(pd.Series(np.asarray(categories, dtype=object)), errors='coerce')
+    categories = np.append(categories.values.astype('datetime64[D]'), np.datetime64('NaT', 'D'))
+    return categories[codes]
+
+#-------------------------------
+
+def _int_field(values):
+    """
+    Purpose: numeric values -> int64 array, or float64 if a value is missing or fractional
+    """
+    values = np.asarray(pd.to_numeric(values, errors='coerce'), dtype=np.float64)
+    if np.all(np.isfinite(values)) and np.all(values == np.floor(values)):
+        return values.astype(np.int64)
+    return values
+
+#-------------------------------
+
+def frame_records(frame, parse_notes=True):
+    """
+    Purpose: convert a report frame into a structured array (see the module docstring)
+    :param frame: a pd df of a report
+    :param parse_notes: parse 'Notes' to datetime64[D]; False keeps it as it is (text, or the datetime64 values of
+    date cells)
+    :return: a np record array with the field index_field followed by the columns of frame
+    """
+    fields = []
+    for name in frame.columns:
+        kind = report_schema.get(name)
+        values = frame[name].values
+        if kind == 'date' and not parse_notes and values.dtype != object:
+            fields.append((name, values))
+        elif kind == 'text' or (kind == 'date' and not parse_notes):
+            fields.append((name, _text_field(values, name in replace_columns)))
+        elif kind == 'date':
+            fields.append((name, _date_field(values)))
+        elif kind == 'int':
+            fields.append((name, _int_field(values)))
+        elif values.dtype == object:
+            # a column outside of the schema (columns=None): text, as report_store.fixed_width_records() would store it
+            fields.append((name, _text_field(values, name in replace_columns)))
+        else:
+            fields.append((name, values))
+
+    records = np.empty(len(frame), dtype=[(index_field, np.int64)] + [(name, a.dtype) for name, a in fields])
+    records[index_field] = np.arange(len(frame))
+    for name, values in fields:
+        records[name] = values
+    return records.view(np.recarray)
+
+#-------------------------------
+
+def sidecar_key(path):
+    """
+    Purpose: build the sidecar key of a workbook from its size and modification time
+    :param path: full path of the workbook
+    :return: a short hex string
+    """
+    raw = "{}|{}|{}".format(os.path.getsize(path), repr(os.path.getmtime(path)), sidecar_version)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+#-------------------------------
+
+def _sidecar_column(values):
+    """
+    Purpose: a sheet column -> an array that np.savez stores without pickling (object columns become text, with
+    '' for missing values, datetime columns stay datetime64)
+    """
+    values = np.asarray(values)
+    if values.dtype != object:
+        return values
+    return np.array(['' if pd.isnull(value) else _text_value(value) for value in values], dtype=str)
+
+#-------------------------------
+
+def _write_sidecar(path, sidecar_path, names, arrays):
+    cache_dir = os.path.dirname(sidecar_path)
+    if not os.path.isdir(cache_dir):
+        try:
+            os.makedirs(cache_dir)
+        except OSError:
+            if not os.path.isdir(cache_dir):
+                raise
+    arrays = dict(("c{}".format(i), values) for i, values in enumerate(arrays))
+    arrays[_columns_key] = np.array(names, dtype=str)
+    # write to a temporary file first so that a half-written sidecar is never picked up
+    tmp_path = "{}.{}.tmp".format(sidecar_path, os.getpid())
+    with open(tmp_path, 'wb') as fh:
+        np.savez(fh, **arrays)
+    _replace_file(tmp_path, sidecar_path)
+
+    # drop the sidecars of older versions (size/mtime) of the same workbook
+    prefix = os.path.basename(path) + "."
+    current = os.path.basename(sidecar_path)
+    for f in os.listdir(cache_dir):
+        if f.startswith(prefix) and f.endswith(".npz") and f != current:
+            try:
+                os.remove(os.path.join(cache_dir, f))
+            except OSError:
+                pass
+
+#-------------------------------
+
+def read_xlsx(path, cache=True):
+    """
+    Purpose: read the 'Data' sheet of a workbook, through its columnar sidecar (see the module docstring)
+    :param path: full path of the workbook
+    :param cache: read/write the sidecar; False always parses the workbook
+    :return: a pd df
+    """
+    if not cache:
+        return pd.read_excel(path, 'Data')
+    directory, name = os.path.split(path)
+    sidecar_path = os.path.join(directory, cache_folder, "{}.{}.npz".format(name, sidecar_key(path)))
+    if os.path.exists(sidecar_path):
+        with np.load(sidecar_path, allow_pickle=False) as sidecar:
+            names = [str(name) for name in sidecar[_columns_key]]
+            arrays = [sidecar["c{}".format(i)] for i in range(len(names))]
+    else:
+        frame = pd.read_excel(path, 'Data')
+        # the first read returns the sidecar's columns too, so that every read of a workbook yields the same frame
+        names = [_text_value(name) for name in frame.columns]
+        arrays = [_sidecar_column(frame[name].values) for name in frame.columns]
+        _write_sidecar(path, sidecar_path, names, arrays)
+    return pd.DataFrame(dict(zip(names, arrays)), columns=names)
+
+#-------------------------------
+
+def load_report(in_report, directory, columns=report_columns, parse_notes=True):
+    """
+    Purpose: parse a weekly report (.csv, or .xlsx with a 'Data' sheet) into a typed structured array
+    :param in_report: the file name of the report
+    :param directory: the directory of the report
+    :param columns: the columns to read (columns missing from the report are skipped); None reads all columns
+    :param parse_notes: parse 'Notes' to datetime64[D]; False keeps it as it is (see frame_records())
+    :return: a np record array (see frame_records())
+    """
+    path = os.path.join(directory, in_report)
+    wanted = None if columns is None else set(columns)
+    extension = os.path.splitext(in_report)[1]
+    if extension == ".xlsx":
+        frame = read_xlsx(path)
+        if wanted is not None:
+            frame = frame[[name for name in frame.columns if name in wanted]]
+    elif extension == ".csv":
+        # the dtypes are left to pandas: _int_field() coerces the integer columns, whatever was inferred
+        usecols = (lambda name: name in wanted) if wanted is not None else None
+        frame = pd.read_csv(path, usecols=usecols)
+    else:
+        raise ValueError("Incorrect Report Type (.xlsx or .csv ONLY!): {}".format(in_report))
+    return frame_records(frame, parse_notes)
+
+#-------------------------------
+
+def load_balancing_report(in_report, directory):
+    """
+    Purpose: load_report() in the form the balancing classes get: every column, 'Notes' as text
+    """
+    return load_report(in_report, directory, columns=None, parse_notes=False)
+
+#-------------------------------
+
+def balancing_cache_dir(directory):
+    """
+    :return: the report_store cache directory of the reports of directory in the form of load_balancing_report()
+    """
+    return os.path.join(directory, cache_folder, balancing_cache_folder)
+
+# END MODULE
+# -------------------------------------------------------------
@@ -0,0 +1,297 @@
+"""
+Purpose:
+Parse-once cache for RS Metrics weekly reports (RS_Metrics_weekly_*.csv).
+
+quant_metrics.metric_calc() used to call gen_data() (pd.read_csv + df_str_replace + to_records) for every report
+in every window, for every ticker. The report_store parses each report exactly once, writes the resulting record
+array to a binary .npy file next to the reports and memory-maps it on every later request.
+
+Layout:
+- <report directory>/.rsm_cache/<report name>.<key>.npy     the parsed records, stably sorted by Ticker
+- <report directory>/.rsm_cache/<report name>.<key>.json    row count + {ticker: [first row, last row + 1]}
+
+The key is built from the report's absolute path and mtime, so an edited/re-downloaded report is re-parsed
+automatically. Because the records are sorted by Ticker, c[c['Ticker'] == ticker] is simply a contiguous row range
+of the cached array, i.e. a zero-copy slice of the memory map.
+"""
+
+##############################################################
+# Imports:                                                   #
+##############################################################
+
+import os
+import json
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+##############################################################
+# Parameters                                                 #
+##############################################################
+
+# bump this whenever the on-disk layout of a cached report changes
+cache_version = 2
+# name of the cache folder that is created inside the report directory
+cache_folder = ".rsm_cache"
+
+##############################################################
+# Non-class Methods                                          #
+##############################################################
+
+def cache_key(path):
+    """
+    Purpose: build the cache key of a report from its absolute path and modification time
+    :param path: full path of the report
+    :return: a short hex string
+    """
+    raw = "{}|{}|{}".format(os.path.abspath(path), repr(os.path.getmtime(path)), cache_version)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+#-------------------------------
+
+def fixed_width_records(records):
+    """
+    Purpose: np.save/np.load(mmap_mode='r') cannot handle object fields, which is what to_records() yields for
+    string columns. Convert every object field to a fixed-width string field (missing values become '').
+    :param records: a np structured (record) array, e.g. the output of gen_data()
+    :return: a np record array with the same field names and no object fields
+    """
+    if not any(records.dtype.fields[name][0] == object for name in records.dtype.names):
+        # e.g. the typed output of report_loader.load_report()
+        return records
+    arrays = []
+    for name in records.dtype.names:
+        column = np.asarray(records[name])
+        if column.dtype == object:
+            column = np.array(pd.Series(column).fillna('').astype(str).tolist(), dtype=str)
+        arrays.append(column)
+    return np.rec.fromarrays(arrays, names=list(records.dtype.names))
+
+#-------------------------------
+
+def common_dtype(arrays):
+    """
+    Purpose: determine a dtype that all of the given record arrays can be cast to. Fixed-width string fields of
+    different reports have different widths, which np.hstack() refuses to combine.
+    :param arrays: a list of np record arrays that share the same field names
+    :return: a np.dtype
+    """
+    names = arrays[0].dtype.names
+    fields = []
+    for name in names:
+        field_types = [a.dtype.fields[name][0] for a in arrays]
+        kinds = set(t.kind for t in field_types)
+        if len(kinds) > 1 and kinds & set('SU') and kinds - set('SUO'):
+            # a column that is text in one report but entirely empty (float NaN) in another: keep it as text
+            width = max([t.itemsize // (4 if t.kind == 'U' else 1) for t in field_types if t.kind in 'SU'] + [32])
+            fields.append((name, np.dtype(str).kind + str(width)))
+        else:
+            field_type = field_types[0]
+            for t in field_types[1:]:
+                field_type = np.promote_types(field_type, t)
+            fields.append((name, field_type))
+    return np.dtype(fields)
+
+#-------------------------------
+
+def stack_slices(arrays):
+    """
+    Purpose: concatenate ticker slices from several reports into one record array (replacement for np.hstack over
+    report_dict, which fails whenever the string widths of the reports differ)
+    :param arrays: a list of np record arrays that share the same field names
+    :return: a single np record array
+    """
+    if len(arrays) == 0:
+        raise ValueError("no report slices to stack")
+    dtype = common_dtype(arrays)
+    return np.concatenate([np.asarray(a).astype(dtype) for a in arrays]).view(np.recarray)
+
+#-------------------------------
+
+def pool_slices(arrays, extra_fields=(), select=None):
+    """
+    Purpose: streaming replacement of stack_slices() + recfunctions.rec_append_fields() + a boolean filter.
+    The pooled row count is determined first, then one record array (including the extra fields) is allocated and
+    every slice's selected rows are copied straight into it: a single copy of the pooled data, and peak memory is
+    about the size of the final pooled set.
+    :param arrays: a list of np record arrays that share the same field names (e.g. report ticker slices)
+    :param extra_fields: a list of (name, dtype) fields appended after the fields of the arrays
+    :param select: (optional) a function of a record array that returns (keep, values): a boolean array of the rows
+    to pool and a dictionary of extra field name -> values for all rows of the array. Defaults to all rows (extra
+    fields are then left at 0)
+    :return: a single np record array
+    """
+    if len(arrays) == 0:
+        raise ValueError("no report slices to pool")
+    base = common_dtype(arrays)
+    dtype = np.dtype(base.descr + [(name, np.dtype(t).str) for name, t in extra_fields])
+
+    # (1) the rows to pool and the extra field values of every slice
+    selections = []
+    count = 0
+    for a in arrays:
+        if select is None:
+            keep, values = None, {}
+            count += len(a)
+        else:
+            keep, values = select(a)
+            count += int(np.count_nonzero(keep))
+        selections.append((keep, values))
+
+    # (2) one allocation, filled field by field
+    pooled = np.zeros(count, dtype=dtype)
+    position = 0
+    for a, (keep, values) in zip(arrays, selections):
+        n = len(a) if keep is None else int(np.count_nonzero(keep))
+        if n == 0:
+            continue
+        target = slice(position, position + n)
+        for name in base.names:
+            column = a[name]
+            pooled[name][target] = column if keep is None else column[keep]
+        for name, _ in extra_fields:
+            if name in values:
+                pooled[name][target] = values[name] if keep is None else np.asarray(values[name])[keep]
+        position += n
+    return pooled.view(np.recarray)
+
+#-------------------------------
+
+def _replace_file(tmp_path, final_path):
+    # another process may have written the same cache entry in the meantime; keep whichever landed first
+    try:
+        os.rename(tmp_path, final_path)
+    except OSError:
+        if os.path.exists(final_path):
+            os.remove(tmp_path)
+        else:
+            raise
+
+##############################################################
+# Class Declarations:                                        #
+##############################################################
+
+class report_store:
+    """
+    class report_store() takes the following arguments:
+        1) the directory that contains the weekly reports
+        2) loader, a function with the signature of gen_data(in_report, directory) that returns a record array
+        3) (optional) the cache directory. Defaults to <directory>/.rsm_cache
+
+    METHODS:
+        1) load, which returns the full (memory-mapped) record array of a report
+        2) ticker_slice, which returns the rows of a single ticker in a report as a zero-copy slice
+        3) warm, which parses every given report into the cache up front
+    """
+
+    def __init__(self, directory, loader, cache_dir=None):
+        self.directory = directory
+        self.loader = loader
+        if cache_dir is None:
+            cache_dir = os.path.join(directory, cache_folder)
+        self.cache_dir = cache_dir
+        # report name -> (cache key, records, ticker index). Avoids re-opening memory maps within a process
+        self._reports = {}
+
+    #-----------------------------#
+    def _cache_paths(self, report_name, key):
+        stem = os.path.join(self.cache_dir, "{}.{}".format(report_name, key))
+        return stem + ".npy", stem + ".json"
+
+    #-----------------------------#
+    def _write_cache(self, report_name, key):
+        """
+        Parse the report with self.loader, sort it by ticker and write the .npy/.json cache pair
+        """
+        if not os.path.isdir(self.cache_dir):
+            try:
+                os.makedirs(self.cache_dir)
+            except OSError:
+                if not os.path.isdir(self.cache_dir):
+                    raise
+        records = fixed_width_records(self.loader(report_name, self.directory))
+
+        # (1) a stable sort keeps the original row order within each ticker
+        ticker_index = {}
+        if 'Ticker' in records.dtype.names and len(records) > 0:
+            records = records[np.argsort(records['Ticker'], kind='mergesort')]
+            tickers = records['Ticker']
+            bounds = np.concatenate(([0], np.flatnonzero(tickers[1:] != tickers[:-1]) + 1, [len(tickers)]))
+            for lo, hi in zip(bounds[:-1], bounds[1:]):
+                ticker_index[str(tickers[lo])] = [int(lo), int(hi)]
+
+        # (2) write to temporary files first so that a half-written cache entry is never picked up
+        npy_path, idx_path = self._cache_paths(report_name, key)
+        suffix = ".{}.tmp".format(os.getpid())
+        with open(npy_path + suffix, 'wb') as fh:
+            np.save(fh, np.asarray(records))
+        with open(idx_path + suffix, 'w') as fh:
+            json.dump({'rows': len(records), 'tickers': ticker_index}, fh)
+        _replace_file(npy_path + suffix, npy_path)
+        _replace_file(idx_path + suffix, idx_path)
+
+        # (3) drop cache entries of older versions (mtimes) of the same report
+        prefix = report_name + "."
+        for f in os.listdir(self.cache_dir):
+            if f.startswith(prefix) and not f.startswith(prefix + key) and os.path.splitext(f)[1] in (".npy", ".json"):
+                try:
+                    os.remove(os.path.join(self.cache_dir, f))
+                except OSError:
+                    pass
+
+    #-----------------------------#
+    def _entry(self, report_name):
+        key = cache_key(os.path.join(self.directory, report_name))
+        entry = self._reports.get(report_name)
+        if entry is not None and entry[0] == key:
+            return entry
+        npy_path, idx_path = self._cache_paths(report_name, key)
+        if not (os.path.exists(npy_path) and os.path.exists(idx_path)):
+            self._write_cache(report_name, key)
+        with open(idx_path) as fh:
+            index = json.load(fh)
+        # an empty array cannot be memory-mapped
+        mmap_mode = 'r' if index['rows'] > 0 else None
+        records = np.load(npy_path, mmap_mode=mmap_mode).view(np.recarray)
+        entry = (key, records, index['tickers'])
+        self._reports[report_name] = entry
+        return entry
+
+    #-----------------------------#
+    def load(self, report_name):
+        """
+        :param report_name: the file name of a report in self.directory
+        :return: the full record array of the report (read-only, sorted by Ticker)
+        """
+        return self._entry(report_name)[1]
+
+    #-----------------------------#
+    def ticker_slice(self, report_name, ticker):
+        """
+        Equivalent of c = gen_data(report_name, directory); c[c['Ticker'] == ticker]
+        :param report_name: the file name of a report in self.directory
+        :param ticker: a ticker string
+        :return: a read-only view of the ticker's rows (empty if the ticker does not exist in the report)
+        """
+        key, records, index = self._entry(report_name)
+        lo, hi = index.get(ticker, (0, 0))
+        return records[lo:hi]
+
+    #-----------------------------#
+    def tickers(self, report_name):
+        """
+        :return: the list of tickers contained in a report
+        """
+        return sorted(self._entry(report_name)[2])
+
+    #-----------------------------#
+    def warm(self, report_names):
+        """
+        Purpose: make sure every report in report_names is parsed into the cache
+        """
+        for report_name in report_names:
+            self._entry(report_name)
+
+# END MODULE
+# -------------------------------------------------------------
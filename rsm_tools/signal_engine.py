@@ -0,0 +1,240 @@
+"""
+Purpose:
+Vectorized signal engine for the stitched Metrics_Log panel (replacement for the row loop in
+quant_metrics.calc_signal_rsm()).
+
+For every row of a ticker's yoy_change series the original loop took the subset
+    yoy_change.iloc[(i - window - 1): i - block_off]
+dropped NaN values, and compared yoy_change[i] against mean +/- stdh * std of that subset:
+    yoy_change > upper hurdle -> 1 | yoy_change < lower hurdle -> -1 | otherwise (or yoy_change is NaN) -> 0
+
+For i >= max(window + 1, block_off) that subset is a trailing window of (window + 1 - block_off) values that ends
+block_off + 1 rows before i, so it is computed here with a grouped shift + rolling mean/std (NaN-aware,
+min_periods=1). For the first few rows of a ticker the slice bounds are negative, which iloc wraps around to the end
+of the series; those rows are evaluated with the exact same slice so that the output stays identical to the loop.
+Their signals therefore depend on the length of the series and change when rows are appended (see head_signals()).
+
+reference_signals() keeps the original loop. It is not used by the scripts: it exists only as the reference of
+check_reference_equivalence() and of the tests in tests/test_signal_engine.py. The module also runs the check on
+generated panels when it is executed:
+
+    python -m rsm_tools.signal_engine [--panels 20] [--seed 0]
+"""
+
+##############################################################
+# Imports:                                                   #
+##############################################################
+
+import sys
+import argparse
+
+import numpy as np
+import pandas as pd
+
+##############################################################
+# Parameters                                                 #
+##############################################################
+
+# the (window, block_off) combinations of the equivalence check (see main()); signal_window / signal_block_off of
+# weekly-signal-generation.py are 12 / 0
+check_windows = [(12, 0), (6, 0), (12, 2), (4, 1), (3, 5)]
+check_stdh = 0.75
+
+##############################################################
+# Non-class Methods                                          #
+##############################################################
+
+def _group_keys(panel, by):
+    if by is not None and by in panel.columns:
+        # groupby() drops NaN keys; keep those rows in a group of their own
+        return pd.Series(np.asarray(panel[by], dtype=object)).fillna('').values
+    return np.zeros(len(panel), dtype=int)
+
+#-------------------------------
+
+def _hurdle_signal(yoy, mean, std, stdh):
+    with np.errstate(invalid='ignore'):
+        upper = mean + std * stdh
+        lower = mean - std * stdh
+        return np.where(yoy > upper, 1, np.where(yoy < lower, -1, 0))
+
+#-------------------------------
+
+def rolling_signals(panel, stdh, window, block_off, by='ticker', position_offset=0):
+    """
+    Purpose: compute the -1/0/1 signal of every row of the panel in one grouped pass
+    :param panel: a pd df with a 'yoy_change' column, ordered by evaluation_id within each ticker
+    :param stdh: the desired multiplier to stdev
+    :param window: the number of preceding periods to use in a window with summary statistic attributes
+    :param block_off: the number of most recent periods to leave out of the window
+    :param by: the column that identifies a ticker's series (None to treat the panel as a single series)
+    :param position_offset: the number of rows of every series that precede the panel (incremental updates, where
+    only the tail of a series is loaded). Signals are exact for the rows that have window + 1 rows of look-back
+    within the panel.
+    :return: an int np array of signals, aligned with the rows of panel
+    """
+    yoy = np.asarray(panel['yoy_change'], dtype=float)
+    signals = np.zeros(len(yoy), dtype=int)
+    if len(yoy) == 0 or window < 0:
+        return signals
+
+    keys = _group_keys(panel, by)
+    series = pd.Series(yoy)
+    grouped = series.groupby(keys, sort=False)
+    position = grouped.cumcount().values + position_offset
+
+    # (1) rows with a complete look-back window: rolling statistics over the lagged series
+    span = window + 1 - block_off
+    if span > 0:
+        lagged = grouped.shift(block_off + 1).groupby(keys, sort=False)
+        mean = lagged.transform(lambda s: s.rolling(span, min_periods=1).mean()).values
+        std = lagged.transform(lambda s: s.rolling(span, min_periods=1).std()).values
+        signals = _hurdle_signal(yoy, mean, std, stdh)
+
+    # (2) the first rows of every ticker, where either end of the slice is negative: replicate the original
+    # (wrapping) iloc slice
+    head = np.flatnonzero(position < max(window + 1, block_off))
+    if len(head) > 0:
+        members = grouped.indices
+        for j in head:
+            ticker_yoy = series.iloc[members[keys[j]]]
+            p = position[j] - position_offset
+            subset = ticker_yoy.iloc[(p - window - 1): p - block_off].dropna()
+            signals[j] = _hurdle_signal(yoy[j], subset.mean(), subset.std(), stdh)
+
+    # (3) signal must not be n/a. Set to 0
+    signals[np.isnan(yoy)] = 0
+    return signals
+
+#-------------------------------
+
+def head_signals(yoy, stdh, window, block_off):
+    """
+    Purpose: the signals of the first max(window + 1, block_off) rows of a single series, whose wrapping slice reads
+    the end of the series (incremental updates recompute them whenever the series grows)
+    :param yoy: the yoy_change of the whole series, a float array. Only its first max(window + 1, block_off) and its
+    last window + 1 values are read
+    :return: an int np array of the signals of the first rows
+    """
+    series = pd.Series(np.asarray(yoy, dtype=float))
+    count = min(len(series), max(window + 1, block_off)) if window >= 0 else 0
+    signals = np.zeros(count, dtype=int)
+    for p in range(count):
+        if not np.isnan(series.iloc[p]):
+            subset = series.iloc[(p - window - 1): p - block_off].dropna()
+            signals[p] = _hurdle_signal(series.iloc[p], subset.mean(), subset.std(), stdh)
+    return signals
+
+#-------------------------------
+
+def reference_signals(element, stdh, window, block_off):
+    """
+    Purpose: the original calc_signal_rsm() row loop, kept verbatim as the reference for rolling_signals(). Only
+    check_reference_equivalence() calls it
+    :param element: a pd df of yoy's for a particular ticker, with a 0..n-1 index and evaluation_id == index + 1
+    (which is how full_rehash() builds it; the loop writes each signal to the row whose evaluation_id is i + 1)
+    :return: a np array of signals
+    """
+    element = element.copy()
+    for i, row in element.iterrows():
+        # check if yoy_change is not NA
+        if np.isnan(row['yoy_change']) == True:
+            # signal must not be n/a. Set to 0
+            element.loc[element.evaluation_id == int(i + 1), 'signal'] = 0
+            continue
+        # check if the evaluation row's window contains a start value
+        elif row.name - (row.name - window) < 0:
+            # signal must not be n/a. Set to 0
+            element.loc[element.evaluation_id == int(i + 1), 'signal'] = 0
+            continue
+        else:
+            # compute the signal
+            # (b) take the yoy_change subset over the window interval
+            subset = element['yoy_change'].iloc[(i - window - 1): i - block_off]
+            # (c) remove any NA values in this subset
+            subset = subset.dropna()
+            # (d) take the average of this subset
+            mean = subset.mean()
+            # (e) calculate the standard deviation and the hurdles
+            stdd = subset.std()
+            stdh_u = mean + stdd * stdh
+            stdh_l = mean - stdd * stdh
+            # (f) evaluate what the signal should be
+            if row['yoy_change'] > stdh_u:
+                signal = 1
+            elif row['yoy_change'] < stdh_l:
+                signal = -1
+            else:
+                signal = 0
+            # (g) update the signal for this row
+            element.loc[element.evaluation_id == int(i + 1), 'signal'] = signal
+    return element['signal'].values
+
+#-------------------------------
+
+def check_reference_equivalence(panel, stdh, window, block_off, by='ticker'):
+    """
+    Purpose: reference-equivalence check of rolling_signals() against the original loop.
+    Each ticker's rows are re-indexed 0..n-1 with evaluation_id = index + 1 before running the loop, since that is
+    the layout the loop assumes.
+    :return: a pd df of the rows where the two disagree (empty if the outputs are identical)
+    """
+    fast = rolling_signals(panel, stdh, window, block_off, by=by)
+    keys = _group_keys(panel, by)
+    slow = np.zeros(len(panel))
+    for key, members in pd.Series(keys).groupby(keys, sort=False).indices.items():
+        element = panel.iloc[members].reset_index(drop=True)
+        element['evaluation_id'] = np.arange(1, len(element) + 1)
+        slow[members] = reference_signals(element, stdh, window, block_off)
+    mismatch = np.flatnonzero(fast != slow)
+    out = panel.iloc[mismatch].copy()
+    out['signal_rolling'] = fast[mismatch]
+    out['signal_reference'] = slow[mismatch]
+    return out
+
+#-------------------------------
+
+def random_panel(random_state, tickers=3, nan_share=0.1):
+    """
+    Purpose: a generated Metrics_Log panel for the equivalence check: a few tickers of 1..60 rows each, yoy_change
+    values with NaN gaps
+    :param random_state: a np.random.RandomState
+    :return: a pd df with the columns 'ticker' and 'yoy_change', ordered by ticker
+    """
+    frames = []
+    for n in range(tickers):
+        rows = random_state.randint(1, 61)
+        yoy = random_state.normal(0.0, 0.1, rows)
+        yoy[random_state.rand(rows) < nan_share] = np.nan
+        frames.append(pd.DataFrame({'ticker': "T{}".format(n), 'yoy_change': yoy}))
+    return pd.concat(frames, ignore_index=True)
+
+#-------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check rolling_signals() against the original calc_signal_rsm() "
+                                                 "loop on generated panels")
+    parser.add_argument("--panels", type=int, default=20, help="number of generated panels (default: 20)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generated panels (default: 0)")
+    args = parser.parse_args(argv)
+
+    random_state = np.random.RandomState(args.seed)
+    mismatches = 0
+    for n in range(args.panels):
+        panel = random_panel(random_state)
+        for window, block_off in check_windows:
+            out = check_reference_equivalence(panel, check_stdh, window, block_off)
+            if len(out) > 0:
+                print("panel {}, window {}, block_off {}: {} rows differ".format(n, window, block_off, len(out)))
+                mismatches += len(out)
+    print("{} panels x {} (window, block_off) combinations: {} rows differ".format(args.panels, len(check_windows),
+                                                                                   mismatches))
+    return 1 if mismatches else 0
+
+#-------------------------------
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
+
+# END MODULE
+# -------------------------------------------------------------
@@ -0,0 +1,206 @@
+"""
+Purpose:
+Opt-in per-stage instrumentation of quant_metrics (weekly-signal-generation.py), see
+quant_metrics.enable_profiling().
+
+Every stage (an instrumented method call, or a block wrapped in stage()) records:
+- wall time, inclusive (with nested stages) and self (without them)
+- the ticker it ran for (the ticker argument of the method, or the ticker that ticker_stitch() is evaluating)
+- the number of rows it processed (see the rows functions passed to instrument())
+- the peak resident set size of the process at the end of the stage (getrusage; None where unavailable)
+
+table() aggregates the records into a flat profile, per stage and per (stage, ticker). chrome_trace() writes the
+records in the Chrome trace event format (load the file in chrome://tracing or https://ui.perfetto.dev).
+
+Nothing is recorded unless a stage_profiler is created: stage(None, ...) is a no-op.
+"""
+
+##############################################################
+# Imports:                                                   #
+##############################################################
+
+import os
+import sys
+import json
+import timeit
+import contextlib
+
+try:
+    import resource
+except ImportError:     # Windows
+    resource = None
+
+##############################################################
+# Parameters                                                 #
+##############################################################
+
+try:
+    _string_types = basestring
+except NameError:       # python 3
+    _string_types = str
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+_rss_unit = 1.0 / 1024 if sys.platform != 'darwin' else 1.0 / (1024 * 1024)
+
+##############################################################
+# Non-class Methods                                          #
+##############################################################
+
+def peak_rss_mb():
+    """
+    :return: the peak resident set size of the process in MB, or None if it cannot be determined
+    """
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _rss_unit
+
+#-------------------------------
+
+@contextlib.contextmanager
+def stage(profiler, name, ticker=None, rows=None):
+    """
+    Purpose: record the enclosed block as a stage of profiler (no-op if profiler is None)
+    """
+    if profiler is None:
+        yield
+        return
+    with profiler.stage(name, ticker, rows):
+        yield
+
+##############################################################
+# Class Declarations:                                        #
+##############################################################
+
+class stage_profiler:
+    """
+    class stage_profiler() takes no arguments
+
+    ATTRIBUTES:
+        records: a list of dictionaries, one per finished stage (name, ticker, start, seconds, self_seconds, rows,
+        peak_rss_mb, depth)
+        current_ticker: the ticker that stages without a ticker of their own are attributed to
+
+    METHODS:
+        1) stage, a context manager that records a block
+        2) instrument, which wraps methods of an object so that every call is recorded
+        3) table, the flat profile
+        4) chrome_trace, which writes the records as Chrome trace JSON
+    """
+
+    def __init__(self):
+        self.records = []
+        self.current_ticker = None
+        self._origin = timeit.default_timer()
+        # child time of the open stages (innermost last)
+        self._open = []
+
+    #-----------------------------#
+    @contextlib.contextmanager
+    def stage(self, name, ticker=None, rows=None):
+        """
+        :param rows: the number of rows processed, or a function that returns it after the block has run
+        """
+        record = {'name': name, 'ticker': ticker if ticker is not None else self.current_ticker,
+                  'depth': len(self._open)}
+        self._open.append(0.0)
+        start = timeit.default_timer()
+        try:
+            yield record
+        finally:
+            seconds = timeit.default_timer() - start
+            children = self._open.pop()
+            if self._open:
+                self._open[-1] += seconds
+            if callable(rows):
+                try:
+                    rows = rows()
+                except Exception:
+                    rows = None
+            record.update({'start': start - self._origin, 'seconds': seconds, 'self_seconds': seconds - children,
+                           'rows': rows, 'peak_rss_mb': peak_rss_mb()})
+            self.records.append(record)
+
+    #-----------------------------#
+    def instrument(self, obj, methods, ticker_arg=0, names=None):
+        """
+        Purpose: replace methods of obj by wrappers that record every call as a stage
+        :param obj: an object (e.g. a quant_metrics instance)
+        :param methods: a dictionary of method name -> rows function or None. A rows function is called as
+        rows(obj, args, result) after the call and returns the number of rows processed.
+        :param ticker_arg: the position of the ticker argument of the methods (None: the methods take no ticker)
+        :param names: (optional) a dictionary of method name -> stage name. Defaults to the method name
+        """
+        names = names or {}
+        for name, rows in methods.items():
+            setattr(obj, name, self._wrap(obj, names.get(name, name), getattr(obj, name), rows, ticker_arg))
+
+    #-----------------------------#
+    def _wrap(self, obj, name, method, rows, ticker_arg):
+        profiler = self
+
+        def wrapper(*args, **kwargs):
+            ticker = kwargs.get('ticker')
+            if ticker is None and ticker_arg is not None and len(args) > ticker_arg \
+                    and isinstance(args[ticker_arg], _string_types):
+                ticker = args[ticker_arg]
+            outcome = {}
+            count = (lambda: rows(obj, args, outcome.get('result'))) if rows is not None else None
+            with profiler.stage(name, ticker, count):
+                outcome['result'] = method(*args, **kwargs)
+            return outcome['result']
+
+        wrapper.__name__ = name
+        wrapper.__doc__ = method.__doc__
+        return wrapper
+
+    #-----------------------------#
+    def _aggregate(self, key):
+        profile = {}
+        for record in self.records:
+            k = key(record)
+            entry = profile.setdefault(k, {'calls': 0, 'seconds': 0.0, 'self_seconds': 0.0, 'rows': 0,
+                                           'peak_rss_mb': None})
+            entry['calls'] += 1
+            entry['seconds'] += record['seconds']
+            entry['self_seconds'] += record['self_seconds']
+            entry['rows'] += record['rows'] or 0
+            if record['peak_rss_mb'] is not None:
+                entry['peak_rss_mb'] = max(entry['peak_rss_mb'] or 0.0, record['peak_rss_mb'])
+        return profile
+
+    #-----------------------------#
+    def table(self, by_ticker=False):
+        """
+        Purpose: the flat profile, ordered by self time
+        :param by_ticker: one line per (stage, ticker) instead of one line per stage
+        :return: a string
+        """
+        if by_ticker:
+            profile = self._aggregate(lambda r: (r['name'], r['ticker'] or ''))
+        else:
+            profile = self._aggregate(lambda r: (r['name'], ''))
+        lines = ["{:<28}{:>8}{:>8}{:>11}{:>11}{:>10}{:>11}{:>12}".format(
+            "stage", "ticker", "calls", "total s", "self s", "ms/call", "rows", "peak RSS MB")]
+        for (name, ticker), entry in sorted(profile.items(), key=lambda item: -item[1]['self_seconds']):
+            rss = "{:.1f}".format(entry['peak_rss_mb']) if entry['peak_rss_mb'] is not None else "n/a"
+            lines.append("{:<28}{:>8}{:>8}{:>11.3f}{:>11.3f}{:>10.2f}{:>11}{:>12}".format(
+                name, ticker, entry['calls'], entry['seconds'], entry['self_seconds'],
+                1000 * entry['seconds'] / entry['calls'], entry['rows'], rss))
+        return "\n".join(lines)
+
+    #-----------------------------#
+    def chrome_trace(self, path):
+        """
+        Purpose: write the records as complete ("X") events of the Chrome trace event format
+        :param path: the output .json file
+        """
+        events = []
+        for record in sorted(self.records, key=lambda r: (r['start'], r['depth'])):
+            events.append({'name': record['name'], 'cat': 'quant_metrics', 'ph': 'X', 'pid': os.getpid(), 'tid': 0,
+                           'ts': round(record['start'] * 1e6, 3), 'dur': round(record['seconds'] * 1e6, 3),
+                           'args': {'ticker': record['ticker'], 'rows': record['rows'],
+                                    'peak_rss_mb': record['peak_rss_mb']}})
+        with open(path, 'w') as fh:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, fh)
+
+# END MODULE
+# -------------------------------------------------------------
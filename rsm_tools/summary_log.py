@@ -0,0 +1,150 @@
+"""
+Purpose:
+Long-format accumulator of the summary results (the yoy of every model of every report) of
+statistical-balancing-multithreaded.py, with an append-only log that can be read while a run is still going:
+
+    <working directory>/balancing_results_log.csv
+
+One row per summary entry: ticker, year, month, quarter, model (the task of the driver, e.g. 'MATCH_UNMATCH'),
+chain (the summary name of the result, e.g. matched_<ZIP class name>) and yoy. The rows are added to an in-memory
+buffer as the models finish, and the buffer is appended to the log every flush_rows rows or flush_seconds seconds
+(and at close()); the log is never rewritten.
+
+The wide summary (balancing_results_summary.csv, one column per summary name, see class_yoy_to_summary_v3) is built
+once at the end of a run from the accumulated rows (entries()). pivot() gives a wide view of a partial log:
+
+    python -m rsm_tools.summary_log "<working directory>/balancing_results_log.csv" [--output <wide .csv>]
+"""
+
+##############################################################
+# Imports:                                                   #
+##############################################################
+
+import os
+import sys
+import time
+import argparse
+
+import pandas as pd
+
+##############################################################
+# Parameters                                                 #
+##############################################################
+
+# file name of the log in the working directory
+default_name = "balancing_results_log.csv"
+log_columns = ['ticker', 'year', 'month', 'quarter', 'model', 'chain', 'yoy']
+# the columns that identify a report (the rows of pivot())
+report_columns = ['ticker', 'year', 'month', 'quarter']
+# the buffer is appended to the log when it holds this many rows or when its oldest row is this old
+flush_rows = 100
+flush_seconds = 30.0
+
+##############################################################
+# Non-class Methods                                          #
+##############################################################
+
+def read_log(path):
+    """
+    Purpose: read a log, e.g. the log of a run that is still going
+    :return: a pd df with the log_columns (the rows in the order in which they were flushed)
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return pd.DataFrame(columns=log_columns)
+    return pd.read_csv(path, dtype={'ticker': str, 'model': str, 'chain': str})
+
+#-------------------------------
+
+def pivot(frame):
+    """
+    Purpose: the wide view of long-format rows: one row per report (ticker, year, month, quarter), one yoy column
+    per chain, in the order in which the chains first appear (the last row wins if a chain is repeated)
+    :param frame: a pd df with the log_columns (see read_log())
+    :return: a pd df
+    """
+    if len(frame) == 0:
+        return pd.DataFrame(columns=report_columns)
+    chains = list(pd.unique(frame['chain']))
+    frame = frame.drop_duplicates(report_columns + ['chain'], keep='last')
+    wide = frame.set_index(report_columns + ['chain'])['yoy'].unstack('chain')
+    return wide.reindex(columns=chains).reset_index()
+
+#-------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write the wide summary of a (partial) balancing results log")
+    parser.add_argument("log", help="path of the log")
+    parser.add_argument("--output", default=None, help="output .csv (default: print the summary)")
+    args = parser.parse_args(argv)
+
+    wide = pivot(read_log(args.log.replace("\"", "")))
+    if args.output is None:
+        print(wide.to_string(index=False))
+    else:
+        wide.to_csv(args.output, index=False)
+
+##############################################################
+# Class Declarations:                                        #
+##############################################################
+
+class summary_log:
+    """
+    class summary_log() takes the path of the log and starts a new log (a log of an earlier run is replaced)
+
+    METHODS:
+        1) add, which adds the summary entries of a model
+        2) flush, which appends the buffered rows to the log
+        3) entries, which returns every row of the run, in the order of their keys
+        4) close, which flushes the buffer
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # (key, row) of every row of the run, and the rows that have not been flushed yet
+        self.rows = []
+        self.buffer = []
+        self.buffered_since = None
+        with open(path, 'w') as fh:
+            fh.write(",".join(log_columns) + "\n")
+
+    #-----------------------------#
+    def add(self, key, ticker, year, month, quarter, model, summary):
+        """
+        Purpose: buffer the summary entries of a model (and flush the buffer if it is due)
+        :param key: the sort key of the model in the wide summary (see entries())
+        :param summary: its summary entries, a list of (yoy, summary name)
+        """
+        for i, (yoy, chain) in enumerate(summary):
+            row = [ticker, year, month, quarter, model, chain, yoy]
+            self.rows.append(((key, i), row))
+            self.buffer.append(row)
+        if self.buffered_since is None:
+            self.buffered_since = time.time()
+        if len(self.buffer) >= flush_rows or time.time() - self.buffered_since >= flush_seconds:
+            self.flush()
+
+    #-----------------------------#
+    def flush(self):
+        if self.buffer:
+            pd.DataFrame(self.buffer, columns=log_columns).to_csv(self.path, mode='a', header=False, index=False)
+        self.buffer = []
+        self.buffered_since = None
+
+    #-----------------------------#
+    def entries(self):
+        """
+        :return: the rows of the run (lists in the order of log_columns), sorted by their keys
+        """
+        return [row for key, row in sorted(self.rows, key=lambda entry: entry[0])]
+
+    #-----------------------------#
+    def close(self):
+        self.flush()
+
+#-------------------------------
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
+
+# END MODULE
+# -------------------------------------------------------------
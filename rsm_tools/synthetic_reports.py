@@ -0,0 +1,124 @@
+"""
+Purpose:
+Synthetic RS Metrics weekly reports, so that the weekly signal pipeline (weekly-signal-generation.py) can be run and
+benchmarked without the proprietary RS_Metrics_weekly_*.csv files.
+
+Every report RS_Metrics_weekly_<YYYYMMDD>.csv holds, for every ticker and store, the observations of the two weeks
+before the report date (cy) together with the same calendar days one year earlier (py), in the layout of the real
+reports:
+    Ticker, Notes (observation date), Week End (1 on Saturdays/Sundays), Cars, Spaces, Year, Address
+Addresses contain commas and '#' like the real ones (see report_loader.py). Fill rates follow a
+per-store level with a seasonal and a year-over-year component, plus noise; a share of the observations is missing
+(not every store is photographed every day).
+
+write_reports() also writes an empty Metrics_Log.xlsx next to the reports.
+"""
+
+##############################################################
+# Imports:                                                   #
+##############################################################
+
+import os
+import datetime
+
+import numpy as np
+import pandas as pd
+
+##############################################################
+# Parameters                                                 #
+##############################################################
+
+report_prefix = "RS_Metrics_weekly"
+report_columns = ['Ticker', 'Notes', 'Week End', 'Cars', 'Spaces', 'Year', 'Address']
+log_columns = ['date', 'evaluation_id', 'month', 'period_id', 'signal', 'ticker', 'week', 'year', 'yoy_change']
+default_tickers = ['BBY', 'HD', 'WMT']
+# number of days before the report date that a report covers
+days_covered = 14
+# probability that a store/day observation is missing
+missing_share = 0.3
+
+##############################################################
+# Non-class Methods                                          #
+##############################################################
+
+def prior_year(date):
+    """
+    Purpose: the same month/day one year earlier (02-29 becomes 02-28)
+    """
+    try:
+        return date.replace(year=date.year - 1)
+    except ValueError:
+        return date.replace(year=date.year - 1, day=28)
+
+#-------------------------------
+
+def ticker_names(n):
+    """
+    Purpose: n ticker symbols: the default tickers first, then generated ones (T000, T001, ...)
+    """
+    names = list(default_tickers[:n])
+    names += ["T{:03d}".format(i) for i in range(n - len(names))]
+    return names
+
+#-------------------------------
+
+def report_frame(report_date, tickers, stores, rng):
+    """
+    Purpose: the rows of a single weekly report
+    :param report_date: a datetime.date
+    :param tickers: a list of ticker strings
+    :param stores: the number of stores per ticker
+    :param rng: a np.random.RandomState
+    :return: a pd df with report_columns
+    """
+    days = [report_date - datetime.timedelta(days=back) for back in range(1, days_covered + 1)]
+    # (day, 1 for cy / 0 for py)
+    days = [(day, 1.0) for day in days] + [(prior_year(day), 0.0) for day in days]
+    rows = []
+    for t, ticker in enumerate(tickers):
+        # store sizes, store fill levels and the ticker's yoy trend are fixed across reports
+        spaces = 80 + 10 * ((np.arange(stores) * 7 + t) % 40)
+        level = 0.25 + 0.005 * ((np.arange(stores) * 37 + t * 11) % 100)
+        trend = 0.03 * np.sin(t + 1)
+        for day, cy in days:
+            observed = np.flatnonzero(rng.rand(stores) >= missing_share)
+            weekend = int(day.weekday() >= 5)
+            season = 0.1 * np.sin(2 * np.pi * day.timetuple().tm_yday / 365.25)
+            fill = level[observed] + season + 0.1 * weekend + trend * cy + 0.05 * rng.randn(len(observed))
+            cars = np.clip(np.round(fill * spaces[observed]), 0, spaces[observed]).astype(int)
+            for s, c in zip(observed, cars):
+                rows.append((ticker, day.strftime('%Y-%m-%d'), weekend, int(c), int(spaces[s]), day.year,
+                             "{} Main St, Suite #{}".format(100 + s, s)))
+    return pd.DataFrame(rows, columns=report_columns)
+
+#-------------------------------
+
+def write_reports(directory, tickers=3, weeks=70, stores=20, start="2015-09-07", seed=0, prefix=report_prefix):
+    """
+    Purpose: write a directory of synthetic weekly reports plus an empty Metrics_Log.xlsx
+    :param directory: the output directory (created if missing)
+    :param tickers: the number of tickers, or a list of ticker strings
+    :param weeks: the number of weekly reports
+    :param stores: the number of stores per ticker
+    :param start: the date of the first report (reports are 7 days apart)
+    :param seed: the random seed; the same arguments always produce the same reports
+    :return: the list of report file names
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    if isinstance(tickers, int):
+        tickers = ticker_names(tickers)
+    rng = np.random.RandomState(seed)
+    first = pd.Timestamp(start).date()
+    names = []
+    for w in range(weeks):
+        report_date = first + datetime.timedelta(days=7 * w)
+        name = "{}_{}.csv".format(prefix, report_date.strftime('%Y%m%d'))
+        report_frame(report_date, tickers, stores, rng).to_csv(os.path.join(directory, name), index=False)
+        names.append(name)
+    pd.DataFrame([], columns=log_columns).to_excel(os.path.join(directory, "Metrics_Log.xlsx"),
+                                                   sheet_name='Sheet1', index=False)
+    return names
+
+# END MODULE
+# -------------------------------------------------------------
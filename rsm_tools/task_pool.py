@@ -0,0 +1,239 @@
+"""
+Purpose:
+Process pool for graphs of dependent tasks. statistical-balancing-multithreaded.py runs the balancing models of all
+of its reports through it: the single models of every report are independent of each other, and a hybrid model
+(e.g. TYPE -> REGCENSUS) only needs the output of the models it is built on.
+
+A task is a tuple (key, function name, args, dependencies):
+- key: any hashable (e.g. (report number, model))
+- the function is looked up by name in the script module, which every worker process loads once (see
+  ticker_pool.load_script()), and is called as function(deps, *args)
+- dependencies: a dictionary of name -> key of another task (a list of keys is read as {key: key}). deps holds the
+  return values of these tasks under their names
+
+All tasks without dependencies are submitted at once; a task is submitted as soon as all of its dependencies have
+finished. A task whose dependency failed is never run, it fails with the message "dependency <key> failed". The
+return value of a task is kept in the parent only until every task that depends on it has been submitted.
+
+run() yields (key, value, error) in the order the tasks finish; error is None or the traceback of the failure. The
+caller is responsible for applying the results in a deterministic order.
+"""
+
+##############################################################
+# Imports:                                                   #
+##############################################################
+
+import sys
+import time
+import traceback
+import multiprocessing
+
+from rsm_tools import ticker_pool
+
+##############################################################
+# Parameters                                                 #
+##############################################################
+
+# module name under which the workers load the (hyphenated) script
+worker_module = "rsm_task_worker"
+# seconds between two polls of the running tasks
+poll_interval = 0.05
+
+# the script module of a worker process (see _init_worker)
+_worker_module = None
+
+##############################################################
+# Non-class Methods                                          #
+##############################################################
+
+def _dependencies(task):
+    depends = task[3]
+    if isinstance(depends, dict):
+        return depends
+    return dict((key, key) for key in depends)
+
+#-------------------------------
+
+def _call(module, function_name, args, deps):
+    try:
+        return getattr(module, function_name)(deps, *args), None
+    except Exception:
+        return None, traceback.format_exc()
+
+#-------------------------------
+
+def _init_worker(script_path, module_name, paths):
+    global _worker_module
+    # e.g. the directory of the balancing classes, which the script imports by name
+    for path in paths:
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    _worker_module = ticker_pool.load_script(script_path, module_name)
+
+#-------------------------------
+
+def _run_task(job):
+    function_name, args, deps = job
+    return _call(_worker_module, function_name, args, deps)
+
+#-------------------------------
+
+def _failed_dependents(key, dependents, failed):
+    """
+    Purpose: mark every task that depends (directly or not) on key as failed
+    :return: a list of (key, error) of the newly failed tasks
+    """
+    out = []
+    stack = [key]
+    while stack:
+        for child in dependents.get(stack.pop(), []):
+            if child not in failed:
+                failed.add(child)
+                out.append((child, "dependency {} failed".format(key)))
+                stack.append(child)
+    return out
+
+#-------------------------------
+
+def run(tasks, workers=1, script_path=None, module=None, paths=(), collect=None, module_name=worker_module):
+    """
+    Purpose: run a graph of tasks (see the module docstring)
+    :param tasks: a list of (key, function name, args, dependencies) tuples. A dependency must be the key of a task
+    that comes earlier in the list
+    :param workers: the number of worker processes (1: run the tasks in this process, in list order)
+    :param script_path: full path of the script that defines the task functions (workers > 1)
+    :param module: the module that defines the task functions (workers == 1). Defaults to loading script_path
+    :param paths: (optional) directories that the workers add to sys.path before they load the script
+    :param collect: (optional) function(key, value) -> what run() yields for a task that succeeded. Defaults to the
+    return value itself
+    :return: a generator of (key, value, error) tuples
+    """
+    if workers > 1 and len(tasks) > 1:
+        return _run_pool(tasks, workers, script_path, paths, collect, module_name)
+    if module is None:
+        module = ticker_pool.load_script(script_path, module_name)
+    return _run_serial(tasks, module, collect)
+
+#-------------------------------
+
+def _run_serial(tasks, module, collect):
+    graph = _graph(tasks)
+    for task in tasks:
+        key = task[0]
+        if key in graph.failed:
+            continue
+        function_name, args, deps = graph.start(key)
+        value, error = _call(module, function_name, args, deps)
+        ready, failed = graph.finish(key, value, error)
+        if error is not None:
+            yield key, None, error
+            for child, child_error in failed:
+                yield child, None, child_error
+            continue
+        yield key, collect(key, value) if collect is not None else value, None
+
+#-------------------------------
+
+def _run_pool(tasks, workers, script_path, paths, collect, module_name):
+    graph = _graph(tasks)
+    running = {}
+    pool = multiprocessing.Pool(processes=min(workers, len(tasks)), initializer=_init_worker,
+                                initargs=(script_path, module_name, list(paths)))
+
+    def submit(key):
+        running[key] = pool.apply_async(_run_task, (graph.start(key),))
+
+    try:
+        for task in tasks:
+            if graph.waiting[task[0]] == 0:
+                submit(task[0])
+        while running:
+            done = [key for key in running if running[key].ready()]
+            if not done:
+                time.sleep(poll_interval)
+                continue
+            for key in done:
+                try:
+                    value, error = running.pop(key).get()
+                except Exception:       # e.g. the return value could not be pickled
+                    value, error = None, traceback.format_exc()
+                ready, failed = graph.finish(key, value, error)
+                for child in ready:
+                    submit(child)
+                if error is not None:
+                    yield key, None, error
+                    for child, child_error in failed:
+                        yield child, None, child_error
+                    continue
+                yield key, collect(key, value) if collect is not None else value, None
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+##############################################################
+# Class Declarations:                                        #
+##############################################################
+
+class _graph:
+    """
+    class _graph() takes a list of tasks and keeps the state of a run: the dependencies of every task, the tasks
+    that depend on it, and the return values that tasks which have not started yet still need
+    """
+
+    def __init__(self, tasks):
+        self.tasks = dict((task[0], task) for task in tasks)
+        self.depends = dict((task[0], _dependencies(task)) for task in tasks)
+        self.dependents = {}
+        # key -> the number of its dependencies that have not finished yet
+        self.waiting = {}
+        for key, depends in self.depends.items():
+            self.waiting[key] = len(set(depends.values()))
+            for d in set(depends.values()):
+                self.dependents.setdefault(d, []).append(key)
+        # key -> the number of its dependents that have not started yet
+        self.unstarted = dict((key, len(self.dependents.get(key, []))) for key in self.depends)
+        self.values = {}
+        self.failed = set()
+
+    #-----------------------------#
+    def start(self, key):
+        """
+        :return: (function name, args, deps) of a task that starts (or is dropped because it failed); the values
+        that no other task needs any more are released
+        """
+        depends = self.depends[key]
+        deps = None
+        if key not in self.failed:
+            deps = dict((name, self.values[d]) for name, d in depends.items())
+        for d in set(depends.values()):
+            self.unstarted[d] -= 1
+            if self.unstarted[d] == 0:
+                self.values.pop(d, None)
+        return self.tasks[key][1], self.tasks[key][2], deps
+
+    #-----------------------------#
+    def finish(self, key, value, error):
+        """
+        :return: (the dependents that can start now, [(key, error)] of the dependents that fail because of key)
+        """
+        if error is not None:
+            self.failed.add(key)
+            failed = _failed_dependents(key, self.dependents, self.failed)
+            # the failed tasks never start: release what they would have needed
+            for child, child_error in failed:
+                self.start(child)
+            return [], failed
+        if self.unstarted[key] > 0:
+            self.values[key] = value
+        ready = []
+        for child in self.dependents.get(key, []):
+            self.waiting[child] -= 1
+            if self.waiting[child] == 0 and child not in self.failed:
+                ready.append(child)
+        return ready, []
+
+# END MODULE
+# -------------------------------------------------------------
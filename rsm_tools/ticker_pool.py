@@ -0,0 +1,101 @@
+"""
+Purpose:
+Process pool for the full rehash of weekly-signal-generation.py. Every ticker's full_rehash() is independent of the
+other tickers, so ticker_stitch(rehash=True, workers=n) fans the tickers out to n worker processes and collates the
+ticker_df frames they return.
+
+Every worker builds its own quant_metrics instance once (pool initializer) from the script file, without reading
+Metrics_Log.xlsx. The weekly reports are parsed into the report_store cache by the parent before the pool starts,
+so the workers only memory-map the cached .npy files: the report data is shared through the OS page cache instead of
+being pickled to every process.
+"""
+
+##############################################################
+# Imports:                                                   #
+##############################################################
+
+import os
+import sys
+import multiprocessing
+
+##############################################################
+# Parameters                                                 #
+##############################################################
+
+# module name under which the workers load the (hyphenated) script
+worker_module = "rsm_weekly_signal_worker"
+
+# the quant_metrics instance of a worker process (see _init_worker)
+_worker_metrics = None
+
+##############################################################
+# Non-class Methods                                          #
+##############################################################
+
+def load_script(script_path, module_name=worker_module):
+    """
+    Purpose: import a script by file path (the script names contain hyphens and cannot be imported by name)
+    :param script_path: full path of the script (.py)
+    :return: the module
+    """
+    if script_path.endswith(".pyc"):
+        script_path = script_path[:-1]
+    # the script imports its balancing classes and rsm_tools from its own directory
+    script_dir = os.path.dirname(os.path.abspath(script_path))
+    if script_dir not in sys.path:
+        sys.path.insert(0, script_dir)
+    try:
+        import importlib.util
+        spec = importlib.util.spec_from_file_location(module_name, script_path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    except ImportError:
+        import imp
+        module = imp.load_source(module_name, script_path)
+    return module
+
+#-------------------------------
+
+def _init_worker(script_path, metrics_log, class_name):
+    global _worker_metrics
+    module = load_script(script_path)
+    _worker_metrics = getattr(module, class_name)(metrics_log, load_log=False)
+
+#-------------------------------
+
+def _rehash_ticker(job):
+    ticker, ticker_df, date_interval, apply_balancing = job
+    _worker_metrics.ticker_df = ticker_df
+    _worker_metrics.full_rehash(ticker, date_interval, apply_balancing=apply_balancing)
+    return ticker, _worker_metrics.ticker_df
+
+#-------------------------------
+
+def rehash_tickers(script_path, metrics_log, ticker_frames, date_interval, apply_balancing, workers,
+                   class_name="quant_metrics"):
+    """
+    Purpose: run full_rehash() for several tickers in a process pool
+    :param script_path: full path of weekly-signal-generation.py
+    :param metrics_log: full path of Metrics_Log.xlsx (see quant_metrics.__init__)
+    :param ticker_frames: a list of (ticker, ticker_df) tuples; ticker_df is the ticker's subset of Metrics_Log
+    :param date_interval: see full_rehash()
+    :param apply_balancing: see full_rehash()
+    :param workers: the number of worker processes
+    :param class_name: the name of the class in the script
+    :return: a dictionary of ticker -> ticker_df after full_rehash()
+    """
+    jobs = [(ticker, ticker_df, date_interval, apply_balancing) for ticker, ticker_df in ticker_frames]
+    pool = multiprocessing.Pool(processes=min(workers, max(len(jobs), 1)), initializer=_init_worker,
+                                initargs=(script_path, metrics_log, class_name))
+    try:
+        results = dict(pool.imap_unordered(_rehash_ticker, jobs))
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return results
+
+# END MODULE
+# -------------------------------------------------------------
@@ -0,0 +1,251 @@
+"""
+Purpose:
+Precomputed week calendar for the date walking in quant_metrics.full_rehash()/write_data()
+(weekly-signal-generation.py).
+
+The script used to build Monday dates with datetime.strptime(<year>-W<week>-1, "%Y-W%W-%w") string round trips
+and patch the year-boundary cases with heuristics. The week_calendar computes a table over the report date range
+once and answers the same questions with array lookups.
+
+Table columns (one row per day):
+- years, months, weeks (ISO week, i.e. Timestamp.week)
+- wrk_wks: the work-week of the month (get_week_of_month())
+- mondays: the "Monday constructor" of the script, strptime(<year>-W<ISO week>-1, "%Y-W%W-%w"). Note that this
+  mixes the ISO week number with the %W (first-Monday-of-the-year) week numbering; the heuristics in window_end()
+  were written against exactly this behaviour, so it is kept.
+- period_ids: "<year>-<month>-<wrk_wk>"
+- the year-clamped window end of a window that starts on that day (one column per date_interval, built on demand)
+
+Dates are taken at day resolution. A lookup outside the table rebuilds the table over the wider range.
+"""
+
+##############################################################
+# Imports:                                                   #
+##############################################################
+
+import calendar
+import datetime
+
+import numpy as np
+import pandas as pd
+
+##############################################################
+# Parameters                                                 #
+##############################################################
+
+# number of days added on both sides of the requested range when the table is built
+margin_days = 400
+
+_day = np.timedelta64(1, 'D')
+
+##############################################################
+# Non-class Methods                                          #
+##############################################################
+
+def get_week_of_month(date):
+    date = date.to_pydatetime()
+
+    days_this_month = calendar.mdays[date.month]
+    for i in range(1, days_this_month):
+        d = datetime.datetime(date.year, date.month, i)
+        if d.day - d.weekday() > 0:
+            startdate = d
+            break
+    # now we canuse the modulo 7 appraoch
+    return (date - startdate).days //7 + 1
+
+#-------------------------------
+
+def _weekday(days):
+    # 1970-01-01 was a Thursday (Monday = 0)
+    return (days.astype('datetime64[D]').astype(np.int64) + 3) % 7
+
+#-------------------------------
+
+def _iso_weeks(index):
+    try:
+        return np.asarray(index.isocalendar().week, dtype=np.int64)
+    except AttributeError:
+        return np.asarray(index.week, dtype=np.int64)
+
+#-------------------------------
+
+def _year_start(years):
+    return (np.asarray(years, dtype=np.int64) - 1970).astype('datetime64[Y]').astype('datetime64[D]')
+
+#-------------------------------
+
+def week_mondays(years, weeks):
+    """
+    Purpose: vectorized strptime(<year>-W<week>-1, "%Y-W%W-%w"): week 1 starts on the first Monday of the year,
+    week 0 is the (partial) week before it
+    :param years: int np array
+    :param weeks: int np array
+    :return: datetime64[D] np array
+    """
+    weeks = np.asarray(weeks, dtype=np.int64)
+    jan1 = _year_start(years)
+    first_weekday = _weekday(jan1)
+    week_0_length = (7 - first_weekday) % 7
+    offset = np.where(weeks == 0, -first_weekday, week_0_length + 7 * (weeks - 1))
+    return jan1 + offset * _day
+
+#-------------------------------
+
+def _first_work_day(weekday_of_first):
+    # get_week_of_month(): the first day d of the month with d.day - d.weekday() > 0
+    for k in range(1, 8):
+        if k - (weekday_of_first + k - 1) % 7 > 0:
+            return k
+
+##############################################################
+# Class Declarations:                                        #
+##############################################################
+
+class week_calendar:
+    """
+    class week_calendar() takes the following arguments:
+        1) the first date to cover (e.g. the first report date)
+        2) the last date to cover (e.g. the last report date)
+
+    METHODS:
+        1) week, work_week, monday, period_id: lookups of a single date
+        2) first_window_start, window_end: the year-clamped window bounds walked by full_rehash()
+    (see also week_mondays(), the Monday constructor for arrays of (year, week), e.g. the rows of Metrics_Log)
+    """
+
+    def __init__(self, first_date, last_date):
+        self._build(pd.Timestamp(first_date), pd.Timestamp(last_date))
+
+    #-----------------------------#
+    def _build(self, first_date, last_date):
+        self.origin = np.datetime64(first_date.date(), 'D') - margin_days * _day
+        end = np.datetime64(last_date.date(), 'D') + margin_days * _day
+        self.days = np.arange(self.origin, end + _day, dtype='datetime64[D]')
+        index = pd.DatetimeIndex(self.days)
+        self.years = np.asarray(index.year, dtype=np.int64)
+        self.months = np.asarray(index.month, dtype=np.int64)
+        self.weeks = _iso_weeks(index)
+
+        # (1) work-week of the month
+        month_start = self.days.astype('datetime64[M]').astype('datetime64[D]')
+        first_work_day = np.array([_first_work_day(w) for w in range(7)])[_weekday(month_start)]
+        day_of_month = (self.days - month_start) // _day + 1
+        self.wrk_wks = (day_of_month - first_work_day) // 7 + 1
+
+        # (2) Monday constructor and period_id
+        self.mondays = week_mondays(self.years, self.weeks)
+        self.period_ids = ["{}-{}-{}".format(y, m, w) for y, m, w in zip(self.years, self.months, self.wrk_wks)]
+
+        # (3) window ends by date_interval (see window_end())
+        self._window_ends = {}
+
+    #-----------------------------#
+    def _position(self, date):
+        day = np.datetime64(pd.Timestamp(date).date(), 'D')
+        i = int((day - self.origin) // _day)
+        if i < 0 or i >= len(self.days):
+            covered_first = pd.Timestamp(self.days[0] + margin_days * _day)
+            covered_last = pd.Timestamp(self.days[-1] - margin_days * _day)
+            self._build(min(covered_first, pd.Timestamp(day)), max(covered_last, pd.Timestamp(day)))
+            i = int((day - self.origin) // _day)
+        return i
+
+    #-----------------------------#
+    def week(self, date):
+        """
+        :return: the ISO week of date (Timestamp.week)
+        """
+        return int(self.weeks[self._position(date)])
+
+    #-----------------------------#
+    def work_week(self, date):
+        """
+        :return: get_week_of_month(date)
+        """
+        return int(self.wrk_wks[self._position(date)])
+
+    #-----------------------------#
+    def monday(self, date):
+        """
+        :return: strptime(<year of date>-W<ISO week of date>-1, "%Y-W%W-%w") as a Timestamp('')
+        """
+        return pd.Timestamp(self.mondays[self._position(date)])
+
+    #-----------------------------#
+    def period_id(self, date):
+        """
+        :return: "<year>-<month>-<work-week of the month>" of date
+        """
+        return self.period_ids[self._position(date)]
+
+    #-----------------------------#
+    def first_window_start(self, first_period):
+        """
+        Purpose: the start of the first window of full_rehash()
+        1) the Monday constructor of first_period, minus one week: in some calendar weeks the constructed Monday
+        is after first_period, and no report (not even the first one) may be left out
+        2) if that Monday falls in the previous year, start on 01/01 instead: periods must not overlap years
+        (a data-set may only have a py and a cy year)
+        :param first_period: the date of the first report
+        :return: a Timestamp('')
+        """
+        monday_date_start = self.monday(first_period) - datetime.timedelta(days=7)
+        if monday_date_start.year < first_period.year:
+            return pd.Timestamp(datetime.date(first_period.year, 1, 1))
+        return monday_date_start
+
+    #-----------------------------#
+    def _build_window_ends(self, date_interval):
+        """
+        Window end of every day of the table as a window start. The rules are those of the original loop in
+        full_rehash():
+        1) date_end = date_start + date_interval weeks, moved to the Monday constructor of date_end. For some
+        weeks the constructor returns the following Monday: an exact +7 days difference is taken back.
+        2) if the constructed Monday is in another year than date_end (e.g. 01/01/2016 is in ISO week 53, which
+        the constructor places in 2017), the heuristic rebuilds the date from its day/month and year - 1. The
+        original pd.to_datetime(ddmmyy) parse of that string is kept as is.
+        3) periods must not overlap years: an end date in the year after date_start is capped to 12/31 of
+        date_start's year, unless date_start already is 12/31.
+        """
+        # window starts whose raw end date is still inside the table
+        n = max(len(self.days) - 7 * date_interval, 0)
+        starts = self.days[:n]
+        raw_position = np.arange(n) + 7 * date_interval
+        raw_ends = self.days[raw_position]
+        mondays = self.mondays[raw_position]
+        mondays = np.where(mondays - raw_ends == 7 * _day, mondays - 7 * _day, mondays)
+        raw_years = self.years[raw_position]
+
+        monday_years = mondays.astype('datetime64[Y]').astype(np.int64) + 1970
+        ends = mondays.copy()
+        for i in np.flatnonzero(monday_years != raw_years):
+            monday = pd.Timestamp(mondays[i])
+            adj_str = "{:02d}{:02d}{}".format(monday.day, monday.month, str(monday.year - 1)[2:])
+            ends[i] = np.datetime64(pd.to_datetime(adj_str).date(), 'D')
+
+        start_years = self.years[:n]
+        end_years = ends.astype('datetime64[Y]').astype(np.int64) + 1970
+        dec31 = _year_start(start_years + 1) - _day
+        cap = (end_years > start_years) & (starts != dec31)
+        window_ends = np.empty(len(self.days), dtype='datetime64[D]')
+        window_ends[:] = np.datetime64('NaT')
+        window_ends[:n] = np.where(cap, dec31, ends)
+        self._window_ends[date_interval] = window_ends
+
+    #-----------------------------#
+    def window_end(self, date_start, date_interval):
+        """
+        :param date_start: a window start (Timestamp(''))
+        :param date_interval: the number of weeks between window starts
+        :return: the year-clamped window end of date_start, as a Timestamp('') (see _build_window_ends())
+        """
+        # make sure the raw end date is inside the table (this may rebuild it)
+        self._position(pd.Timestamp(date_start) + pd.Timedelta(days=7 * date_interval))
+        i = self._position(date_start)
+        if date_interval not in self._window_ends:
+            self._build_window_ends(date_interval)
+        return pd.Timestamp(self._window_ends[date_interval][i])
+
+# END MODULE
+# -------------------------------------------------------------
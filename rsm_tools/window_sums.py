@@ -0,0 +1,158 @@
+"""
+Purpose:
+Prefix-sum grid of the Cars/Spaces sums of one ticker, for the unbalanced yoy of overlapping windows in
+quant_metrics.full_rehash() (weekly-signal-generation.py).
+
+Consecutive windows pool mostly the same reports (with date_interval=1, all but one report of a window are also
+pooled by the next window), yet metric_calc()/yoy_calc() used to stack the reports, classify and filter every record
+and re-sum Cars/Spaces with boolean masks for every window. The window_sums grid makes one pass over the ticker's
+records instead:
+
+- grid[k, d, w] = the Cars (Spaces, record count) sum of the records of the first k reports (sorted by date) that
+  were observed on date d (the parsed 'Notes') and have 'Week End' category w (0: weekday, 1: weekend, 2: any other
+  value)
+- the records of reports [lo, hi) per date are grid[hi] - grid[lo]
+
+Since py/cy classification and the date-band flag only depend on an observation's date (see date_bands.py), a
+window is evaluated on the distinct observation dates instead of the pooled records: the work per window no longer
+grows with the number of pooled records.
+
+The sums are only exact (bit-for-bit equal to np.sum over the pooled records, in any order) for integer-valued
+Cars/Spaces. build() returns None for any other data, and the caller falls back to pooling the records.
+"""
+
+##############################################################
+# Imports:                                                   #
+##############################################################
+
+import numpy as np
+import pandas as pd
+
+from rsm_tools import date_bands
+
+##############################################################
+# Parameters                                                 #
+##############################################################
+
+# 'Week End' categories (see the module docstring)
+weekday, weekend, other_day = 0, 1, 2
+# largest integer that float64 sums represent exactly
+_exact_limit = 2 ** 53
+
+##############################################################
+# Non-class Methods                                          #
+##############################################################
+
+def _integral(values):
+    values = np.asarray(values)
+    if values.dtype.kind in 'iub':
+        return True
+    if values.dtype.kind != 'f':
+        return False
+    return bool(np.all(np.isfinite(values)) and np.all(values == np.floor(values)))
+
+#-------------------------------
+
+def _week_end_category(values):
+    values = np.asarray(values)
+    if values.dtype.kind not in 'iubf':
+        return np.full(len(values), other_day, dtype=int)
+    return np.where(values == 1, weekend, np.where(values == 0, weekday, other_day))
+
+#-------------------------------
+
+def build(report_store, sorted_reports, ticker):
+    """
+    Purpose: build the window_sums grid of a ticker
+    :param report_store: the report_store of the weekly reports (see report_store.py)
+    :param sorted_reports: the report names sorted by date (report_index.sorted_reports())
+    :param ticker: a ticker string
+    :return: a window_sums, or None if the records of the ticker are not suited (see the module docstring)
+    """
+    slices = [report_store.ticker_slice(report, ticker) for report in sorted_reports]
+    parts = []
+    for k, records in enumerate(slices):
+        if len(records) == 0:
+            continue
+        names = records.dtype.names
+        if not all(name in names for name in ('Notes', 'Week End', 'Cars', 'Spaces')):
+            return None
+        if not (_integral(records['Cars']) and _integral(records['Spaces'])):
+            return None
+        dates = date_bands.parse_notes(records['Notes'])
+        # records without a parseable date never pass the date band
+        valid = ~pd.isnull(dates)
+        parts.append((k, dates[valid], _week_end_category(records['Week End'])[valid],
+                      np.asarray(records['Cars'])[valid].astype(np.int64),
+                      np.asarray(records['Spaces'])[valid].astype(np.int64)))
+
+    if len(parts) > 0:
+        dates = np.unique(np.concatenate([part[1] for part in parts]))
+    else:
+        dates = np.array([], dtype='datetime64[ns]')
+    # per report row k + 1: the sums of report k; the cumulative sum then turns rows into prefixes
+    grid = np.zeros((len(slices) + 1, len(dates), 3, 3), dtype=np.int64)
+    for k, rec_dates, category, cars, spaces in parts:
+        d = np.searchsorted(dates, rec_dates)
+        np.add.at(grid[k + 1], (d, category, 0), cars)
+        np.add.at(grid[k + 1], (d, category, 1), spaces)
+        np.add.at(grid[k + 1], (d, category, 2), 1)
+    np.cumsum(grid, axis=0, out=grid)
+    if len(dates) > 0 and np.max(np.abs(grid[-1])) >= _exact_limit:
+        return None
+    return window_sums(ticker, dates, grid)
+
+##############################################################
+# Class Declarations:                                        #
+##############################################################
+
+class window_sums:
+    """
+    class window_sums() takes the following arguments:
+        1) the ticker
+        2) the distinct observation dates (datetime64[ns] np array, sorted)
+        3) the prefix grid (see the module docstring); use build() to construct it
+
+    METHODS:
+        1) window, which returns the py/cy ids and the Cars/Spaces sums that yoy_calc() computes from a window's
+        pooled, filtered records
+    """
+
+    def __init__(self, ticker, dates, grid):
+        self.ticker = ticker
+        self.dates = dates
+        self.grid = grid
+
+    #-----------------------------#
+    def window(self, lo, hi, start_date_s, end_date_s, l_bound, u_bound):
+        """
+        :param lo, hi: the window pools the reports sorted_reports[lo:hi] (see report_index.span())
+        :param start_date_s, end_date_s, l_bound, u_bound: the date band of the window (see date_bands.py_cy_flags())
+        :return: (prior_yr, current_yr, sums), where sums is a dictionary with the (Cars, Spaces) float sums of
+        'wke_ly', 'wke_ty', 'wkd_ly', 'wkd_ty' (Week End == 1/0 of the prior/current year) and 'ly', 'ty' (all
+        records of the prior/current year)
+        :raises ValueError: if no record of the window passes the date band (min() of the empty py_cy column in
+        metric_calc())
+        """
+        # (1) per date and Week End category: the sums of the pooled reports
+        pooled = self.grid[hi] - self.grid[lo]
+        # (2) py/cy and date band of every observation date
+        py_cy = date_bands.classify_py_cy(self.dates, start_date_s)
+        flag = date_bands.band_flags(self.dates, py_cy, start_date_s, end_date_s, l_bound, u_bound)
+        kept = (flag != 0) & (pooled[:, :, 2].sum(axis=1) > 0)
+        if not np.any(kept):
+            raise ValueError("no pooled records within the date band")
+        prior_yr = int(np.min(py_cy[kept]))
+        current_yr = int(np.max(py_cy[kept]))
+        # (3) the sums of yoy_calc()
+        sums = {}
+        for year, suffix in ((prior_yr, 'ly'), (current_yr, 'ty')):
+            by_category = pooled[kept & (py_cy == year)].sum(axis=0)
+            sums['wke_' + suffix] = (float(by_category[weekend, 0]), float(by_category[weekend, 1]))
+            sums['wkd_' + suffix] = (float(by_category[weekday, 0]), float(by_category[weekday, 1]))
+            total = by_category.sum(axis=0)
+            sums[suffix] = (float(total[0]), float(total[1]))
+        return prior_yr, current_yr, sums
+
+# END MODULE
+# -------------------------------------------------------------
@@ -0,0 +1,57 @@
+"""
+Purpose:
+The ZUM (Zip-Unmatched + Matched) dataset of statistical-balancing-multithreaded.py, the input of the ZUM_* hybrid
+models: the balanced unmatched->ZIP sample followed by the balanced matched sample.
+
+zum_merge_task() used to DataFrame.append() the samples and re-parse the 'Notes' date of every row with
+pd.to_datetime(); merge() converts the dates once per distinct value instead (the samples hold a few hundred
+distinct dates for thousands of rows). The result is the same, including the 'NaT' of a missing date.
+"""
+
+##############################################################
+# Imports:                                                   #
+##############################################################
+
+import numpy as np
+import pandas as pd
+
+##############################################################
+# Parameters                                                 #
+##############################################################
+
+# the date column of the ZUM dataset, from the report format to the format the balancing classes expect
+date_column = 'Notes'
+report_date_format = "%m/%d/%Y"
+balancing_date_format = "%Y-%m-%d"
+
+##############################################################
+# Non-class Methods                                          #
+##############################################################
+
+def conform_dates(values, in_format=report_date_format, out_format=balancing_date_format):
+    """
+    Purpose: pd.to_datetime(values, format=in_format).dt.strftime(out_format), once per distinct value
+    :param values: a sequence of date strings
+    :return: a np object array of the reformatted dates (a missing value becomes what strftime() makes of NaT).
+    Raises ValueError if a value does not match in_format
+    """
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    # code -1 (a missing value) -> the NaT appended at the end
+    dates = pd.Series(pd.to_datetime(uniques, format=in_format)).append(pd.Series([pd.NaT]), ignore_index=True)
+    return np.asarray(dates.dt.strftime(out_format), dtype=object)[codes]
+
+#-------------------------------
+
+def merge(frames):
+    """
+    Purpose: the ZUM dataset: the rows of frames one after another (renumbered from 0, as append(...,
+    ignore_index=True) did), with the date_column conformed to balancing_date_format (see conform_dates())
+    :param frames: a list of pd dfs (the balanced unmatched->ZIP sample, then the balanced matched sample)
+    :return: a new pd df
+    """
+    merged = pd.concat(frames, ignore_index=True)
+    merged.loc[:, date_column] = conform_dates(merged[date_column])
+    return merged
+
+# END MODULE
+# -------------------------------------------------------------
@@ -14,6 +14,7 @@ Purpose:
 # Basic Scripts:
 import os, datetime, time, csv
 import sys
+import multiprocessing
 import numpy as np
 import pandas as pd
 
@@ -26,6 +27,18 @@ import calendar
 from numpy.lib import recfunctions
 import re
 import math
+import traceback
+
+# Custom Scripts (shared with weekly-signal-generation.py):
+from rsm_tools import report_loader
+from rsm_tools import task_pool
+from rsm_tools import checkpoint_store
+from rsm_tools import balanced_store
+from rsm_tools import fiscal_calendar
+from rsm_tools import report_catalog
+from rsm_tools import frame_views
+from rsm_tools import zum_dataset
+from rsm_tools import summary_log
 
 # ------------------------------------------------------
 #################################################
@@ -41,7 +54,8 @@ qtr_schedule = "RS Metrics_Fiscal_Quarter_Dates_Matrix.xlsx"
 f_dir = os.path.join(w_dir, footprint_file)
 q_dir = os.path.join(w_dir, qtr_schedule)
 
-quarter_dictionary = pd.read_excel(q_dir)
+# the fiscal quarters and week cadences of every ticker, parsed and validated once (see det_qtr()/det_wk_weights())
+quarter_dictionary = fiscal_calendar.from_excel(q_dir)
 
 ticker_list = ['BBBY', 'BBY', 'BGFV', 'BIG', 'BJRI', 'BWLD', 'BURL', 'CAB', 'CMG', 'CONN', 'DG', \
                 'DKS', 'DLTR', 'FDO', 'HD', 'JCP', 'KR', 'KMRT', 'KSS', 'LL', 'LOCO', 'LOW', 'M', 'MNRO', \
@@ -49,6 +63,98 @@ ticker_list = ['BBBY', 'BBY', 'BGFV', 'BIG', 'BJRI', 'BWLD', 'BURL', 'CAB', 'CMG
                 'PNRA', 'ROST', 'SBUX', 'SHLD', 'SHW', 'SPLS', 'SPG', 'TCS', 'TFM', 'TGT', 'TSCO', 'TJX', \
                 'ULTA', 'WFM', 'WMT']
 
+########################
+### BALANCING MODELS ###
+########################
+# model key -> the module of its balancing class (the _AvgOnly variant is used when converged == 'No', see
+# balancing_class_names())
+balancing_modules = {
+    'DDOD': 'class_RB_DDOD_20150309',
+    'WKE': 'class_RB_WKE_20150309',
+    'DOW': 'class_RB_DOW_20150309',
+    'TYPE': 'class_RB_Type_20150309',
+    'SS': 'class_RB_SameStores_20150309',
+    'SS1': 'class_RB_SameStores_plus1_20150309',
+    'SS2': 'class_RB_SameStores_v2_20151102',
+    'POPDEN': 'class_RB_Demographics_20150906',
+    'REGCOM': 'class_RB_RegCom_v2_20150309',
+    'REGWKHIGH': 'class_RB_RegWkHigh_20140309',
+    'REGCENSUS': 'class_RB_RegCensus_20150309',
+    'SPACES': 'class_RB_Spaces_20150309',
+    'ZIP': 'class_RB_ZIP_20150906',
+    'REGONLY': 'class_RB_RegOnly_v2_20150309',
+    'STATE': 'class_RB_State_20150309',
+    'REGSPACES': 'class_RB_RegSpaces_20170103',
+    'REGPOPDEN': 'class_RB_RegPopDen_20170103',
+    'MATCH_UNMATCH': 'class_MatchUnmatch_Stats_20150908',
+    'REGCENSUS2': 'class_RB_RegCensus_v2_20150309',
+}
+
+# the regex expressions for identifying class names/sample methods in the class modules (see resolve_model())
+regex_class = re.compile(".*({}).*".format('_balance'), re.IGNORECASE)
+regex_sample = re.compile(".*({}).*".format('_sample'), re.IGNORECASE)
+# avg_option -> the model registry of this process (see model_registry())
+_registries = {}
+
+# the datasets that are not named after the model that balances them (see report_tasks())
+dataset_sources = {'MATCHED': 'MATCH_UNMATCH', 'UNMATCHED': 'MATCH_UNMATCH'}
+
+# the hybrid models, as a graph over the balanced datasets. The datasets of the graph roots are the outputs of the
+# single models (named after the model) and of MATCH_UNMATCH ('MATCHED', 'UNMATCHED'); every node outputs a dataset
+# named after its model. A node:
+# - balances its 'parent' dataset, as returned by the parent model ('data') or as np rec array ('records', the
+#   to_records() conversion is made once per dataset), with the balancing class of the model key 'class'
+# - stores its balanced dataset as <csv>_Balanced ('drop_index': without the 'index' column, see save_outputs())
+# - reports its yoy as <summary name of the parent dataset>_<class name of the node>
+# - runs if the node, its 'requires' models and every ancestor are In_Use in model_check; a node that is not in
+#   model_check is In_Use if its requirements are
+# A node with a 'task' runs that task function on its 'parents' instead (e.g. the merge of zum_merge_task()). The
+# list order is the order of the summary entries.
+model_graph = [
+    {'model': 'TYPE_REGCENSUS', 'parent': 'TYPE', 'input': 'records', 'class': 'REGCENSUS',
+     'csv': 'Type_RegCensus', 'drop_index': True},
+    {'model': 'TYPE_REGCENSUS2', 'parent': 'TYPE', 'input': 'records', 'class': 'REGCENSUS2',
+     'csv': 'Type_RegCensus2', 'drop_index': True},
+    {'model': 'SPACES_REGONLY', 'parent': 'SPACES', 'input': 'data', 'class': 'REGONLY',
+     'csv': 'Spaces_RegOnly', 'drop_index': True},
+    {'model': 'MATCHED_ZIP', 'parent': 'MATCHED', 'input': 'data', 'class': 'ZIP',
+     'csv': 'Matched_Zip', 'drop_index': False},
+    {'model': 'UNMATCHED_ZIP', 'parent': 'UNMATCHED', 'input': 'data', 'class': 'ZIP',
+     'csv': 'Unmatched_ZIP', 'drop_index': False},
+    {'model': 'MATCHED_REGONLY', 'parent': 'MATCHED', 'input': 'records', 'class': 'REGONLY',
+     'csv': 'Matched_RegOnly', 'drop_index': True},
+    {'model': 'UNMATCHED_REGONLY', 'parent': 'UNMATCHED', 'input': 'records', 'class': 'REGONLY',
+     'csv': 'Unmatched_RegOnly', 'drop_index': False},
+    {'model': 'MATCHED_SPACES', 'parent': 'MATCHED', 'input': 'records', 'class': 'SPACES',
+     'csv': 'Matched_Spaces', 'drop_index': True},
+    {'model': 'UNMATCHED_SPACES', 'parent': 'UNMATCHED', 'input': 'records', 'class': 'SPACES',
+     'csv': 'Unmatched_Spaces', 'drop_index': True},
+    # Match + Unmatched/Zip2 (Hybrid dataset merge), the input of the ZUM models
+    {'model': 'ZUM', 'parents': ['UNMATCHED_ZIP', 'MATCHED'], 'task': 'zum_merge_task', 'requires': ['ZIP']},
+    {'model': 'ZUM_DDOD', 'parent': 'ZUM', 'input': 'records', 'class': 'DDOD',
+     'csv': 'Zum_DDOD', 'drop_index': True, 'requires': ['DDOD']},
+    {'model': 'ZUM_DEM', 'parent': 'ZUM', 'input': 'data', 'class': 'POPDEN',
+     'csv': 'Zum_Dem', 'drop_index': False, 'requires': ['POPDEN']},
+    {'model': 'ZUM_REGPOPDEN', 'parent': 'ZUM', 'input': 'data', 'class': 'REGPOPDEN',
+     'csv': 'Zum_RegPopDen', 'drop_index': False, 'requires': ['REGPOPDEN']},
+    {'model': 'ZUM_REGONLY', 'parent': 'ZUM', 'input': 'records', 'class': 'REGONLY',
+     'csv': 'Zum_RegOnly', 'drop_index': True, 'requires': ['REGONLY']},
+    {'model': 'ZUM_REGWKHIGH', 'parent': 'ZUM', 'input': 'records', 'class': 'REGWKHIGH',
+     'csv': 'Zum_RegWkHigh', 'drop_index': True, 'requires': ['REGWKHIGH']},
+]
+model_nodes = dict((node['model'], node) for node in model_graph)
+
+# number of parsed reports that a process keeps (see report_data())
+report_cache_size = 2
+_report_cache = {}
+_report_order = []
+# report name -> its balanced_store in this process (see output_store())
+_output_stores = {}
+_output_order = []
+# also write every balanced dataset as <report>_<dataset>.csv (the store file of the report always holds them; see
+# rsm_tools/balanced_store.py for writing the csv files of a report later)
+write_balanced_csv = False
+
 # ---------------------------------------------
 ###############
 ### Methods ###
@@ -66,24 +172,11 @@ def sampledf(npsample):
     A pd df object
     """
 
-    # Obtain the attributes of the np structured record array
-    rdatatype = npsample.dtype
-    # Obtain the data descriptions of the attributes. Will be in list-tuple [(),()] form
-    datadescr = rdatatype.descr
-    # index the np record array data
-    # Errata: index = ['Row' + str(i) for i in range(1, len(npsample)+1)]
-    index = [i for i in range(1, len(npsample)+1)]
-    # Instantiate the np structured record array as a pandas dataframe object
-    df = pd.DataFrame(npsample, index=index)
+    # Instantiate the np structured record array as a pandas dataframe object, rows indexed from 1 (a RangeIndex, see
+    # rsm_tools/frame_views.py)
+    df = frame_views.to_frame(npsample)
     return df
 
-# -------------------------------------------------------------------------------
-def df_str_replace(dataframe, field_list):
-    for d in field_list:
-        dataframe[d] = dataframe[d].str.replace(',', ' ')
-        dataframe[d] = dataframe[d].str.replace('#', ' ')
-    return dataframe
-
 # -------------------------------------------------------------------------------
 def gen_data(in_report, directory):
     # ----------------------------------------------------------------
@@ -96,15 +189,9 @@ def gen_data(in_report, directory):
     Both cnt_loop and high_cnt only take arrays as primary arguments.
     """
 
-    if os.path.splitext(in_report)[1] == ".xlsx":
-        df_out = pd.read_excel(os.path.join(directory, in_report), 'Data')
-    elif os.path.splitext(in_report)[1] == ".csv":
-        df_out = pd.read_csv(os.path.join(directory, in_report))
-    else:
-        sys.exit("Incorrect Report Type (.xlsx or .csv ONLY!)")
-    df_out = df_str_replace(df_out, ['Address'])
-    df_out_np = df_out.to_records()
-    c = df_out_np
+    # the TS2 API reports keep all of their columns (the same-store balancing classes may use any of them) and
+    # 'Notes' as M/D/YYYY text (see the Notes conversion of the merged models)
+    c = report_loader.load_report(in_report, directory, columns=None, parse_notes=False)
     return c
 # -------------------------------------------------------------------------------
 
@@ -118,13 +205,8 @@ def df_to_sarray(df):
     :return: a numpy structured array representation of df
     """
 
-    v = df.values
-    cols = df.columns
-    types = [(cols[i].encode(), df[k].dtype.type) for (i, k) in enumerate(cols)]
-    dtype = np.dtype(types)
-    z = np.zeros(v.shape[0], dtype)
-    for (i, k) in enumerate(z.dtype.names):
-        z[k] = v[:, i]
+    # column by column, from the typed array of every column (see rsm_tools/frame_views.py)
+    z = frame_views.to_records(df)
     return z
 
 # -------------------------------------------------------------------------------
@@ -133,59 +215,24 @@ def det_qtr(in_month, in_ticker, lookup_matrix):
     Purpose: determine the financial quarter associated with a given ticker and month
     :param month: an integer
     :param ticker: a string
-    :param lookup_matrix: a pandas dataframe
+    :param lookup_matrix: the fiscal_calendar of the quarter matrix (see rsm_tools/fiscal_calendar.py)
     :return: a quarter (integer)
     """
-    matrix_record = lookup_matrix[lookup_matrix['Company'] == in_ticker]
-
-    for c, column in enumerate(matrix_record):
-        if c > 0 and c < 5:
-            try:
-                list_split = matrix_record[column][matrix_record.index[0]].split(", ")
-            except:
-                raise Exception('a supplied ticker in the file list does not exist in the cadence file')
-            for matrix_month in list_split:
-                matrix_month_n = int(strptime(matrix_month, '%b').tm_mon)
-                if matrix_month_n == in_month:
-                    return_c = c    # c is the column number = qtr (column 1 is quarter 1, column 4 is quarter 4)
-                else:
-                    continue
-        else:
-            continue
-
-    try:
-        return return_c
-    except NameError:
-        raise Exception('No match found for month and ticker combination in det_qtr()')
+    return lookup_matrix.quarter(in_ticker, in_month)
 
 # -------------------------------------------------------------------------------
 def det_wk_weights(in_ticker, lookup_matrix):
     """
     Purpose: determine the weights to be used in a weighted average
     :param in_ticker: a string
-    :param lookup_matrix: a pandas dataframe
+    :param lookup_matrix: the fiscal_calendar of the quarter matrix (see rsm_tools/fiscal_calendar.py)
     :return: list with 3 elements (ea. element gets multiplied by a month in a particular quarter)
     """
-    matrix_record = lookup_matrix[lookup_matrix['Company'] == in_ticker]
-    cadence_base = matrix_record.iloc[0]['Cadence'].split("-")
     # cadence weights: 5 weeks --> 0.4 | 4 weeks --> 0.3
-    cadence_list = []
-    for element in cadence_base:
-        if element == '5':
-            cadence_list.append(0.4)
-        elif element == '4':
-            cadence_list.append(0.3)
-        elif element == 'Calendar':
-            cadence_list.append(1)
-        else:
-            raise Exception('An implausible week number exists in the source week cadence file')
-
-    return cadence_list
+    return lookup_matrix.cadence_weights(in_ticker)
 
 # -------------------------------------------------------------------------------
-def balance_data(BalancingClass,
-                 regex_class,
-                 regex_sample,
+def balance_data(balancing_model,
                  summary_tab,
                  footprint_dir,
                  report_name,
@@ -198,1069 +245,471 @@ def balance_data(BalancingClass,
     """
     Purpose: this function instantiates a data-set as a balancing-class, executes balancing methods,
     and returns (1) the balanced data and (2) the yoy of the balanced data.
-    This function also calls summary_tab.yoy_to_summary, where summary_tab is a an object that is
-    instantiated by class_yoy_to_summary.
     
-    :param BalancingClass: the class object containing balancing methods
-    :param regex_class: a regular expression object containing some keyword (see balancing_process())
-    :param regex_sample: a regular expression object containing some keyword (see balancing_process())
-    :param summary_tab: an object instantiated with class_yoy_to_summary
+    :param balancing_model: the (balancing class, sample method) of the model (see model_registry())
+    :param summary_tab: unused (the caller writes the yoy to the summary)
     :param footprint_dir: the directory containing a sub-region footprint file
     :param report_name: the filename of the raw data object c that is being instantiated as a balancing object
     :param data_to_balance: the raw data object c that is being instantiated herein as a balancing object
     :param prior_year: an integer representing the prior year of the object c
     :param current_year: an integer representing the current year of the object c
-    :param append_to_name: a derivative of a check_array element with "_Balanced" tacked onto the end
-    :param working_directory: the working directory (one step above the class directory)
-    :return: 
+    :param append_to_name: a derivative of a check_array element with "_Balanced" tacked onto the end (the name of
+    the balanced dataset)
+    :param working_directory: unused (the caller saves the balanced dataset, see save_outputs())
+    :return: the balanced data, its yoy, the balancing object and {append_to_name: the balanced dataset as a
+    selection over data_to_balance} (see balanced_output())
     """
 
     print "---------------------------------------"
     print report_name
     print "Sample Size: %s" % (len(data_to_balance))
 
-    # identify the class name stored in BalancingClass
-    module_contents = dir(BalancingClass)
-    print module_contents
-    related_class = [m.group(0) for l in module_contents for m in [regex_class.search(l)] if m][0]
-    # (I) Python dynamic instantiation from string name of a class in dynamically imported module:
-    class_ = getattr(BalancingClass, related_class)
+    class_, sample = balancing_model
     print class_
     #------------------#
     unbalanced = class_(data_to_balance, prior_year, current_year, footprint_dir)
-    class_contents = dir(unbalanced)
-    related_method = [m.group(0) for l in class_contents for m in [regex_sample.search(l)] if m][0]
-    # (II) Calling a function of a module from a string with the function's name:
-
-    balanced, balanced_yoy = getattr(unbalanced, related_method)()
-
-    # detect whether or not the output data is in pd df or not. If it is not, convert to pd df
-    print "Conforming Output to Pandas DF Format..."
-    if isinstance(balanced, pd.DataFrame):
-        rec_df = balanced.copy()
-    else:
-        # the output object is a np rec array. Convert to pd df
-        rec_df = pd.DataFrame(balanced)
-
-    print "Saving CSV...."
-    # write the first balanced dataframe to directory
-    report_name = os.path.splitext(report_name)[0]
-    sav_csv = "{}_{}.csv".format(report_name, append_to_name)
-    sav_csv = os.path.join(working_directory, sav_csv)
-    rec_df.drop(['index'], axis = 1, inplace = True)
-    rec_df.to_csv(sav_csv, index=False)
-
-    return balanced, balanced_yoy, unbalanced
+    balanced, balanced_yoy = sample(unbalanced)
+
+    # the output is a pd df or a np rec array: its columns are read as they are (see balanced_output())
+    selections = {append_to_name: balanced_output(balanced, data_to_balance)}
+    return balanced, balanced_yoy, unbalanced, selections
 
 # -------------------------------------------------------------------------------
-def balancing_process(c, prior_yr, current_yr, report_name, mth_n, yr_n, qtr_n, ticker, summary_tab, footprint_dir, \
-                      avg_option, check_array, balanced_data_dict, balanced_yoy_dict, unbalanced_dict):
+def balanced_output(frame, source, drop_index=True):
+    """
+    Purpose: a balanced sample as a selection over its source report, i.e. the rows of the report that the sample
+    holds plus the columns that differ from the report (see rsm_tools/balanced_store.py)
+    :param frame: the balanced sample (pd df or np rec array)
+    :param source: the source report (np rec array, see gen_data())
+    :param drop_index: leave out the 'index' column, as the csv of the model did
+    :return: a selection (see balanced_store.selection())
+    """
+    columns = [column for column in frame_views.field_names(frame) if not (drop_index and column == 'index')]
+    return balanced_store.selection(frame, source, columns)
 
-    if avg_option == True:
-        class_DDOD = 'class_RB_DDOD_20150309_AvgOnly'
-        class_WKE = 'class_RB_WKE_20150309_AvgOnly'
-        class_DOW = 'class_RB_DOW_20150309_AvgOnly'
-        class_TYPE = 'class_RB_Type_20150309_AvgOnly'
-        class_SS = 'class_RB_SameStores_20150309_AvgOnly'
-        class_SS1 = 'class_RB_SameStores_plus1_20150309_AvgOnly'
-        class_SS2 = 'class_RB_SameStores_v2_20151102_AvgOnly'
-        class_POPDEN = 'class_RB_Demographics_20150906_AvgOnly'
-        class_REGCOM = 'class_RB_RegCom_v2_20150309_AvgOnly'
-        class_REGWKHIGH = 'class_RB_RegWkHigh_20140309_AvgOnly'
-        class_REGCENSUS = 'class_RB_RegCensus_20150309_AvgOnly'
-        class_SPACES = 'class_RB_Spaces_20150309_AvgOnly'
-        class_ZIP = 'class_RB_ZIP_20150906_AvgOnly'
-        class_REGONLY = 'class_RB_RegOnly_v2_20150309_AvgOnly'
-        class_STATE = 'class_RB_State_20150309_AvgOnly'
-        class_REGSPACES = 'class_RB_RegSpaces_20170103_AvgOnly'
-        class_REGPOPDEN = 'class_RB_RegPopDen_20170103_AvgOnly'
-        class_MATCH_UNMATCH = 'class_MatchUnmatch_Stats_20150908_AvgOnly'
-        class_REGCENSUS2 = 'class_RB_RegCensus_v2_20150309_AvgOnly'
-    else:
-        class_DDOD = 'class_RB_DDOD_20150309'
-        class_WKE = 'class_RB_WKE_20150309'
-        class_DOW = 'class_RB_DOW_20150309'
-        class_TYPE = 'class_RB_Type_20150309'
-        class_SS = 'class_RB_SameStores_20150309'
-        class_SS1 = 'class_RB_SameStores_plus1_20150309'
-        class_SS2 = 'class_RB_SameStores_v2_20151102'
-        class_POPDEN = 'class_RB_Demographics_20150906'
-        class_REGCOM = 'class_RB_RegCom_v2_20150309'
-        class_REGWKHIGH = 'class_RB_RegWkHigh_20140309'
-        class_REGCENSUS = 'class_RB_RegCensus_20150309'
-        class_SPACES = 'class_RB_Spaces_20150309'
-        class_ZIP = 'class_RB_ZIP_20150906'
-        class_REGONLY = 'class_RB_RegOnly_v2_20150309'
-        class_STATE = 'class_RB_State_20150309'
-        class_REGSPACES = 'class_RB_RegSpaces_20170103'
-        class_REGPOPDEN = 'class_RB_RegPopDen_20170103'
-        class_MATCH_UNMATCH = 'class_MatchUnmatch_Stats_20150908'
-        class_REGCENSUS2 = 'class_RB_RegCensus_v2_20150309'
-
-    #----------------------------------------
-    # prepare the regex expression for identifying class names in the class modules
-    regex_class = re.compile(".*({}).*".format('_balance'), re.IGNORECASE)
-    regex_sample = re.compile(".*({}).*".format('_sample'), re.IGNORECASE)
+# -------------------------------------------------------------------------------
+def balanced_csv(working_directory, report_name, append_to_name):
+    """
+    :return: the path of the csv of the balanced dataset append_to_name of a report
+    """
+    return os.path.join(working_directory, "{}_{}.csv".format(os.path.splitext(report_name)[0], append_to_name))
 
-    #############################
-    ### SINGLE BALANCE MODELS ###
-    #############################
+# -------------------------------------------------------------------------------
+def output_store(report_name):
+    """
+    Purpose: the balanced_store of a report, memoized for the last report_cache_size reports of this process. A
+    store with datasets that have not been written yet (see flush_outputs()) is kept until they are
+    """
+    if report_name not in _output_stores:
+        written = [name for name in _output_order if not _output_stores[name].unwritten]
+        if len(_output_stores) >= report_cache_size and written:
+            _output_order.remove(written[0])
+            del _output_stores[written[0]]
+        _output_stores[report_name] = balanced_store.balanced_store(
+            balanced_store.store_path(w_dir, report_name),
+            checkpoint_store.fingerprint(os.path.join(w_dir, report_name)))
+        _output_order.append(report_name)
+    return _output_stores[report_name]
 
-    #----------------------------------------------------------------------------------#
+# -------------------------------------------------------------------------------
+def save_outputs(report_name, selections):
     """
-    Process:
-    1) loop through check_array (with prefix "class_") to determine which models to run:
-        a) if element.split("_") yields more than 1 element, the check_array element is a hybrid model.
-            (or it's match/unmatch)
-            control statement continue on hybrid models
-        b) if element.split("_") yields 1 element only, the check_array element is a simple model.
-            execute regular balancing sequence
-            i) identify the append_to_name from check_array, with suffix "_Balanced"
-            ii) call balance_data(args)
-            iii) use the return from balance_data(args) for summary_tab.yoy_to_summary()
-                - ensure that the return is named with the element's normal expression + _BALANCED
-    2) Run match/unmatch separately
-    3) Run unmatched-> zip separately
-    4) Construct the Unmatched-Zip + Match dataset
-    5) loop again through check_array (with prefix "class_")
-        a) if element.split("_") yields more than 1 element, this is a hybrid model. Process it.
-            i) identify the input dataset using element.split("_")[0] (assuming it's hybrid)
-            ii) if this prefix is "ZUM" then we use the dataset from (4)
-            iii) if element is MATCH_UNMATCH, continue
-        b)
-            i) call balance_data(args)
-            ii) use the return from balance_data(args) for summary_tab.yoy_to_summary()
+    Purpose: add the balanced datasets of a model to the store of its report (written to <report>_Balanced.npz by
+    flush_outputs()) and, if write_balanced_csv is set, write them as <report>_<dataset>.csv
+    :param selections: {dataset: selection} (the 'selections' of a task result)
+    :return: the locations of the datasets: <store file>#<dataset> and the csv files
     """
+    store = output_store(report_name)
+    store.update(selections)
+    files = []
+    for name in sorted(selections):
+        files.append("{}#{}".format(store.path, name))
+        if write_balanced_csv:
+            sav_csv = balanced_csv(w_dir, report_name, name)
+            store.to_csv(name, report_data(report_name), sav_csv)
+            files.append(sav_csv)
+    return files
 
-    # (1)
-    for n, model in check_array.iterrows():
-        if len(check_array.iloc(1)[n][0].split("_")) > 1:
-            # this model is a hybrid. continue
-            continue
-        elif check_array.iloc(1)[n][1] == 0:    # do not process models where In_Use = 0!
+# -------------------------------------------------------------------------------
+def flush_outputs(report_name):
+    """
+    Purpose: write the store file of a report, once all of its models have saved their datasets (see save_outputs())
+    """
+    output_store(report_name).flush()
+
+# -------------------------------------------------------------------------------
+def balancing_class_names(avg_option):
+    """
+    Purpose: the module names of the balancing classes
+    :param avg_option: True selects the _AvgOnly variants (converged == 'No')
+    :return: a dictionary of model key -> module name
+    """
+    suffix = "_AvgOnly" if avg_option else ""
+    return dict((key, module + suffix) for key, module in balancing_modules.items())
+
+# -------------------------------------------------------------------------------
+def resolve_model(module_name):
+    """
+    Purpose: import a balancing module and find its balancing class (the first name that contains '_balance') and
+    the sample method of that class (the first name that contains '_sample')
+    :param module_name: the module name (see balancing_class_names())
+    :return: (class, sample method); the sample method is called as sample(instance)
+    """
+    BalancingClass = __import__(module_name)
+    related_class = [m.group(0) for l in dir(BalancingClass) for m in [regex_class.search(l)] if m]
+    if not related_class:
+        raise ImportError("{} has no balancing class (a name containing '_balance')".format(module_name))
+    # (I) Python dynamic instantiation from string name of a class in dynamically imported module:
+    class_ = getattr(BalancingClass, related_class[0])
+    related_method = [m.group(0) for l in dir(class_) for m in [regex_sample.search(l)] if m]
+    if not related_method:
+        raise ImportError("{}.{} has no sample method (a name containing '_sample')".format(module_name,
+                                                                                        related_class[0]))
+    # (II) the function of the class from the string with the function's name:
+    return class_, getattr(class_, related_method[0])
+
+# -------------------------------------------------------------------------------
+def model_registry(avg_option, models=None):
+    """
+    Purpose: the balancing class and sample method of every model key, resolved once per process and variant
+    :param avg_option: True for the _AvgOnly variants (converged == 'No'), False for the converged ones
+    :param models: (optional) the model keys to resolve (see scheduled_models()). Defaults to every key of
+    balancing_modules
+    :return: a dictionary of model key -> (class, sample method). Raises an Exception that lists every model that
+    cannot be resolved (missing module, class or sample method)
+    """
+    registry = _registries.setdefault(avg_option, {})
+    module_names = balancing_class_names(avg_option)
+    errors = []
+    for key in (models if models is not None else sorted(balancing_modules)):
+        if key in registry:
             continue
-        else:   # the model name has only 1 name. It's a simple model
-            base_name = check_array.iloc(1)[n][0].split("_")[0]
-            # regex_module = re.compile(".*({}).*".format(base_name), re.IGNORECASE)
-            model_class_name = "class_" + base_name
-            append_to_name = base_name + "_Balanced"
+        try:
+            registry[key] = resolve_model(module_names[key])
+        except Exception as e:
+            errors.append("{} ({}): {}".format(key, module_names.get(key), e))
+    if errors:
+        raise Exception("balancing models that cannot be resolved:\n" + "\n".join(errors))
+    return registry
 
-            # retrieve the BalancingClass module using variable string of the class name in model_clas_name:
+# -------------------------------------------------------------------------------
+def report_data(report_name):
+    """
+    Purpose: gen_data(report_name, w_dir), memoized for the last report_cache_size reports of this process (the
+    models of a report run on the same worker process one after another)
+    """
+    if report_name not in _report_cache:
+        if len(_report_cache) >= report_cache_size:
+            del _report_cache[_report_order.pop(0)]
+        _report_cache[report_name] = gen_data(report_name, w_dir)
+        _report_order.append(report_name)
+    return _report_cache[report_name]
 
-            """
-            parsers = [v for (k, v) in locals().items()
-                       if k.startswith('class_')]
-            module_list = []
-            for i in parsers:
-                try:
-                    if i.startswith('class_'):
-                        module_list.append(i)
-                except:
-                    continue
-
-            related_class = [m.group(0) for l in module_list for m in [regex_module.search(l)] if m][0]
-            """
-            print model_class_name
-            # need a string in __import__. Want the explicit name of the class. Variables class_module.
-            BalancingClass = __import__(eval(model_class_name))
-            print BalancingClass
-            balanced_data, balanced_yoy, unbalanced = balance_data(BalancingClass,
-                                                         regex_class,
-                                                         regex_sample,
-                                                         summary_tab,
-                                                         footprint_dir,
-                                                         report_name,
-                                                         c,
-                                                         prior_yr,
-                                                         current_yr,
-                                                         append_to_name,
-                                                         w_dir
-                                                         )
-
-            module_name = unbalanced.__class__.__name__
-            print "Module name for summary yoy table:"
-            print module_name
-            summary_tab.yoy_to_summary(mth_n, yr_n, qtr_n, ticker, balanced_yoy, module_name)
-            # store balanced_data and balanced_yoy with class-specific names in their respective dictionaries
-            balanced_data_dict["balanced_" + base_name] = balanced_data
-            print balanced_data_dict.keys()
-            balanced_yoy_dict["balanced" + base_name + "_yoy"] = balanced_yoy
-            unbalanced_dict["unbalanced" + base_name] = unbalanced
+# -------------------------------------------------------------------------------
+def report_context(report):
+    """
+    Purpose: unpack a report dictionary (see report_tasks())
+    :return: report_name, prior_yr, current_yr, footprint_dir, registry (see model_registry())
+    """
+    return report['report_name'], report['prior_yr'], report['current_yr'], report['footprint_dir'], \
+        model_registry(report['avg_option'], report['models'])
 
-    # (2)
-    # Model: Match/Unmatch
-    if check_array[check_array['model']=='MATCH_UNMATCH']['In_Use'].values[0] == 0:
-        pass
-    else:
-        print "------------------------------------------------------------------"
-        print report_name
-
-        BalancingClass = __import__(eval("class_MATCH_UNMATCH"))
-        module_contents = dir(BalancingClass)
-        related_class = [m.group(0) for l in module_contents for m in [regex_class.search(l)] if m][0]
-        # (I) Python dynamic instantiation from string name of a class in dynamically imported module:
-        class_ = getattr(BalancingClass, related_class)
-        unbalanced_mum = class_(c, prior_yr, current_yr, report_name, footprint_dir)
-        print "Sample Size: %s" % (len(c))
-        print "Building Sample ... Checking Convergence Tolerance"
-        class_contents = dir(unbalanced_mum)
-        related_method = [m.group(0) for l in class_contents for m in [regex_sample.search(l)] if m][0]
-        # (II) Calling a function of a module from a string with the function's name:
-        balanced_matched, balanced_unmatched, balanced_matched_yoy, balanced_unmatched_yoy, balanced_overall_yoy  = \
-            getattr(unbalanced_mum, related_method)()
-
-        unbalanced_dict["unbalanced" + base_name] = unbalanced_mum
-
-        sav_csv = w_dir + "/" + report_name.split(".")[0] + "_Match_Balanced.csv"
-        balanced_matched = balanced_matched.copy().drop(['index'], axis = 1)
-        balanced_matched.to_csv(sav_csv, index=False)
-        #-----#
-        balanced_data_dict["balanced_" + base_name] = balanced_matched
-        balanced_yoy_dict["balanced" + base_name + "_yoy"] = balanced_matched_yoy
-
-        module_name_1 = "matched"
-        # write to summary
-        summary_tab.yoy_to_summary(mth_n, yr_n, qtr_n, ticker, balanced_matched_yoy, module_name_1)
-
-        #--------------------------------------------------------------------------------------------#
-        sav_csv = w_dir + "/" + report_name.split(".")[0] + "_Unmatch_Balanced.csv"
-        balanced_unmatched = balanced_unmatched.copy().drop(['index'], axis = 1)
-        balanced_unmatched.to_csv(sav_csv, index=False)
-        #-----#
-        balanced_data_dict["balanced_" + base_name] = balanced_unmatched
-        balanced_yoy_dict["balanced" + base_name + "_yoy"] = balanced_unmatched_yoy
-
-        module_name_1 = "unmatched"
-        # write to summary
-        summary_tab.yoy_to_summary(mth_n, yr_n, qtr_n, ticker, balanced_unmatched_yoy, module_name_1)
-
-    #----------------------------------------------------------------------------------#
-
-    ############################
-    ### MULTI BALANCE MODELS ###
-    ############################
-
-    #####
-    # 1 #
-    #####
-    #--------------------------#
-    # Model: TYPE
-    if check_array[check_array['model']=='TYPE']['In_Use'].values[0] == 0:
-        pass
-    elif check_array[check_array['model']=='TYPE_REGCENSUS']['In_Use'].values[0] == 0:
-        pass
-    else:
-        print "------------------------------------------------------------------"
-        print report_name
-        # Work Already Completed
-        print "Model Type is already balanced. Proceeding with secondary balancing."
-        module_name_1 = unbalanced_dict['unbalancedTYPE'].__class__.__name__
-
-        #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #
-        # pass object to RegCensus (uses pd df)]
-        #--------------------------#
-        # Model: RegCensus
-        # since RegCensus takes np rec array, reconvert balanced_TYPE to np rec array
-        balanced_type_np = balanced_data_dict['balanced_TYPE'].to_records()
-        print "------------------------------------------------------------------"
-        BalancingClass = __import__(eval("class_REGCENSUS"))
-        module_contents = dir(BalancingClass)
-        related_class = [m.group(0) for l in module_contents for m in [regex_class.search(l)] if m][0]
-        # (I) Python dynamic instantiation from string name of a class in dynamically imported module:
-        class_ = getattr(BalancingClass, related_class)
-        unbalanced_regcensus = class_(balanced_type_np, prior_yr, current_yr, footprint_dir)
-        print "Sample Size: %s" % (len(balanced_type_np))
-        print "Building Sample ... Checking Convergence Tolerance"
-        class_contents = dir(unbalanced_regcensus)
-        related_method = [m.group(0) for l in class_contents for m in [regex_sample.search(l)] if m][0]
-        # (II) Calling a function of a module from a string with the function's name:
-        balanced_type_regcensus, balanced_type_regcensus_yoy = getattr(unbalanced_regcensus, related_method)()
-
-        # detect whether or not the output data is in pd df or not. If it is not, convert to pd df
-        print "Conforming Output to Pandas DF Format..."
-        if isinstance(balanced_type_regcensus, pd.DataFrame):
-            rec_df = balanced_type_regcensus.copy()
-        else:
-            # the output object is a np rec array. Convert to pd df
-            rec_index = [i for i in range(1, len(balanced_type_regcensus) + 1)]
-            rec_df = pd.DataFrame(balanced_type_regcensus, index=rec_index)
-        print "Saving CSV...."
-        # write the first balanced dataframe to directory
-        sav_csv = w_dir + "/" + report_name.split(".")[0] + "_Type_RegCensus_Balanced.csv"
-        # s = ','.join(unmatched.headers) + '\n'
-        rec_df.drop(['index'], axis = 1, inplace = True)
-        rec_df.to_csv(sav_csv, index=False)
-
-        module_name_2 = unbalanced_regcensus.__class__.__name__
-        module_combined_name = str(module_name_1) + "_" + str(module_name_2)
-        # write to summary
-        summary_tab.yoy_to_summary(mth_n, yr_n, qtr_n, ticker, balanced_type_regcensus_yoy, module_combined_name)
-    #--------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------
+def balanced_dataset(data, name, forms):
+    """
+    Purpose: package a balanced dataset for the models that are built on it (see model_graph)
+    :param data: the balanced data, as returned by the model
+    :param name: the summary name of the dataset (the prefix of the summary names of its children)
+    :param forms: the forms that the children need: 'data' and/or 'records' (np rec array, data.to_records())
+    :return: a dictionary with the 'name' and the forms
+    """
+    dataset = {'name': name}
+    if 'data' in forms:
+        dataset['data'] = data
+    if 'records' in forms:
+        # converted once, whatever the number of children
+        dataset['records'] = data.to_records()
+    return dataset
 
-    #####
-    # 2 #
-    #####
-    #--------------------------#
-    # Model: TYPE
-    if check_array[check_array['model']=='TYPE']['In_Use'].values[0] == 0:
-        pass
-    elif check_array[check_array['model']=='TYPE_REGCENSUS2']['In_Use'].values[0] == 0:
-        pass
-    else:
-        print "------------------------------------------------------------------"
-        print report_name
-        # Work Already Completed
-        print "Model Type is already balanced. Proceeding with secondary balancing."
-        module_name_1 = unbalanced_dict['unbalancedTYPE'].__class__.__name__
-
-        #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #
-        # pass object to RegCensusv2 (uses numpy rec array)]
-        #--------------------------#
-        # Model: RegCensus V2
-        # since RegCensusv2 takes np rec array, reconvert balanced_TYPE to np rec array
-        print "------------------------------------------------------------------"
-        BalancingClass = __import__(eval("class_REGCENSUS2"))
-        module_contents = dir(BalancingClass)
-        related_class = [m.group(0) for l in module_contents for m in [regex_class.search(l)] if m][0]
-        # (I) Python dynamic instantiation from string name of a class in dynamically imported module:
-        class_ = getattr(BalancingClass, related_class)
-        unbalanced_regcensusv2 = class_(balanced_type_np, prior_yr, current_yr, footprint_dir)
-        print "Sample Size: %s" % (len(balanced_type_np))
-        print "Building Sample ... Checking Convergence Tolerance"
-        class_contents = dir(unbalanced_regcensusv2)
-        related_method = [m.group(0) for l in class_contents for m in [regex_sample.search(l)] if m][0]
-        # (II) Calling a function of a module from a string with the function's name:
-        balanced_type_regcensusv2, balanced_type_regcensusv2_yoy = getattr(unbalanced_regcensusv2, related_method)()
-
-        # detect whether or not the output data is in pd df or not. If it is not, convert to pd df
-        print "Conforming Output to Pandas DF Format..."
-        if isinstance(balanced_type_regcensusv2, pd.DataFrame):
-            rec_df = balanced_type_regcensusv2.copy()
-        else:
-            # the output object is a np rec array. Convert to pd df
-            rec_index = [i for i in range(1, len(balanced_type_regcensusv2) + 1)]
-            rec_df = pd.DataFrame(balanced_type_regcensusv2, index=rec_index)
-        print "Saving CSV...."
-        # write the first balanced dataframe to directory
-        sav_csv = w_dir + "/" + report_name.split(".")[0] + "_Type_RegCensus2_Balanced.csv"
-        # s = ','.join(unmatched.headers) + '\n'
-        rec_df.drop(['index'], axis = 1, inplace = True)
-        rec_df.to_csv(sav_csv, index=False)
-
-        module_name_2 = unbalanced_regcensusv2.__class__.__name__
-        module_combined_name = str(module_name_1) + "_" + str(module_name_2)
-        # write to summary
-        summary_tab.yoy_to_summary(mth_n, yr_n, qtr_n, ticker, balanced_type_regcensusv2_yoy, module_combined_name)
-    #--------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------
+def single_model_task(deps, report, base_name, outputs):
+    """
+    Purpose: balance a report with a single balancing model
+    :param deps: unused (single models depend on no other model)
+    :param report: a report dictionary (see report_tasks())
+    :param base_name: the model name in check_array (e.g. 'DDOD')
+    :param outputs: {dataset: forms} of the datasets that other models need (see balanced_dataset())
+    :return: a dictionary with the 'datasets', the 'yoy', the 'summary' entries and the balanced 'selections'
+    """
+    report_name, prior_yr, current_yr, footprint_dir, registry = report_context(report)
+    append_to_name = base_name + "_Balanced"
+
+    print base_name
+    balanced_data, balanced_yoy, unbalanced, selections = balance_data(registry[base_name],
+                                                 None,
+                                                 footprint_dir,
+                                                 report_name,
+                                                 report_data(report_name),
+                                                 prior_yr,
+                                                 current_yr,
+                                                 append_to_name,
+                                                 w_dir
+                                                 )
+
+    module_name = unbalanced.__class__.__name__
+    print "Module name for summary yoy table:"
+    print module_name
+    datasets = dict((dataset, balanced_dataset(balanced_data, module_name, forms))
+                    for dataset, forms in outputs.items())
+    return {'datasets': datasets, 'yoy': balanced_yoy, 'summary': [(balanced_yoy, module_name)],
+            'selections': selections}
 
-    #####
-    # 3 #
-    #####
-    #--------------------------#
-    # Model: Spaces
-    if check_array[check_array['model']=='SPACES']['In_Use'].values[0] == 0:
-        pass
-    elif check_array[check_array['model']=='SPACES_REGONLY']['In_Use'].values[0] == 0:
-        pass
-    else:
-        print "------------------------------------------------------------------"
-        print report_name
-        # Work Already Completed
-        print "Model Spaces is already balanced. Proceeding with secondary balancing."
-        module_name_1 = unbalanced_dict['unbalancedSPACES'].__class__.__name__
-
-        #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #
-        # pass object to RegOnly (uses numpy rec array)]
-        #--------------------------#
-        # Model: RegOnly
-        print "------------------------------------------------------------------"
-        BalancingClass = __import__(eval("class_REGONLY"))
-        module_contents = dir(BalancingClass)
-        related_class = [m.group(0) for l in module_contents for m in [regex_class.search(l)] if m][0]
-        # (I) Python dynamic instantiation from string name of a class in dynamically imported module:
-        class_ = getattr(BalancingClass, related_class)
-        unbalanced_regonly = class_(balanced_data_dict['balanced_SPACES'], prior_yr, current_yr, footprint_dir)
-        print "Sample Size: %s" % (len(balanced_data_dict['balanced_SPACES']))
-        print "Building Sample ... Checking Convergence Tolerance"
-        class_contents = dir(unbalanced_regonly)
-        related_method = [m.group(0) for l in class_contents for m in [regex_sample.search(l)] if m][0]
-        # (II) Calling a function of a module from a string with the function's name:
-        balanced_spaces_regonly, balanced_spaces_regonly_yoy = getattr(unbalanced_regonly, related_method)()
-
-        # detect whether or not the output data is in pd df or not. If it is not, convert to pd df
-        print "Conforming Output to Pandas DF Format..."
-        if isinstance(balanced_spaces_regonly, pd.DataFrame):
-            rec_df = balanced_spaces_regonly.copy()
-        else:
-            # the output object is a np rec array. Convert to pd df
-            rec_index = [i for i in range(1, len(balanced_spaces_regonly) + 1)]
-            rec_df = pd.DataFrame(balanced_spaces_regonly, index=rec_index)
-        print "Saving CSV...."
-        # write the first balanced dataframe to directory
-        sav_csv = w_dir + "/" + report_name.split(".")[0] + "_Spaces_RegOnly_Balanced.csv"
-        # s = ','.join(unmatched.headers) + '\n'
-        rec_df.drop(['index'], axis = 1, inplace = True)
-        rec_df.to_csv(sav_csv, index=False)
-
-        module_name_2 = unbalanced_regonly.__class__.__name__
-        module_combined_name = str(module_name_1) + "_" + str(module_name_2)
-        # write to summary
-        summary_tab.yoy_to_summary(mth_n, yr_n, qtr_n, ticker, balanced_spaces_regonly_yoy, module_combined_name)
-    #--------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------
+def match_unmatch_task(deps, report, outputs):
+    """
+    Purpose: split a report into balanced matched and unmatched samples (model MATCH_UNMATCH)
+    :return: a dictionary with the datasets 'MATCHED'/'UNMATCHED' (those in outputs), the summary entries and the
+    balanced 'selections'
+    """
+    report_name, prior_yr, current_yr, footprint_dir, registry = report_context(report)
+    c = report_data(report_name)
+    print "------------------------------------------------------------------"
+    print report_name
 
-    #####
-    # 4 #
-    #####
-    #--------------------------#
-    # Model: Matched
-    if check_array[check_array['model']=='MATCH_UNMATCH']['In_Use'].values[0] == 0:
-        pass
-    elif check_array[check_array['model']=='MATCHED_ZIP']['In_Use'].values[0] == 0:
-        pass
-    else:
-        print "------------------------------------------------------------------"
-        print report_name
-        # Work Already Completed
-        print "Model Matched is already balanced. Proceeding with secondary balancing."
-        module_name_1 = "matched"
-
-        #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #
-        # pass object to Zip (already pd df)]
-        #--------------------------#
-        # Model: ZIP
-        print "------------------------------------------------------------------"
-        BalancingClass = __import__(eval("class_ZIP"))
-        module_contents = dir(BalancingClass)
-        related_class = [m.group(0) for l in module_contents for m in [regex_class.search(l)] if m][0]
-        # (I) Python dynamic instantiation from string name of a class in dynamically imported module:
-        class_ = getattr(BalancingClass, related_class)
-        unbalanced_zip = class_(balanced_matched, prior_yr, current_yr, footprint_dir)
-        print "Sample Size: %s" % (len(balanced_matched))
-        print "Building Sample ... Checking Convergence Tolerance"
-        class_contents = dir(unbalanced_zip)
-        related_method = [m.group(0) for l in class_contents for m in [regex_sample.search(l)] if m][0]
-        # (II) Calling a function of a module from a string with the function's name:
-        balanced_matched_zip, balanced_matched_zip_yoy = getattr(unbalanced_zip, related_method)()
-
-        # detect whether or not the output data is in pd df or not. If it is not, convert to pd df
-        print "Conforming Output to Pandas DF Format..."
-        if isinstance(balanced_matched_zip, pd.DataFrame):
-            rec_df = balanced_matched_zip.copy()
-        else:
-            # the output object is a np rec array. Convert to pd df
-            rec_index = [i for i in range(1, len(balanced_matched_zip) + 1)]
-            rec_df = pd.DataFrame(balanced_matched_zip, index=rec_index)
-        print "Saving CSV...."
-        # write the first balanced dataframe to directory
-        sav_csv = w_dir + "/" + report_name.split(".")[0] + "_Matched_Zip_Balanced.csv"
-        # s = ','.join(unmatched.headers) + '\n'
-        rec_df.to_csv(sav_csv, index=False)
-
-        module_name_2 = unbalanced_zip.__class__.__name__
-        module_combined_name = str(module_name_1) + "_" + str(module_name_2)
-        # write to summary
-        summary_tab.yoy_to_summary(mth_n, yr_n, qtr_n, ticker, balanced_matched_zip_yoy, module_combined_name)
-    #--------------------------------------------------------------------------------------------
+    class_, sample = registry['MATCH_UNMATCH']
+    unbalanced_mum = class_(c, prior_yr, current_yr, report_name, footprint_dir)
+    print "Sample Size: %s" % (len(c))
+    print "Building Sample ... Checking Convergence Tolerance"
+    balanced_matched, balanced_unmatched, balanced_matched_yoy, balanced_unmatched_yoy, balanced_overall_yoy  = \
+        sample(unbalanced_mum)
 
-    #####
-    # 5 #
-    #####
-    #--------------------------#
-    # Model: Unmatched
-    if check_array[check_array['model']=='MATCH_UNMATCH']['In_Use'].values[0] == 0:
-        pass
-    elif check_array[check_array['model']=='UNMATCHED_ZIP']['In_Use'].values[0] == 0:
-        pass
-    else:
-        print "------------------------------------------------------------------"
-        print report_name
-        # Work Already Completed
-        print "Model Unmatched is already balanced. Proceeding with secondary balancing."
-        module_name_1 = "unmatched"
-
-        #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #
-        # pass object to ZIP (uses numpy rec array)]
-        #--------------------------#
-        # Model: ZIP
-        print "------------------------------------------------------------------"
-        BalancingClass = __import__(eval("class_ZIP"))
-        module_contents = dir(BalancingClass)
-        related_class = [m.group(0) for l in module_contents for m in [regex_class.search(l)] if m][0]
-        # (I) Python dynamic instantiation from string name of a class in dynamically imported module:
-        class_ = getattr(BalancingClass, related_class)
-        unbalanced_zip = class_(balanced_unmatched, prior_yr, current_yr, footprint_dir)
-        print "Sample Size: %s" % (len(balanced_unmatched))
-        print "Building Sample ... Checking Convergence Tolerance"
-        class_contents = dir(unbalanced_zip)
-        related_method = [m.group(0) for l in class_contents for m in [regex_sample.search(l)] if m][0]
-
-        # (II) Calling a function of a module from a string with the function's name:
-        balanced_unmatched_zip, balanced_unmatched_zip_yoy = getattr(unbalanced_zip, related_method)()
-
-        # detect whether or not the output data is in pd df or not. If it is not, convert to pd df
-        print "Conforming Output to Pandas DF Format..."
-        if isinstance(balanced_unmatched_zip, pd.DataFrame):
-            rec_df = balanced_unmatched_zip.copy()
-        else:
-            # the output object is a np rec array. Convert to pd df
-            rec_index = [i for i in range(1, len(balanced_unmatched_zip) + 1)]
-            rec_df = pd.DataFrame(balanced_unmatched_zip, index=rec_index)
-        print "Saving CSV...."
-        # write the first balanced dataframe to directory
-        sav_csv = w_dir + "/" + report_name.split(".")[0] + "_Unmatched_ZIP_Balanced.csv"
-        # s = ','.join(unmatched.headers) + '\n'
-        rec_df.to_csv(sav_csv, index=False)
-
-        module_name_2 = unbalanced_zip.__class__.__name__
-        module_combined_name = str(module_name_1) + "_" + str(module_name_2)
-        # write to summary
-        summary_tab.yoy_to_summary(mth_n, yr_n, qtr_n, ticker, balanced_unmatched_zip_yoy, module_combined_name)
-    #--------------------------------------------------------------------------------------------
+    selections = {'Match_Balanced': balanced_output(balanced_matched, c)}
+    balanced_matched = balanced_matched.drop(['index'], axis = 1)
 
-    #####
-    # 6 #
-    #####
-    #--------------------------#
-    # Model: Matched
-    if check_array[check_array['model']=='MATCH_UNMATCH']['In_Use'].values[0] == 0:
-        pass
-    elif check_array[check_array['model']=='MATCHED_REGONLY']['In_Use'].values[0] == 0:
-        pass
-    else:
-        print "------------------------------------------------------------------"
-        print report_name
-        # Work Already Completed
-        print "Model Matched is already balanced. Proceeding with secondary balancing."
-        module_name_1 = "matched"
-
-        #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #
-        # pass object to RegOnly (uses numpy rec array)]
-        #--------------------------#
-        # Model: RegOnly
-        # since RegOnly takes np rec array, reconvert balanced_matched to np rec array
-        balanced_matched_np = balanced_matched.to_records()
-        print "------------------------------------------------------------------"
-        BalancingClass = __import__(eval("class_REGONLY"))
-        module_contents = dir(BalancingClass)
-        related_class = [m.group(0) for l in module_contents for m in [regex_class.search(l)] if m][0]
-        # (I) Python dynamic instantiation from string name of a class in dynamically imported module:
-        class_ = getattr(BalancingClass, related_class)
-        unbalanced_regonly = class_(balanced_matched_np, prior_yr, current_yr, footprint_dir)
-        print "Sample Size: %s" % (len(balanced_matched_np))
-        print "Building Sample ... Checking Convergence Tolerance"
-        class_contents = dir(unbalanced_regonly)
-        related_method = [m.group(0) for l in class_contents for m in [regex_sample.search(l)] if m][0]
-        # (II) Calling a function of a module from a string with the function's name:
-        balanced_matched_regonly, balanced_matched_regonly_yoy = getattr(unbalanced_regonly, related_method)()
-
-        # detect whether or not the output data is in pd df or not. If it is not, convert to pd df
-        print "Conforming Output to Pandas DF Format..."
-        if isinstance(balanced_matched_regonly, pd.DataFrame):
-            rec_df = balanced_matched_regonly.copy()
-        else:
-            # the output object is a np rec array. Convert to pd df
-            rec_index = [i for i in range(1, len(balanced_matched_regonly) + 1)]
-            rec_df = pd.DataFrame(balanced_matched_regonly, index=rec_index)
-        print "Saving CSV...."
-        # write the first balanced dataframe to directory
-        sav_csv = w_dir + "/" + report_name.split(".")[0] + "_Matched_RegOnly_Balanced.csv"
-        # s = ','.join(unmatched.headers) + '\n'
-        rec_df.drop(['index'], axis = 1, inplace = True)
-        rec_df.to_csv(sav_csv, index=False)
-
-        module_name_2 = unbalanced_regonly.__class__.__name__
-        module_combined_name = str(module_name_1) + "_" + str(module_name_2)
-        # write to summary
-        summary_tab.yoy_to_summary(mth_n, yr_n, qtr_n, ticker, balanced_matched_regonly_yoy, module_combined_name)
-    #--------------------------------------------------------------------------------------------
+    #--------------------------------------------------------------------------------------------#
+    selections['Unmatch_Balanced'] = balanced_output(balanced_unmatched, c)
+    balanced_unmatched = balanced_unmatched.drop(['index'], axis = 1)
 
-    #####
-    # 7 #
-    #####
-    #--------------------------#
-    # Model: Unmatched
-    if check_array[check_array['model']=='MATCH_UNMATCH']['In_Use'].values[0] == 0:
-        pass
-    elif check_array[check_array['model']=='MATCHED_REGONLY']['In_Use'].values[0] == 0:
-        pass
-    else:
-        print "------------------------------------------------------------------"
-        print report_name
-        # Work Already Completed
-        print "Model Unmatched is already balanced. Proceeding with secondary balancing."
-        module_name_1 = "unmatched"
-
-        #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #
-        # pass object to RegOnly (uses numpy rec array)]
-        #--------------------------#
-        # Model: RegOnly
-        # since RegOnly takes np rec array, reconvert balanced_matched to np rec array
-        balanced_unmatched_np = balanced_unmatched.to_records()
-        print "------------------------------------------------------------------"
-        BalancingClass = __import__(eval("class_REGONLY"))
-        module_contents = dir(BalancingClass)
-        related_class = [m.group(0) for l in module_contents for m in [regex_class.search(l)] if m][0]
-        # (I) Python dynamic instantiation from string name of a class in dynamically imported module:
-        class_ = getattr(BalancingClass, related_class)
-        unbalanced_regonly = class_(balanced_unmatched_np, prior_yr, current_yr, footprint_dir)
-        print "Sample Size: %s" % (len(balanced_unmatched_np))
-        print "Building Sample ... Checking Convergence Tolerance"
-        class_contents = dir(unbalanced_regonly)
-        related_method = [m.group(0) for l in class_contents for m in [regex_sample.search(l)] if m][0]
-        # (II) Calling a function of a module from a string with the function's name:
-        balanced_unmatched_regonly, balanced_unmatched_regonly_yoy = getattr(unbalanced_regonly, related_method)()
-
-        # detect whether or not the output data is in pd df or not. If it is not, convert to pd df
-        print "Conforming Output to Pandas DF Format..."
-        if isinstance(balanced_unmatched_regonly, pd.DataFrame):
-            rec_df = balanced_unmatched_regonly.copy()
-        else:
-            # the output object is a np rec array. Convert to pd df
-            rec_index = [i for i in range(1, len(balanced_unmatched_regonly) + 1)]
-            rec_df = pd.DataFrame(balanced_unmatched_regonly, index=rec_index)
-        print "Saving CSV...."
-        # write the first balanced dataframe to directory
-        sav_csv = w_dir + "/" + report_name.split(".")[0] + "_Unmatched_RegOnly_Balanced.csv"
-        # s = ','.join(unmatched.headers) + '\n'
-        rec_df.to_csv(sav_csv, index=False)
-
-        module_name_2 = unbalanced_regonly.__class__.__name__
-        module_combined_name = str(module_name_1) + "_" + str(module_name_2)
-        # write to summary
-        summary_tab.yoy_to_summary(mth_n, yr_n, qtr_n, ticker, balanced_unmatched_regonly_yoy, module_combined_name)
-    #--------------------------------------------------------------------------------------------
+    balanced = {'MATCHED': (balanced_matched, "matched"), 'UNMATCHED': (balanced_unmatched, "unmatched")}
+    datasets = dict((dataset, balanced_dataset(balanced[dataset][0], balanced[dataset][1], forms))
+                    for dataset, forms in outputs.items())
+    return {'datasets': datasets,
+            'summary': [(balanced_matched_yoy, "matched"), (balanced_unmatched_yoy, "unmatched")],
+            'selections': selections}
 
-    #####
-    # 8 #
-    #####
-    #--------------------------#
-    # Model: Matched
-    if check_array[check_array['model']=='MATCH_UNMATCH']['In_Use'].values[0] == 0:
-        pass
-    elif check_array[check_array['model']=='MATCHED_SPACES']['In_Use'].values[0] == 0:
-        pass
-    else:
-        print "------------------------------------------------------------------"
-        print report_name
-        # Work Already Completed
-        print "Model Matched is already balanced. Proceeding with secondary balancing."
-        module_name_1 = "matched"
-
-        #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #
-        # pass object to Spaces (uses numpy rec array)]
-        #--------------------------#
-        # Model: Spaces
-        # since Spaces takes np rec array, reconvert balanced_matched to np rec array
-        print "------------------------------------------------------------------"
-        BalancingClass = __import__(eval("class_SPACES"))
-        module_contents = dir(BalancingClass)
-        related_class = [m.group(0) for l in module_contents for m in [regex_class.search(l)] if m][0]
-        # (I) Python dynamic instantiation from string name of a class in dynamically imported module:
-        class_ = getattr(BalancingClass, related_class)
-        unbalanced_spaces = class_(balanced_matched_np, prior_yr, current_yr, footprint_dir)
-        print "Sample Size: %s" % (len(balanced_matched_np))
-        print "Building Sample ... Checking Convergence Tolerance"
-        class_contents = dir(unbalanced_spaces)
-        related_method = [m.group(0) for l in class_contents for m in [regex_sample.search(l)] if m][0]
-        # (II) Calling a function of a module from a string with the function's name:
-        balanced_matched_spaces, balanced_matched_spaces_yoy = getattr(unbalanced_spaces, related_method)()
-
-        # detect whether or not the output data is in pd df or not. If it is not, convert to pd df
-        print "Conforming Output to Pandas DF Format..."
-        if isinstance(balanced_matched_spaces, pd.DataFrame):
-            rec_df = balanced_matched_spaces.copy()
-        else:
-            # the output object is a np rec array. Convert to pd df
-            rec_index = [i for i in range(1, len(balanced_matched_spaces) + 1)]
-            rec_df = pd.DataFrame(balanced_matched_spaces, index=rec_index)
-        print "Saving CSV...."
-        # write the first balanced dataframe to directory
-        sav_csv = w_dir + "/" + report_name.split(".")[0] + "_Matched_Spaces_Balanced.csv"
-        # s = ','.join(unmatched.headers) + '\n'
-        rec_df.drop(['index'], axis = 1, inplace = True)
-        rec_df.to_csv(sav_csv, index=False)
-
-        module_name_2 = unbalanced_spaces.__class__.__name__
-        module_combined_name = str(module_name_1) + "_" + str(module_name_2)
-        # write to summary
-        summary_tab.yoy_to_summary(mth_n, yr_n, qtr_n, ticker, balanced_matched_spaces_yoy, module_combined_name)
-    #--------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------
+def hybrid_task(deps, report, model, outputs):
+    """
+    Purpose: balance the parent dataset of a hybrid model with the balancing class of the model (see model_graph)
+    :param deps: {parent dataset: the result of the model that produced it}
+    :param report: a report dictionary (see report_tasks())
+    :param model: the model name of the node in model_graph
+    :param outputs: {model: forms} if other models are built on this one (see balanced_dataset())
+    :return: a dictionary with the 'datasets', the summary entry and the balanced 'selections'
+    """
+    report_name, prior_yr, current_yr, footprint_dir, registry = report_context(report)
+    node = model_nodes[model]
+    parent = deps[node['parent']]['datasets'][node['parent']]
+    unbalanced_data = parent[node['input']]
+    print "------------------------------------------------------------------"
+    print report_name
+    # Work Already Completed
+    print "Model {} is already balanced. Proceeding with secondary balancing.".format(node['parent'])
+    print "------------------------------------------------------------------"
+    class_, sample = registry[node['class']]
+    unbalanced = class_(unbalanced_data, prior_yr, current_yr, footprint_dir)
+    print "Sample Size: %s" % (len(unbalanced_data))
+    print "Building Sample ... Checking Convergence Tolerance"
+    balanced, balanced_yoy = sample(unbalanced)
+
+    # the output is a pd df or a np rec array: its columns are read as they are (see balanced_output())
+    selections = {node['csv'] + "_Balanced": balanced_output(balanced, report_data(report_name), node['drop_index'])}
+
+    module_combined_name = str(parent['name']) + "_" + str(unbalanced.__class__.__name__)
+    datasets = dict((dataset, balanced_dataset(balanced, module_combined_name, forms))
+                    for dataset, forms in outputs.items())
+    # summary entry (applied to summary_tab by the caller)
+    return {'datasets': datasets, 'summary': [(balanced_yoy, module_combined_name)], 'selections': selections}
 
-    #####
-    # 9 #
-    #####
-    #--------------------------#
-    # Model: Unmatched
-    if check_array[check_array['model']=='MATCH_UNMATCH']['In_Use'].values[0] == 0:
-        pass
-    elif check_array[check_array['model']=='UNMATCHED_SPACES']['In_Use'].values[0] == 0:
-        pass
-    else:
-        print "------------------------------------------------------------------"
-        print report_name
-        # Work Already Completed
-        print "Model Unmatched is already balanced. Proceeding with secondary balancing."
-        module_name_1 = "unmatched"
-
-        #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #
-        # pass object to Spaces (uses numpy rec array)]
-        #--------------------------#
-        # Model: Spaces
-        # since Spaces takes np rec array, reconvert balanced_unmatched to np rec array
-        print "------------------------------------------------------------------"
-        BalancingClass = __import__(eval("class_SPACES"))
-        module_contents = dir(BalancingClass)
-        related_class = [m.group(0) for l in module_contents for m in [regex_class.search(l)] if m][0]
-        # (I) Python dynamic instantiation from string name of a class in dynamically imported module:
-        class_ = getattr(BalancingClass, related_class)
-        unbalanced_spaces = class_(balanced_unmatched_np, prior_yr, current_yr, footprint_dir)
-        print "Sample Size: %s" % (len(balanced_unmatched_np))
-        print "Building Sample ... Checking Convergence Tolerance"
-        class_contents = dir(unbalanced_spaces)
-        related_method = [m.group(0) for l in class_contents for m in [regex_sample.search(l)] if m][0]
-        # (II) Calling a function of a module from a string with the function's name:
-        balanced_unmatched_spaces, balanced_unmatched_spaces_yoy = getattr(unbalanced_spaces, related_method)()
-
-        # detect whether or not the output data is in pd df or not. If it is not, convert to pd df
-        print "Conforming Output to Pandas DF Format..."
-        if isinstance(balanced_unmatched_spaces, pd.DataFrame):
-            rec_df = balanced_unmatched_spaces.copy()
+# -------------------------------------------------------------------------------
+def zum_merge_task(deps, report, model, outputs):
+    """
+    Purpose: merge the balanced unmatched->ZIP sample with the balanced matched sample (the input of the ZUM hybrids)
+    :return: a dictionary with the merged dataset
+    """
+    print "------------------------------------------------------------------"
+    # Work Already Completed
+    print "Model Matched is already balanced. Proceeding with secondary balancing."
+    print "Model Unmatched->Zip2 is already balanced. Proceeding with data-set merge"
+    balanced_matched = deps['MATCHED']['datasets']['MATCHED']['data']
+    balanced_unmatched_zip = deps['UNMATCHED_ZIP']['datasets']['UNMATCHED_ZIP']['data']
+
+    # Want to combine (1) balanced_unmatched_zip + (2) balanced_matched, with the date column conformed into the
+    # format expected by most (if not all) of the balancing modules/classes!
+    balanced_zipunmatch_match = zum_dataset.merge([balanced_unmatched_zip, balanced_matched])
+    datasets = dict((dataset, balanced_dataset(balanced_zipunmatch_match, "matched_zip_unmatched", forms))
+                    for dataset, forms in outputs.items())
+    return {'datasets': datasets, 'summary': [], 'selections': {}}
+
+# -------------------------------------------------------------------------------
+def model_graph_order(nodes):
+    """
+    Purpose: sort the nodes of a model graph topologically (a node after the nodes of its parent datasets), keeping
+    the list order where the graph allows it
+    :param nodes: a list of model_graph nodes
+    :return: the sorted list. Raises ValueError if a parent dataset is unknown or the graph has a cycle
+    """
+    produced = set(node['model'] for node in nodes)
+    pending = list(nodes)
+    ordered = []
+    done = set()
+    while pending:
+        for node in pending:
+            parents = node.get('parents', [node.get('parent')])
+            unknown = [d for d in parents if d not in produced and not model_roots(d)]
+            if unknown:
+                raise ValueError("model {}: unknown parent dataset {}".format(node['model'], unknown[0]))
+            if all(d in done or d not in produced for d in parents):
+                ordered.append(node)
+                done.add(node['model'])
+                pending.remove(node)
+                break
         else:
-            # the output object is a np rec array. Convert to pd df
-            rec_index = [i for i in range(1, len(balanced_unmatched_spaces) + 1)]
-            rec_df = pd.DataFrame(balanced_unmatched_spaces, index=rec_index)
-        print "Saving CSV...."
-        # write the first balanced dataframe to directory
-        sav_csv = w_dir + "/" + report_name.split(".")[0] + "_Unmatched_Spaces_Balanced.csv"
-        # s = ','.join(unmatched.headers) + '\n'
-        rec_df.drop(['index'], axis = 1, inplace = True)
-        rec_df.to_csv(sav_csv, index=False)
-
-        module_name_2 = unbalanced_spaces.__class__.__name__
-        module_combined_name = str(module_name_1) + "_" + str(module_name_2)
-        # write to summary
-        summary_tab.yoy_to_summary(mth_n, yr_n, qtr_n, ticker, balanced_unmatched_spaces_yoy, module_combined_name)
-    #--------------------------------------------------------------------------------------------
+            raise ValueError("the model graph has a cycle: {}".format([node['model'] for node in pending]))
+    return ordered
 
-    #################################################
-    # Match + Unmatched/Zip2 (Hybrid dataset merge) #
-    #################################################
-    #--------------------------#
-    # Model: Matched + Unmatched
-    if check_array[check_array['model']=='ZIP']['In_Use'].values[0] == 0:
-        pass
-    elif check_array[check_array['model']=='MATCH_UNMATCH']['In_Use'].values[0] == 0:
-        pass
-    elif check_array[check_array['model'] == 'UNMATCHED_ZIP']['In_Use'].values[0] == 0:
-        pass
-    else:
-        print "------------------------------------------------------------------"
-        # Work Already Completed
-        print "Model Matched is already balanced. Proceeding with secondary balancing."
-        print "Model Unmatched->Zip2 is already balanced. Proceeding with data-set merge"
-        module_name_0 = "matched"
-        module_name_1 = "zip_unmatched"
-
-        # Want to combine (1) balanced_unmatched_zip + (2) balanced_matched
-        balanced_zipunmatch_match = balanced_unmatched_zip.append(balanced_matched, ignore_index=True)
-        # conform the date column into the format expected by most (if not all) of the balancing modules/classes!
-        balanced_zipunmatch_match.loc[:, 'Notes'] = pd.to_datetime(balanced_zipunmatch_match['Notes'], format="%m/%d/%Y").dt.strftime('%Y-%m-%d')
-        balanced_zipunmatch_match_np = balanced_zipunmatch_match.to_records()
-    #--------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------
+def model_roots(dataset):
+    """
+    :return: True if dataset is the output of a single model or of MATCH_UNMATCH (a root of the model graph)
+    """
+    return dataset in dataset_sources or dataset in balancing_modules
 
-    ####$#
-    # 10 #
-    #####$
-    #--------------------------#
-    # Model: Zip-Unmatched + Matched
-    if check_array[check_array['model']=='DDOD']['In_Use'].values[0] == 0:
-        pass
-    elif check_array[check_array['model']=='MATCH_UNMATCH']['In_Use'].values[0] == 0:
-        pass
-    elif check_array[check_array['model'] == 'UNMATCHED_ZIP']['In_Use'].values[0] == 0:
-        pass
-    elif check_array[check_array['model']=='ZUM_DDOD']['In_Use'].values[0] == 0:
-        pass
-    else:
-        print "------------------------------------------------------------------"
-        print report_name
-        # Work Already Completed
-        print "Model Zip-Unmatched + Matched exists. Proceeding with secondary balancing."
-
-        #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #
-        # pass object to DDOD (uses numpy rec array)]
-        #--------------------------#
-        # Model: DDOD
-        # since RegOnly takes np rec array, reconvert balanced_matched to np rec array
-        balanced_zipunmatch_match_np = balanced_zipunmatch_match.to_records()
-        print "------------------------------------------------------------------"
-        BalancingClass = __import__(eval("class_DDOD"))
-        module_contents = dir(BalancingClass)
-        related_class = [m.group(0) for l in module_contents for m in [regex_class.search(l)] if m][0]
-        # (I) Python dynamic instantiation from string name of a class in dynamically imported module:
-        class_ = getattr(BalancingClass, related_class)
-        unbalanced_ddod = class_(balanced_zipunmatch_match_np, prior_yr, current_yr, footprint_dir)
-        print "Sample Size: %s" % (len(balanced_zipunmatch_match_np))
-        print "Building Sample ... Checking Convergence Tolerance"
-        class_contents = dir(unbalanced_ddod)
-        related_method = [m.group(0) for l in class_contents for m in [regex_sample.search(l)] if m][0]
-        # (II) Calling a function of a module from a string with the function's name:
-        balanced_zum_ddod, balanced_zum_ddod_yoy = getattr(unbalanced_ddod, related_method)()
-
-        # detect whether or not the output data is in pd df or not. If it is not, convert to pd df
-        print "Conforming Output to Pandas DF Format..."
-        if isinstance(balanced_zum_ddod, pd.DataFrame):
-            rec_df = balanced_zum_ddod.copy()
-        else:
-            # the output object is a np rec array. Convert to pd df
-            rec_index = [i for i in range(1, len(balanced_zum_ddod) + 1)]
-            rec_df = pd.DataFrame(balanced_zum_ddod, index=rec_index)
-        print "Saving CSV...."
-        # write the first balanced dataframe to directory
-        sav_csv = w_dir + "/" + report_name.split(".")[0] + "_Zum_DDOD_Balanced.csv"
-        # s = ','.join(unmatched.headers) + '\n'
-        rec_df.drop(['index'], axis = 1, inplace = True)
-        rec_df.to_csv(sav_csv, index=False)
-
-        module_name_3 = unbalanced_ddod.__class__.__name__
-        module_combined_name = str(module_name_0) + "_" + str(module_name_1) + "_" + str(module_name_3)
-        # write to summary
-        summary_tab.yoy_to_summary(mth_n, yr_n, qtr_n, ticker, balanced_zum_ddod_yoy, module_combined_name)
-    #--------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------
+def node_parents(node):
+    """
+    :return: the parent datasets of a model_graph node
+    """
+    return node.get('parents', [node.get('parent')])
 
-    ####$#
-    # 11 #
-    #####$
-    #--------------------------#
-    # Model: Zip-Unmatched + Matched
-    if check_array[check_array['model']=='POPDEN']['In_Use'].values[0] == 0:
-        pass
-    elif check_array[check_array['model']=='MATCH_UNMATCH']['In_Use'].values[0] == 0:
-        pass
-    elif check_array[check_array['model'] == 'UNMATCHED_ZIP']['In_Use'].values[0] == 0:
-        pass
-    elif check_array[check_array['model']=='ZUM_DEM']['In_Use'].values[0] == 0:
-        pass
-    else:
-        print "------------------------------------------------------------------"
-        print report_name
-        # Work Already Completed
-        print "Model Zip-Unmatched + Matched exists. Proceeding with secondary balancing."
-
-        #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #
-        # pass object to PopDen (uses pd df)]
-        #--------------------------#
-        # Model: PopDen(Demographics)
-        print "------------------------------------------------------------------"
-        BalancingClass = __import__(eval("class_POPDEN"))
-        module_contents = dir(BalancingClass)
-        related_class = [m.group(0) for l in module_contents for m in [regex_class.search(l)] if m][0]
-        # (I) Python dynamic instantiation from string name of a class in dynamically imported module:
-        class_ = getattr(BalancingClass, related_class)
-        unbalanced_dem = class_(balanced_zipunmatch_match, prior_yr, current_yr, footprint_dir)
-        print "Sample Size: %s" % (len(balanced_zipunmatch_match))
-        print "Building Sample ... Checking Convergence Tolerance"
-        class_contents = dir(unbalanced_dem)
-        related_method = [m.group(0) for l in class_contents for m in [regex_sample.search(l)] if m][0]
-        # (II) Calling a function of a module from a string with the function's name:
-        balanced_zum_dem, balanced_zum_dem_yoy = getattr(unbalanced_dem, related_method)()
-
-        # detect whether or not the output data is in pd df or not. If it is not, convert to pd df
-        print "Conforming Output to Pandas DF Format..."
-        if isinstance(balanced_zum_dem, pd.DataFrame):
-            rec_df = balanced_zum_dem.copy()
+# -------------------------------------------------------------------------------
+def report_tasks(n, report, check_array, keep=()):
+    """
+    Purpose: the balancing models of a report as task_pool tasks
+    Process:
+    1) the roots: the single models of check_array (model names without "_") and MATCH_UNMATCH where In_Use != 0,
+        in check_array order. They only need the report, so they all run concurrently
+    2) the nodes of model_graph, in topological order. A node is dropped, and with it its whole subtree, if the node,
+        one of its 'requires' models or one of its ancestors is not In_Use. A node is submitted as soon as the models
+        it is built on have finished
+    3) the datasets (and their forms) that the kept nodes need: every model returns only these, so that a dataset
+        shared by several hybrids is balanced and converted to a np rec array once
+    The task order is the order in which the summary is written (the driver applies the summary entries in this
+    order).
+
+    :param n: the number of the report in the run (the first element of every task key)
+    :param report: a dictionary with the report_name, prior_yr, current_yr, footprint_dir and avg_option of the
+    report, and the models of the balancing classes to resolve (see scheduled_models())
+    :param check_array: the model_check table (columns 'model' and 'In_Use')
+    :param keep: (optional) root datasets whose 'data' is always returned (see balancing_process())
+    :return: a list of (key, task function name, args, dependencies) tuples (see task_pool.run())
+    """
+    in_use = dict((model, flag != 0) for model, flag in zip(check_array['model'], check_array['In_Use']))
+    # (1)
+    roots = [model for model in check_array['model'] if len(model.split("_")) == 1 and in_use[model]]
+    if in_use.get('MATCH_UNMATCH', False):
+        roots.append('MATCH_UNMATCH')
+    available = set(roots) | set(d for d, source in dataset_sources.items() if source in roots)
+    # (2)
+    nodes = []
+    for node in model_graph_order(model_graph):
+        if in_use.get(node['model'], True) and all(in_use.get(m, False) for m in node.get('requires', [])) \
+                and all(d in available for d in node_parents(node)):
+            nodes.append(node)
+            available.add(node['model'])
+    # (3)
+    forms = dict((d, set(['data'])) for d in keep if d in available)
+    for node in nodes:
+        for d in node_parents(node):
+            forms.setdefault(d, set()).add(node.get('input', 'data'))
+    outputs = {}
+    for d in forms:
+        outputs.setdefault(dataset_sources.get(d, d), {})[d] = sorted(forms[d])
+
+    tasks = []
+    for model in roots:
+        if model == 'MATCH_UNMATCH':
+            tasks.append(((n, model), 'match_unmatch_task', (report, outputs.get(model, {})), {}))
         else:
-            # the output object is a np rec array. Convert to pd df
-            rec_index = [i for i in range(1, len(balanced_zum_dem) + 1)]
-            rec_df = pd.DataFrame(balanced_zum_dem, index=rec_index)
-        print "Saving CSV...."
-        # write the first balanced dataframe to directory
-        sav_csv = w_dir + "/" + report_name.split(".")[0] + "_Zum_Dem_Balanced.csv"
-        # s = ','.join(unmatched.headers) + '\n'
-        rec_df.to_csv(sav_csv, index=False)
-
-        module_name_3 = unbalanced_dem.__class__.__name__
-        module_combined_name = str(module_name_0) + "_" + str(module_name_1) + "_" + str(module_name_3)
-        # write to summary
-        summary_tab.yoy_to_summary(mth_n, yr_n, qtr_n, ticker, balanced_zum_dem_yoy, module_combined_name)
-    #--------------------------------------------------------------------------------------------
+            tasks.append(((n, model), 'single_model_task', (report, model, outputs.get(model, {})), {}))
+    for node in nodes:
+        model = node['model']
+        depends = dict((d, (n, dataset_sources.get(d, d))) for d in node_parents(node))
+        tasks.append(((n, model), node.get('task', 'hybrid_task'), (report, model, outputs.get(model, {})), depends))
+    return tasks
 
-    ####$#
-    # 12 #
-    #####$
-    #--------------------------#
-    # Model: Zip-Unmatched + Matched
-    if check_array[check_array['model']=='REGPOPDEN']['In_Use'].values[0] == 0:
-        pass
-    elif check_array[check_array['model']=='MATCH_UNMATCH']['In_Use'].values[0] == 0:
-        pass
-    elif check_array[check_array['model'] == 'UNMATCHED_ZIP']['In_Use'].values[0] == 0:
-        pass
-    elif check_array[check_array['model']=='ZUM_REGPOPDEN']['In_Use'].values[0] == 0:
-        pass
-    else:
-        print "------------------------------------------------------------------"
-        print report_name
-        # Work Already Completed
-        print "Model Zip-Unmatched + Matched exists. Proceeding with secondary balancing."
-
-        #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #
-        # pass object to RegPopDen (uses pd df)]
-        #--------------------------#
-        # Model: RegPopDen
-        print "------------------------------------------------------------------"
-        BalancingClass = __import__(eval("class_REGPOPDEN"))
-        module_contents = dir(BalancingClass)
-        related_class = [m.group(0) for l in module_contents for m in [regex_class.search(l)] if m][0]
-        # (I) Python dynamic instantiation from string name of a class in dynamically imported module:
-        class_ = getattr(BalancingClass, related_class)
-        unbalanced_regpopden = class_(balanced_zipunmatch_match, prior_yr, current_yr, footprint_dir)
-        print "Sample Size: %s" % (len(balanced_zipunmatch_match))
-        print "Building Sample ... Checking Convergence Tolerance"
-        class_contents = dir(unbalanced_regpopden)
-        related_method = [m.group(0) for l in class_contents for m in [regex_sample.search(l)] if m][0]
-        # (II) Calling a function of a module from a string with the function's name:
-        balanced_zum_regpopden, balanced_zum_regpopden_yoy = getattr(unbalanced_regpopden, related_method)()
-
-        # detect whether or not the output data is in pd df or not. If it is not, convert to pd df
-        print "Conforming Output to Pandas DF Format..."
-        if isinstance(balanced_zum_regpopden, pd.DataFrame):
-            rec_df = balanced_zum_regpopden.copy()
-        else:
-            # the output object is a np rec array. Convert to pd df
-            rec_index = [i for i in range(1, len(balanced_zum_regpopden) + 1)]
-            rec_df = pd.DataFrame(balanced_zum_regpopden, index=rec_index)
-        print "Saving CSV...."
-        # write the first balanced dataframe to directory
-        sav_csv = w_dir + "/" + report_name.split(".")[0] + "_Zum_RegPopDen_Balanced.csv"
-        # s = ','.join(unmatched.headers) + '\n'
-        rec_df.to_csv(sav_csv, index=False)
-
-        module_name_3 = unbalanced_regpopden.__class__.__name__
-        module_combined_name = str(module_name_0) + "_" + str(module_name_1) + "_" + str(module_name_3)
-        # write to summary
-        summary_tab.yoy_to_summary(mth_n, yr_n, qtr_n, ticker, balanced_zum_regpopden_yoy, module_combined_name)
-    #--------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------
+def scheduled_models(check_array):
+    """
+    Purpose: the balancing classes that the models In_Use in check_array need: the single models and MATCH_UNMATCH
+    that report_tasks() schedules, and the 'class' of its hybrid nodes. Only these are resolved (imported), so a
+    model that is not In_Use does not need its module
+    :param check_array: the model_check table (columns 'model' and 'In_Use')
+    :return: a sorted list of balancing_modules keys
+    """
+    models = set()
+    for (n, model), function_name, args, depends in report_tasks(0, None, check_array):
+        node = model_nodes.get(model)
+        if node is None:
+            models.add(model)
+        elif 'class' in node:
+            models.add(node['class'])
+    return sorted(models)
 
-    ####$#
-    # 13 #
-    #####$
-    #--------------------------#
-    # Model: Zip-Unmatched + Matched
-    if check_array[check_array['model']=='REGONLY']['In_Use'].values[0] == 0:
-        pass
-    elif check_array[check_array['model']=='MATCH_UNMATCH']['In_Use'].values[0] == 0:
-        pass
-    elif check_array[check_array['model'] == 'UNMATCHED_ZIP']['In_Use'].values[0] == 0:
-        pass
-    elif check_array[check_array['model']=='ZUM_REGONLY']['In_Use'].values[0] == 0:
-        pass
-    else:
-        print "------------------------------------------------------------------"
-        print report_name
-        # Work Already Completed
-        print "Model Zip-Unmatched + Matched exists. Proceeding with secondary balancing."
-
-        #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #
-        # pass object to RegOnly (uses np rec array)]
-        #--------------------------#
-        # Model: RegOnly
-        # since RegOnly takes np rec array, reconvert balanced_matched to np rec array
-        # balanced_zipunmatch_match_np = balanced_zipunmatch_match.to_records()
-        print "------------------------------------------------------------------"
-        BalancingClass = __import__(eval("class_REGONLY"))
-        module_contents = dir(BalancingClass)
-        related_class = [m.group(0) for l in module_contents for m in [regex_class.search(l)] if m][0]
-        # (I) Python dynamic instantiation from string name of a class in dynamically imported module:
-        class_ = getattr(BalancingClass, related_class)
-        unbalanced_regonly = class_(balanced_zipunmatch_match_np, prior_yr, current_yr, footprint_dir)
-        print "Sample Size: %s" % (len(balanced_zipunmatch_match_np))
-        print "Building Sample ... Checking Convergence Tolerance"
-        class_contents = dir(unbalanced_regonly)
-        related_method = [m.group(0) for l in class_contents for m in [regex_sample.search(l)] if m][0]
-        # (II) Calling a function of a module from a string with the function's name:
-        balanced_zum_regonly, balanced_zum_regonly_yoy = getattr(unbalanced_regonly, related_method)()
-
-        # detect whether or not the output data is in pd df or not. If it is not, convert to pd df
-        print "Conforming Output to Pandas DF Format..."
-        if isinstance(balanced_zum_regonly, pd.DataFrame):
-            rec_df = balanced_zum_regonly.copy()
-        else:
-            # the output object is a np rec array. Convert to pd df
-            rec_index = [i for i in range(1, len(balanced_zum_regonly) + 1)]
-            rec_df = pd.DataFrame(balanced_zum_regonly, index=rec_index)
-        print "Saving CSV...."
-        # write the first balanced dataframe to directory
-        sav_csv = w_dir + "/" + report_name.split(".")[0] + "_Zum_RegOnly_Balanced.csv"
-        # s = ','.join(unmatched.headers) + '\n'
-        rec_df.drop(['index'], axis = 1, inplace = True)
-        rec_df.to_csv(sav_csv, index=False)
-
-        module_name_3 = unbalanced_regonly.__class__.__name__
-        module_combined_name = str(module_name_0) + "_" + str(module_name_1) + "_" + str(module_name_3)
-        # write to summary
-        summary_tab.yoy_to_summary(mth_n, yr_n, qtr_n, ticker, balanced_zum_regonly_yoy, module_combined_name)
-    #--------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------
+def pending_tasks(tasks, finished):
+    """
+    Purpose: drop the tasks that finished in an earlier run (see checkpoint_store.py), except those that a task which
+    still has to run is built on (their datasets are not checkpointed, so they run again)
+    :param tasks: a list of tasks (see report_tasks()), dependencies before their dependents
+    :param finished: a function task key -> True if the task finished in an earlier run
+    :return: the tasks to run, in the order of tasks
+    """
+    needed = set()
+    pending = []
+    for key, function_name, args, depends in reversed(tasks):
+        if key in needed or not finished(key):
+            pending.append((key, function_name, args, depends))
+            needed.update(depends.values())
+    return pending[::-1]
 
-    ####$#
-    # 14 #
-    #####$
-    #--------------------------#
-    # Model: Zip-Unmatched + Matched
-    if check_array[check_array['model']=='REGWKHIGH']['In_Use'].values[0] == 0:
-        pass
-    elif check_array[check_array['model']=='MATCH_UNMATCH']['In_Use'].values[0] == 0:
-        pass
-    elif check_array[check_array['model'] == 'UNMATCHED_ZIP']['In_Use'].values[0] == 0:
-        pass
-    elif check_array[check_array['model']=='ZUM_REGWKHIGH']['In_Use'].values[0] == 0:
-        pass
-    else:
-        print "------------------------------------------------------------------"
-        print report_name
-        # Work Already Completed
-        print "Model Zip-Unmatched + Matched exists. Proceeding with secondary balancing."
-
-        #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #   #
-        # pass object to RegWknd (uses np rec array)]
-        #--------------------------#
-        # Model: RegOnly
-        print "------------------------------------------------------------------"
-        BalancingClass = __import__(eval("class_REGWKHIGH"))
-        module_contents = dir(BalancingClass)
-        related_class = [m.group(0) for l in module_contents for m in [regex_class.search(l)] if m][0]
-        # (I) Python dynamic instantiation from string name of a class in dynamically imported module:
-        class_ = getattr(BalancingClass, related_class)
-        unbalanced_regwkhigh = class_(balanced_zipunmatch_match_np, prior_yr, current_yr, footprint_dir)
-
-        print "Sample Size: %s" % (len(balanced_zipunmatch_match_np))
-        print "Building Sample ... Checking Convergence Tolerance"
-        class_contents = dir(unbalanced_regwkhigh)
-        related_method = [m.group(0) for l in class_contents for m in [regex_sample.search(l)] if m][0]
-        # (II) Calling a function of a module from a string with the function's name:
-
-        balanced_zum_regwkhigh, balanced_zum_regskhigh_yoy = getattr(unbalanced_regwkhigh, related_method)()
-
-        # detect whether or not the output data is in pd df or not. If it is not, convert to pd df
-        print "Conforming Output to Pandas DF Format..."
-        if isinstance(balanced_zum_regwkhigh, pd.DataFrame):
-            rec_df = balanced_zum_regwkhigh.copy()
-        else:
-            # the output object is a np rec array. Convert to pd df
-            rec_index = [i for i in range(1, len(balanced_zum_regwkhigh) + 1)]
-            rec_df = pd.DataFrame(balanced_zum_regwkhigh, index=rec_index)
-        print "Saving CSV...."
-        # write the first balanced dataframe to directory
-        sav_csv = w_dir + "/" + report_name.split(".")[0] + "_Zum_RegWkHigh_Balanced.csv"
-        # s = ','.join(unmatched.headers) + '\n'
-        rec_df.drop(['index'], axis = 1, inplace = True)
-        rec_df.to_csv(sav_csv, index=False)
-
-        module_name_3 = unbalanced_regwkhigh.__class__.__name__
-        module_combined_name = str(module_name_0) + "_" + str(module_name_1) + "_" + str(module_name_3)
-        # write to summary
-        summary_tab.yoy_to_summary(mth_n, yr_n, qtr_n, ticker, balanced_zum_regskhigh_yoy, module_combined_name)
-    #--------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------
+def balancing_process(c, prior_yr, current_yr, report_name, mth_n, yr_n, qtr_n, ticker, summary_tab, footprint_dir, \
+                      avg_option, check_array, balanced_data_dict, balanced_yoy_dict, unbalanced_dict):
+    """
+    Purpose: run every model of check_array on one report, serially in this process, and write the results to
+    summary_tab (the driver in __main__ runs the same tasks on a process pool, see report_tasks())
+    :return: summary_tab, balanced_data_dict, balanced_yoy_dict, unbalanced_dict (unbalanced_dict holds the class
+    names of the single models)
+    """
+    _report_cache[report_name] = c
+    if report_name not in _report_order:
+        _report_order.append(report_name)
+    report = {'report_name': report_name, 'prior_yr': prior_yr, 'current_yr': current_yr,
+              'footprint_dir': footprint_dir, 'avg_option': avg_option, 'models': scheduled_models(check_array)}
+    single_models = [model for model in check_array['model'] if len(model.split("_")) == 1]
+    tasks = report_tasks(0, report, check_array, keep=single_models)
+    for (n, model), result, error in task_pool.run(tasks, 1, module=sys.modules[__name__]):
+        if error is not None:
+            raise Exception("model {} failed:\n{}".format(model, error))
+        for yoy, module_name in result['summary']:
+            summary_tab.yoy_to_summary(mth_n, yr_n, qtr_n, ticker, yoy, module_name)
+        save_outputs(report_name, result['selections'])
+        if 'yoy' in result:
+            balanced_data_dict["balanced_" + model] = result['datasets'][model]['data']
+            balanced_yoy_dict["balanced" + model + "_yoy"] = result['yoy']
+            unbalanced_dict["unbalanced" + model] = result['datasets'][model]['name']
+    flush_outputs(report_name)
 
     print "**************************"
     print "Printing Summary Report..."
@@ -1271,6 +720,7 @@ def balancing_process(c, prior_yr, current_yr, report_name, mth_n, yr_n, qtr_n,
     # END FUNCTION
     #--------------------------------------------------------------------------------------------
 
+
 # -------------------------------------------------------------------------------
 #################
 ### Execution ###
@@ -1451,48 +901,17 @@ if __name__ == '__main__':
     # Class for instantiating a summary file
     import class_yoy_to_summary_v3
 
-    if converged == 'No':
-        import class_RB_ZIP_20150906_AvgOnly
-        import class_RB_WKE_20150309_AvgOnly
-        import class_RB_Type_20150309_AvgOnly
-        import class_RB_State_20150309_AvgOnly
-        import class_RB_Spaces_20150309_AvgOnly
-        import class_RB_SameStores_v2_20151102_AvgOnly
-        import class_RB_SameStores_plus1_20150309_AvgOnly
-        import class_RB_SameStores_20150309_AvgOnly
-        import class_RB_RegWkHigh_20140309_AvgOnly
-        import class_RB_RegSpaces_20170103_AvgOnly
-        import class_RB_RegPopDen_20170103_AvgOnly
-        import class_RB_RegOnly_v2_20150309_AvgOnly
-        import class_RB_RegCom_v2_20150309_AvgOnly
-        import class_RB_RegCensus_v2_20150309_AvgOnly
-        import class_RB_RegCensus_20150309_AvgOnly
-        import class_RB_DOW_20150309_AvgOnly
-        import class_RB_Demographics_20150906_AvgOnly
-        import class_RB_DDOD_20150309_AvgOnly
-        import class_MatchUnmatch_Stats_20150908_AvgOnly
-        avg_option = True
-    else:
-        import class_RB_ZIP_20150906
-        import class_RB_WKE_20150309
-        import class_RB_Type_20150309
-        import class_RB_State_20150309
-        import class_RB_Spaces_20150309
-        import class_RB_SameStores_v2_20151102
-        import class_RB_SameStores_plus1_20150309
-        import class_RB_SameStores_20150309
-        import class_RB_RegWkHigh_20140309
-        import class_RB_RegSpaces_20170103
-        import class_RB_RegPopDen_20170103
-        import class_RB_RegOnly_v2_20150309
-        import class_RB_RegCom_v2_20150309
-        import class_RB_RegCensus_v2_20150309
-        import class_RB_RegCensus_20150309
-        import class_RB_DOW_20150309
-        import class_RB_Demographics_20150906
-        import class_RB_DDOD_20150309
-        import class_MatchUnmatch_Stats_20150908
-        avg_option = False
+    # number of worker processes that run the balancing models (1: run them in this process, in order)
+    workers = multiprocessing.cpu_count()
+    # resume from the checkpoint store of an earlier run: the models that finished there are not run again (False:
+    # start over)
+    resume = True
+
+    # the balancing classes of the models In_Use: resolved (imported, class and sample method found) once, before
+    # any report is processed
+    avg_option = converged == 'No'
+    models_in_use = scheduled_models(model_check)
+    model_registry(avg_option, models_in_use)
 
     #*******************************************************************************************************#
     #############################
@@ -1500,186 +919,158 @@ if __name__ == '__main__':
     #############################
     # Part 1
 
-    raw_reports = []
-    search_box = os.listdir(w_dir)
-    report_keyword = str("RS Metrics_")
-    regex = re.compile(".*({}).*".format(report_keyword), re.IGNORECASE)
-
-    related = [m.group(0) for l in search_box for m in [regex.search(l)] if m]
-    for f in related:
-        if f.endswith(".xlsx"):
-            raw_reports.append(f)
-        elif f.endswith(".csv"):
-            raw_reports.append(f)
-        else:
-            continue
+    # the catalog of the reports in w_dir, updated from the directory listing only if the directory changed (see
+    # rsm_tools/report_catalog.py)
+    catalog = report_catalog.from_directory(w_dir, "RS Metrics_")
+    for f_name in catalog.skipped():
+        print "Skipped (not a <ticker>_<month>_<year> report name): {}".format(f_name)
 
-    distilled_reports = []
-    for n, f in enumerate(raw_reports):
-        # look for the 1st alphanumeric string after the first underscore. If it's greater than 4 characters, drop it
-        if len(f.split("_")[1]) > 4:
-            continue
-        else:
-            distilled_reports.append(f)
-
-    del raw_reports
-
-    # I-i) separate text identifier _Final reports from raw reports
-    final_report_list = []
-    new_report_list = []
-    for f_name in distilled_reports:
-        f_name_parts = f_name.split("_")
-        f_name_last = f_name_parts[-1:][0]
-        if f_name_last == 'Final.csv':
-            final_report_list.append(f_name)
-        else:
-            new_report_list.append(f_name)
-    # I-ii) create 2 dictionaries that will hold file name + ticker/date identifying info for these files
-    # final_report_dict = {}
-    # new_report_dict = {}
     """
     Note on distinguishing between final and new reports:
     Final reports are reports that have already been balanced prior to execution of this script. They
     will NOT be used.
     
     New reports are unbalanced reports.
+
+    Important:
+    - Quarter is not always the default calendar quarter! Depends on the company defined quarter!
     """
-    final_report_dict_df = pd.DataFrame([], columns=['ticker', 'year', 'month', 'quarter'])
-    new_report_dict_df = pd.DataFrame([], columns=['ticker', 'year', 'month', 'quarter'])
-
-    # I-iii) populate dictionaries
-    for i, txt_rep in enumerate(final_report_list):
-        # (a) identify the ticker. Always second element in a split.
-        txt_rep_split = txt_rep.split("_")
-        txt_rep_ticker = txt_rep_split[1]
-        # (b) identify the date elements. Month/Year always 3rd and 4th elements. 4th may require splitting
-        txt_rep_month = txt_rep_split[2]
-        txt_rep_year = txt_rep_split[3].split(".")[0]
-        # generate the month number from the month identifier + quarter from the month number
-        txt_rep_month_n = int(strptime(txt_rep_month, '%b').tm_mon)
-        txt_rep_qtr_n = det_qtr(txt_rep_month_n, txt_rep_ticker, quarter_dictionary)
-        # (c) store info in dictionaries
-        # final_report_dict[txt_rep] = txt_rep_ticker, txt_rep_year, txt_rep_month_n, txt_rep_qtr_n
-        final_report_dict_df.set_value(i, 'ticker', txt_rep_ticker)
-        final_report_dict_df.set_value(i, 'year', txt_rep_year)
-        final_report_dict_df.set_value(i, 'month', txt_rep_month_n)
-        final_report_dict_df.set_value(i, 'quarter', txt_rep_qtr_n)
-        final_report_dict_df.set_value(i, 'report_name', txt_rep)
+    # (ticker, year, month, quarter, report name) of every report, one per (ticker, year, month)
+    final_reports = catalog.reports(quarter_dictionary, final=True)
+    new_reports = catalog.reports(quarter_dictionary)
 
+    # determine the cadence
     cadence_dict = {}
-    for i, txt_rep in enumerate(new_report_list):
-        # (a) identify the ticker. Always second element in a split.
-        txt_rep_split = txt_rep.split("_")
-        txt_rep_ticker = txt_rep_split[1]
-        # (b) identify the date elements. Month/Year always 3rd and 4th elements. 4th may require splitting
-        txt_rep_month = txt_rep_split[2]
-        txt_rep_year = txt_rep_split[3].split(".")[0]
-        # generate the month number from the month identifier + quarter from the month number
-        txt_rep_month_n = int(strptime(txt_rep_month, '%b').tm_mon)
-
-        """
-        Important:
-        - Quarter is not always the default calendar quarter! Depends on the company defined quarter!
-        """
-        txt_rep_qtr_n = det_qtr(txt_rep_month_n, txt_rep_ticker, quarter_dictionary)
-        #txt_rep_qtr_n = int(math.ceil(float(txt_rep_month_n) / 3))
-
-        # determine the cadence
+    for txt_rep_ticker, txt_rep_year, txt_rep_month_n, txt_rep_qtr_n, txt_rep in new_reports:
         cadence_dict[txt_rep_ticker] = det_wk_weights(txt_rep_ticker, quarter_dictionary)
 
-        # (c) store info in dictionaries
-        # new_report_dict[txt_rep] = txt_rep_ticker, txt_rep_year, txt_rep_month_n, txt_rep_qtr_n
-        new_report_dict_df.set_value(i, 'ticker', txt_rep_ticker)
-        new_report_dict_df.set_value(i, 'year', txt_rep_year)
-        new_report_dict_df.set_value(i, 'month', txt_rep_month_n)
-        new_report_dict_df.set_value(i, 'quarter', txt_rep_qtr_n)
-        new_report_dict_df.set_value(i, 'report_name', txt_rep)
-
     #*******************************************************************************************************#
     ###########################################################
     # Work:                                                   #
     ###########################################################
-    # Part 2. Ignore final_report_dict_df`
+    # Part 2. Ignore final_reports
     print "-----------------------------------------------------------"
     print "Reports to Process:"
-    print new_report_list
+    print [txt_rep for txt_rep_ticker, txt_rep_year, txt_rep_month_n, txt_rep_qtr_n, txt_rep in new_reports]
     print "-----------------------------------------------------------"
 
-    # sliceable source dictioanry
-    sliceable = new_report_dict_df.groupby(['ticker', 'year', 'month', 'report_name', 'quarter']).size()
-    # unique tickers
-    tickers_unique = new_report_dict_df['ticker'].unique()
-    # unique years
-    years_unique = new_report_dict_df['year'].unique()
-    # unique months
-    months_unique = new_report_dict_df['month'].unique()
-    # unique quarters
-    quarters_unique = new_report_dict_df['quarter'].unique()
-
     #************************************************************************#
     # create summary file
-    # errata: start_year = years_unique[-1:][0]
-    # errata: start_month = months_unique.min()
     summary_tab = class_yoy_to_summary_v3.create_summary(w_dir, cadence_dict)    # class name is create_summary
     #************************************************************************#
 
-    # Loop through TICKERS
-    for symb in tickers_unique:
-        # take a subset of sliceable
-        ticker_slice = sliceable[symb]
-        # Loop through YEARS
-        for yr in years_unique:
-            try:
-                # take a subset of the ticker slice
-                ticker_year_slice = ticker_slice[yr]
-                # Loop through MONTHS
-                for mth in months_unique:
-                    try:
-                        # take a subset of the ticker_year_slice
-                        ticker_year_month_slice = ticker_year_slice[mth]
-                        """
-                        II-iii(a-e)
-                        BEGIN NP REC ARRAY GENERATION AND PARAM IDENTIFICATION FOR BALANCING MODULES
-                        """
-                        # (a)
-                        # get report name + generate numpy rec array
-                        report_name = ticker_year_month_slice.index[0][0]
-                        c = gen_data(report_name, w_dir)
-                        # (b) determine py and cy
-                        yr_u = list(np.unique(c['Year']))
-                        yr_u.sort()
-                        prior_yr, current_yr = yr_u[0], yr_u[1]
-                        # (c) - ticker is symb
-                        # (d) - month number = mth | year number = yr | quarter number = \
-                        #                                               ticker_year_month_slice.index[0][1]
-                        rep_qtr = ticker_year_month_slice.index[0][1]
-                        # (e) invoke function "BALANCING PROCESS"
-                        print "**************************"
-                        print "Entering Balancing Process"
-                        print "**************************"
-                        # Create holding dictionaries for balanced data and unbalanced data:
-                        balanced_data_dict = {}
-                        balanced_yoy_dict = {}
-                        unbalanced_dict = {}
-                        # balancing_process() returns an updated summary_tab class object with all attributed methods.
-                        # Important: the input to balancing_process() must be the summary_tab class object with all methods.
-                        summary_tab, balanced_data_dict, balanced_yoy_dict, unbalanced_dict = \
-                                            balancing_process(c, prior_yr, current_yr, report_name, mth, int(yr), \
-                                                                rep_qtr, symb, summary_tab, f_dir, avg_option, \
-                                                                model_check, balanced_data_dict, balanced_yoy_dict, \
-                                                                unbalanced_dict)
-                        ejectable_df = summary_tab.eject_df()
-                        ejectable_df.to_csv(str(w_dir + "/balancing_results_summary" + ".csv"), index=False,
-                                            encoding='utf-8')
-                    except:
-                        continue
-            except:
-                continue
+    # every model of every report is recorded in the checkpoint store as soon as it finishes or fails
+    store = checkpoint_store.checkpoint_store(os.path.join(w_dir, checkpoint_store.default_name))
+    if not resume:
+        store.clear()
+    # the summary entries of this run, in long format, appended to balancing_results_log.csv as they come in (see
+    # rsm_tools/summary_log.py); the wide summary is built from them once, at the end
+    results = summary_log.summary_log(os.path.join(w_dir, summary_log.default_name))
+
+    # (1) collect the reports (and the task graphs of their models), by ticker, year and month
+    reports = []
+    tasks = []
+    # task key -> (checkpoint unit, fingerprint); the units of this run, in order
+    units = {}
+    run_units = []
+    for symb, yr, mth, rep_qtr, report_name in new_reports:
+        fingerprint = None
+        try:
+            """
+            II-iii(a-d)
+            BEGIN NP REC ARRAY GENERATION AND PARAM IDENTIFICATION FOR BALANCING MODULES
+            """
+            # (a)
+            # generate numpy rec array of the report
+            fingerprint = checkpoint_store.fingerprint(os.path.join(w_dir, report_name), avg_option)
+            c = report_data(report_name)
+            # (b) determine py and cy
+            yr_u = list(np.unique(c['Year']))
+            yr_u.sort()
+            prior_yr, current_yr = yr_u[0], yr_u[1]
+            # (c) - ticker is symb
+            # (d) - month number = mth | year number = yr | quarter number = rep_qtr
+        except Exception:
+            # the report cannot be balanced at all: recorded as a failure of the report (model None)
+            store.fail((symb, yr, mth, None), fingerprint, traceback.format_exc())
+            run_units.append((symb, yr, mth, None))
+            continue
+        report = {'report_name': report_name, 'prior_yr': prior_yr, 'current_yr': current_yr,
+                  'footprint_dir': f_dir, 'avg_option': avg_option, 'models': models_in_use}
+        report_task_list = report_tasks(len(reports), report, model_check)
+        reports.append({'report_name': report_name, 'month': mth, 'year': yr, 'quarter': rep_qtr,
+                        'ticker': symb, 'keys': [key for key, function, args, depends in report_task_list]})
+        for key in reports[-1]['keys']:
+            units[key] = ((symb, yr, mth, key[1]), fingerprint)
+            run_units.append(units[key][0])
+        tasks.extend(report_task_list)
+
+    # (2) skip the models that finished in an earlier run
+    pending = pending_tasks(tasks, lambda key: store.finished(*units[key]) is not None)
+    # the position of every model in the wide summary: report order, and within a report model order
+    summary_keys = dict((key, (n, i)) for n, rep in enumerate(reports) for i, key in enumerate(rep['keys']))
+    pending_keys = set(key for key, function_name, args, depends in pending)
+    # the summary entries of the models that are not run again
+    for rep in reports:
+        for key in rep['keys']:
+            record = store.finished(*units[key])
+            if key not in pending_keys and record is not None:
+                results.add(summary_keys[key], rep['ticker'], rep['year'], rep['month'], rep['quarter'], key[1],
+                            record['summary'])
+
+    # (3) run the models of all reports on the process pool: the single models and MATCH_UNMATCH of every report
+    # start at once, a hybrid model starts as soon as the models it depends on have finished
+    print "**************************"
+    print "Entering Balancing Process"
+    print "**************************"
+    print "{} reports, {} models ({} finished in an earlier run), {} worker processes".format(
+        len(reports), len(tasks), len(tasks) - len(pending), workers)
+    # the store file of a report is written once, when the last of its models comes in; the models are recorded as
+    # finished only then, so that an interrupted run never skips a model whose datasets were not written
+    remaining = {}
+    for key, function_name, args, depends in pending:
+        remaining[key[0]] = remaining.get(key[0], 0) + 1
+    saved = dict((n, []) for n in remaining)
+    for key, result, error in task_pool.run(pending, workers, os.path.abspath(__file__), sys.modules[__name__],
+                                            paths=[s_dir],
+                                            collect=lambda key, result: (result['summary'], result['selections'])):
+        rep = reports[key[0]]
+        if error is not None:
+            print "{} - model {} failed".format(rep['report_name'], key[1])
+            store.fail(units[key][0], units[key][1], error)
+        else:
+            summary, selections = result
+            saved[key[0]].append((key, summary, save_outputs(rep['report_name'], selections)))
+        remaining[key[0]] -= 1
+        if remaining[key[0]] > 0:
+            continue
+        flush_outputs(rep['report_name'])
+        for key, summary, files in saved.pop(key[0]):
+            unit, fingerprint = units[key]
+            store.finish(unit, fingerprint, summary, files)
+            # the entries as the checkpoint store holds them (the same values as those of an earlier run)
+            results.add(summary_keys[key], rep['ticker'], rep['year'], rep['month'], rep['quarter'], key[1],
+                        store.finished(unit, fingerprint)['summary'])
+    results.close()
+
+    # (4) write the wide summary once, in report order and within a report in model order
+    for ticker, year, month, quarter, model, module_name, yoy in results.entries():
+        summary_tab.yoy_to_summary(month, year, quarter, ticker, yoy, module_name)
 
     # Eject summary_tab
     ejectable_df = summary_tab.eject_df()
     ejectable_df.to_csv(str(w_dir + "/balancing_results_summary" + ".csv"), index=False, encoding='utf-8')
 
+    # (5) the failures of this run, with their tracebacks (also kept in the checkpoint store)
+    failures = store.failures(run_units)
+    print "{} of {} models finished, {} failed (checkpoint store: {})".format(
+        len(tasks) - len([key for key in units if store.finished(*units[key]) is None]), len(tasks), len(failures),
+        store.path)
+    for record in failures:
+        print "------------------------------------------------------------------"
+        print "{} - model {} failed:".format(record['unit'][:3], record['unit'][3])
+        print record['error']
+
 # END MODULE
 # -------------------------------------------------------------
 
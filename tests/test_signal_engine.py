@@ -0,0 +1,110 @@
+"""
+Purpose:
+Reference-equivalence tests of rsm_tools/signal_engine.py: rolling_signals() and head_signals() against the original
+calc_signal_rsm() row loop (reference_signals()), on generated series with NaN gaps, short series and block_off > 0.
+
+    python -m pytest tests
+    python -m unittest discover -s tests -t .
+"""
+
+##############################################################
+# Imports:                                                   #
+##############################################################
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from rsm_tools import signal_engine
+
+##############################################################
+# Parameters                                                 #
+##############################################################
+
+seed = 0
+panels = 20
+stdh = signal_engine.check_stdh
+# (window, block_off) combinations: the check_windows of the module plus a block_off beyond the window
+windows = signal_engine.check_windows + [(2, 4)]
+
+##############################################################
+# Non-class Methods                                          #
+##############################################################
+
+def _series(random_state, rows, nan_share=0.1):
+    yoy = random_state.normal(0.0, 0.1, rows)
+    yoy[random_state.rand(rows) < nan_share] = np.nan
+    return pd.DataFrame({'yoy_change': yoy, 'evaluation_id': np.arange(1, rows + 1)})
+
+#-------------------------------
+
+def _reference(element, window, block_off):
+    return np.asarray(signal_engine.reference_signals(element, stdh, window, block_off), dtype=float)
+
+##############################################################
+# Class Declarations:                                        #
+##############################################################
+
+class test_signal_engine(unittest.TestCase):
+
+    #-----------------------------#
+    def test_random_panels(self):
+        # several tickers of 1..60 rows with NaN gaps, see signal_engine.random_panel()
+        random_state = np.random.RandomState(seed)
+        for n in range(panels):
+            panel = signal_engine.random_panel(random_state)
+            for window, block_off in windows:
+                out = signal_engine.check_reference_equivalence(panel, stdh, window, block_off)
+                self.assertEqual(len(out), 0, "panel {}, window {}, block_off {}: {} rows differ".format(
+                    n, window, block_off, len(out)))
+
+    #-----------------------------#
+    def test_short_series(self):
+        # series shorter than the look-back, where the slices of every row wrap around
+        random_state = np.random.RandomState(seed + 1)
+        for window, block_off in windows:
+            for rows in range(1, window + block_off + 3):
+                element = _series(random_state, rows)
+                fast = signal_engine.rolling_signals(element, stdh, window, block_off, by=None)
+                np.testing.assert_array_equal(fast, _reference(element, window, block_off),
+                                              "window {}, block_off {}, {} rows".format(window, block_off, rows))
+
+    #-----------------------------#
+    def test_all_missing(self):
+        element = _series(np.random.RandomState(seed + 2), 30, nan_share=1.0)
+        for window, block_off in windows:
+            fast = signal_engine.rolling_signals(element, stdh, window, block_off, by=None)
+            np.testing.assert_array_equal(fast, np.zeros(len(element)))
+
+    #-----------------------------#
+    def test_head_signals(self):
+        # the signals of the first rows change as the series grows; head_signals() follows them
+        random_state = np.random.RandomState(seed + 3)
+        for window, block_off in windows:
+            element = _series(random_state, 40)
+            for rows in range(1, len(element) + 1):
+                part = element.iloc[:rows]
+                head = signal_engine.head_signals(part['yoy_change'].values, stdh, window, block_off)
+                np.testing.assert_array_equal(head, _reference(part, window, block_off)[:len(head)])
+
+    #-----------------------------#
+    def test_position_offset(self):
+        # the tail of a series (incremental updates): exact for the rows with window + 1 rows of look-back
+        random_state = np.random.RandomState(seed + 4)
+        for window, block_off in windows:
+            element = _series(random_state, 50)
+            lookback = max(window + 1, block_off)
+            reference = _reference(element, window, block_off)
+            for offset in range(1, len(element) - lookback):
+                tail = element.iloc[offset:].reset_index(drop=True)
+                fast = signal_engine.rolling_signals(tail, stdh, window, block_off, by=None, position_offset=offset)
+                np.testing.assert_array_equal(fast[lookback:], reference[offset + lookback:])
+
+#-------------------------------
+
+if __name__ == '__main__':
+    unittest.main()
+
+# END MODULE
+# -------------------------------------------------------------
@@ -35,10 +35,21 @@ import datetime
 from datetime import timedelta
 from time import strptime
 import calendar
-from numpy.lib import recfunctions
 
 # Custom Scripts:
 import class_Wk_Type_Balance_v2
+from rsm_tools.report_store import report_store, pool_slices
+from rsm_tools import report_index
+from rsm_tools import report_loader
+from rsm_tools import frame_views
+from rsm_tools import date_bands
+from rsm_tools import signal_engine
+from rsm_tools import window_sums
+from rsm_tools import stage_profiler
+from rsm_tools.metrics_log_store import metrics_log_store
+from rsm_tools.metrics_log_table import metrics_log_table
+from rsm_tools import ticker_pool
+from rsm_tools.week_calendar import week_calendar, week_mondays, get_week_of_month
 
 ##############################################################
 # Directory Management:                                      #
@@ -57,33 +68,15 @@ wk_window = 5   # this identifies how many weeks of input reports to aggregate
 search_offset = 3   # this is the number of weeks to apply to the week-offset search band
 l_bound = -3
 u_bound = 0
+# signal parameters: standard deviation hurdle, period window (6 periods is 3 months), block_off
+signal_stdh = 0.75
+signal_window = 12
+signal_block_off = 0
 
 ##############################################################
 # Non-class Methods                                          #
 ##############################################################
 
-def get_week_of_month(date):
-    date = date.to_pydatetime()
-
-    days_this_month = calendar.mdays[date.month]
-    for i in range(1, days_this_month):
-        d = datetime.datetime(date.year, date.month, i)
-        if d.day - d.weekday() > 0:
-            startdate = d
-            break
-    # now we canuse the modulo 7 appraoch
-    return (date - startdate).days //7 + 1
-
-#-------------------------------
-
-def df_str_replace(dataframe, field_list):
-    for d in field_list:
-        dataframe[d] = dataframe[d].str.replace(',', ' ')
-        dataframe[d] = dataframe[d].str.replace('#', ' ')
-    return dataframe
-
-#-------------------------------
-
 def gen_data(in_report, directory):
     # ----------------------------------------------------------------
     # Conversion of XLSX to CSV and Array
@@ -95,15 +88,16 @@ def gen_data(in_report, directory):
     Both cnt_loop and high_cnt only take arrays as primary arguments.
     """
 
-    if os.path.splitext(in_report)[1] == ".xlsx":
-        df_out = pd.read_excel(os.path.join(directory, in_report), 'Data')
-    elif os.path.splitext(in_report)[1] == ".csv":
-        df_out = pd.read_csv(os.path.join(directory, in_report))
-    else:
-        sys.exit("Incorrect Report Type (.xlsx or .csv ONLY!)")
-    df_out = df_str_replace(df_out, ['Address'])
-    df_out_np = df_out.to_records()
-    c = df_out_np
+    # typed parse of the columns used by the signal path (see rsm_tools/report_loader.py)
+    c = report_loader.load_report(in_report, directory)
+    return c
+
+#-------------------------------
+def gen_balancing_data(in_report, directory):
+    """
+    Purpose: gen_data() for the records that go to class_Wk_Type_Balance_v2: every column, 'Notes' as text
+    """
+    c = report_loader.load_balancing_report(in_report, directory)
     return c
 
 #-------------------------------
@@ -119,15 +113,9 @@ def sampledf(npsample):
     A pd df object
     """
 
-    # Obtain the attributes of the np structured record array
-    rdatatype = npsample.dtype
-    # Obtain the data descriptions of the attributes. Will be in list-tuple [(),()] form
-    datadescr = rdatatype.descr
-    # index the np record array data
-    # Errata: index = ['Row' + str(i) for i in range(1, len(npsample)+1)]
-    index = [i for i in range(1, len(npsample)+1)]
-    # Instantiate the np structured record array as a pandas dataframe object
-    df = pd.DataFrame(npsample, index=index)
+    # Instantiate the np structured record array as a pandas dataframe object, rows indexed from 1 (a RangeIndex, see
+    # rsm_tools/frame_views.py)
+    df = frame_views.to_frame(npsample)
     return df
 
 ##############################################################
@@ -180,11 +168,13 @@ class quant_metrics:
     ##############################################################
     # Initialization                                             #
     ##############################################################
-    def __init__(self, metrics_log):
+    def __init__(self, metrics_log, load_log=True):
 
         """
         Assumptions: the file path for metrics_log (Metrics_Log.xlsx) exists.
         :param metrics_log: a valid windows directory and filename
+        :param load_log: (optional) read Metrics_Log.xlsx right away. The incremental mode of ticker_stitch() works
+        off the columnar log store and only reads the workbook to bootstrap tickers that are not in the store yet.
 
         example:
         cd = "C:\Users\joogl\Documents\Temp"
@@ -207,19 +197,36 @@ class quant_metrics:
         self.cd, self.fn = os.path.split(self.directory)     # attribute: cd
         #-------#
         # identify the latest weekly report in the cd
-        # (1) construct a list of filenames that share the global variable "input_prefix"
-        self.weekly_reports = []        # attribute: weekly_reports
-        for file in os.listdir(self.cd):
-            if file.startswith(input_prefix):
-                # if shpfile.endswith("grid.shp"):
-                if file.endswith(".csv"):
-                    self.weekly_reports.append(file)
+        # (1) construct a list of filenames that share the global variable "input_prefix", with a sorted
+        # report-date index for the window report selection in metric_calc()
+        self.report_index = report_index.from_directory(self.cd, input_prefix, ".csv")
+        self.weekly_reports = self.report_index.reports        # attribute: weekly_reports
+
+        # parse-once cache of the weekly reports. metric_calc() pulls ticker slices from here instead of
+        # re-parsing every report with gen_data() for every window and every ticker
+        self.report_store = report_store(self.cd, gen_data)
+        # the same for the balancing path (apply_balancing=True), whose records go to an external balancing class
+        self.balancing_store = report_store(self.cd, gen_balancing_data, report_loader.balancing_cache_dir(self.cd))
 
         ##############################################
         ## Initialize the Metrics_Log Target Object ##
         ##############################################
 
-        self.metrics_log = pd.read_excel(open(self.directory, 'rb'), sheetname='Sheet1')
+        self.metrics_log = None
+        if load_log:
+            self.load_metrics_log()
+
+        # append-only columnar copy of the Metrics_Log, used by the incremental mode of ticker_stitch()
+        self.log_store = metrics_log_store(self.cd)
+        # date intervals of full_rehash() by date_interval (see rehash_windows())
+        self.rehash_window_cache = {}
+        # (ticker, window_sums grid) of the ticker that full_rehash() is evaluating (see metric_calc())
+        self.window_grid = (None, None)
+        # indexed copy of self.ticker_df that write_data() upserts into (see ticker_log_table())
+        self.ticker_table = None
+        # opt-in per-stage instrumentation (see enable_profiling())
+        self.profiler = None
+        self.trace_path = None
 
         #################################################
         ## Create Ticker List and Collation Dictionary ##
@@ -240,14 +247,8 @@ class quant_metrics:
         #################################
 
         # (2) create a separate list that contain the datetimes + week for the given input report
-        self.report_dt = []         # attribute: report dates (Timestamp(''))
-        for report in self.weekly_reports:
-            # obtain all alphanumerics after the last underscore
-            datestr = report[report.rindex('_')+1:].split(".")[0]
-            # obtain the datetime from this string. This will be a date dictionary of a datetime object
-            dttime = pd.to_datetime(datestr)
-            # append this object to report_dt
-            self.report_dt.append(dttime)
+        # (obtained from all alphanumerics after the last underscore, see report_index.report_date())
+        self.report_dt = self.report_index.dates         # attribute: report dates (Timestamp(''))
 
         # (3a) identify the most contemporary report in report_dt
         last_date = max(self.report_dt)
@@ -257,6 +258,10 @@ class quant_metrics:
         first_date = min(self.report_dt)
         self.first_period = first_date  # this is one of the attributes for instantiation
 
+        # (3c) week calendar over the report date range: Monday/week/period_id lookups for full_rehash() and
+        # write_data()
+        self.calendar = week_calendar(self.first_period, self.last_period)
+
         # ***** BEGIN PROCESSING END-DATE FOR USE IN ticker_stitch()'s _init_ CASE! ***** #
         # (4) identify all reports that will be used to fill the ancillary data pool
         # ...obtain the week-month-year
@@ -319,6 +324,58 @@ class quant_metrics:
     # Class Methods #
     #################
 
+    def load_metrics_log(self):
+        """
+        Purpose: read Metrics_Log.xlsx into self.metrics_log (once)
+        """
+        if self.metrics_log is None:
+            self.metrics_log = pd.read_excel(open(self.directory, 'rb'), sheetname='Sheet1')
+        return self.metrics_log
+
+    #-----------------------------#
+    def enable_profiling(self, trace_path=None):
+        """
+        Purpose: opt-in instrumentation. Records wall time, call counts, rows processed and peak RSS of every stage
+        (the main methods below, report parsing and the pooling/flagging blocks of metric_calc()) per ticker.
+        ticker_stitch() prints the flat profile when it finishes (see profile_report()).
+        Note: the worker processes of a parallel full rehash (workers > 1) are not instrumented.
+        :param trace_path: (optional) also write a Chrome trace (.json) of all stages to this file
+        :return: the stage_profiler (see rsm_tools/stage_profiler.py)
+        """
+        self.profiler = stage_profiler.stage_profiler()
+        self.trace_path = trace_path
+        n_frame = lambda obj, args, result: len(obj.ticker_df)
+        n_rows = lambda obj, args, result: len(obj.ticker_table if obj.ticker_table is not None else obj.ticker_df)
+        self.profiler.instrument(self, {
+            'load_metrics_log': lambda obj, args, result: len(result),
+            'metric_calc': lambda obj, args, result: len(obj.pooled_wk_rep),
+            'yoy_calc': lambda obj, args, result: len(args[0]),
+            'write_data': n_rows,
+            'full_rehash': n_frame,
+            'incremental_update': n_frame,
+            'parallel_rehash': lambda obj, args, result: len(result),
+            'calc_signal_rsm': lambda obj, args, result: len(args[0]),
+        })
+        self.profiler.instrument(self.report_store, {'loader': lambda obj, args, result: len(result)},
+                                 ticker_arg=None, names={'loader': 'gen_data'})
+        self.profiler.instrument(self.balancing_store, {'loader': lambda obj, args, result: len(result)},
+                                 ticker_arg=None, names={'loader': 'gen_balancing_data'})
+        return self.profiler
+
+    #-----------------------------#
+    def profile_report(self):
+        """
+        Purpose: print the flat profile of the stages recorded since enable_profiling() (per stage, then per stage
+        and ticker) and write the Chrome trace if a trace_path was given. Does nothing if profiling is off.
+        """
+        if self.profiler is None:
+            return
+        print self.profiler.table()
+        print self.profiler.table(by_ticker=True)
+        if self.trace_path is not None:
+            self.profiler.chrome_trace(self.trace_path)
+
+    #-----------------------------#
     def yoy_calc(self, bal_cpy):
         """
         Note: This class method may be overridden by a similar class method name in:
@@ -342,18 +399,29 @@ class quant_metrics:
         wke_ty = bal_cpy[(bal_cpy['Week End'] == 1) & (bal_cpy['py_cy'] == self.current_yr)]
         wkd_ly = bal_cpy[(bal_cpy['Week End'] == 0) & (bal_cpy['py_cy'] == self.prior_yr)]
         wkd_ty = bal_cpy[(bal_cpy['Week End'] == 0) & (bal_cpy['py_cy'] == self.current_yr)]
+        # full week
+        ly = bal_cpy[bal_cpy['py_cy'] == self.prior_yr]
+        ty = bal_cpy[bal_cpy['py_cy'] == self.current_yr]
+        sums = {}
+        for key, subset in (('wke_ly', wke_ly), ('wke_ty', wke_ty), ('wkd_ly', wkd_ly), ('wkd_ty', wkd_ty),
+                            ('ly', ly), ('ty', ty)):
+            sums[key] = (float(np.sum(subset['Cars'])), float(np.sum(subset['Spaces'])))
+        return self.yoy_from_sums(sums)
+
+    #-----------------------------#
+    def yoy_from_sums(self, sums):
+        """
+        Purpose: the yoy metrics of yoy_calc() from the Cars/Spaces sums of the pooled records
+        :param sums: a dictionary of (Cars sum, Spaces sum) float tuples with the keys 'wke_ly', 'wke_ty',
+        'wkd_ly', 'wkd_ty' (weekends/weekdays of the prior/current year) and 'ly', 'ty' (full weeks)
+        :return: a series of yoy metrics (see yoy_calc())
+        """
         # Weekends
-        wke_ly_sm_cr = float(np.sum(wke_ly['Cars']))
-        wke_ty_sm_cr = float(np.sum(wke_ty['Cars']))
-        # Weekdays
-        wkd_ly_sm_cr = float(np.sum(wkd_ly['Cars']))
-        wkd_ty_sm_cr = float(np.sum(wkd_ty['Cars']))
-        # Weekends
-        wke_ly_sm_sp = float(np.sum(wke_ly['Spaces']))
-        wke_ty_sm_sp = float(np.sum(wke_ty['Spaces']))
+        wke_ly_sm_cr, wke_ly_sm_sp = sums['wke_ly']
+        wke_ty_sm_cr, wke_ty_sm_sp = sums['wke_ty']
         # Weekdays
-        wkd_ly_sm_sp = float(np.sum(wkd_ly['Spaces']))
-        wkd_ty_sm_sp = float(np.sum(wkd_ty['Spaces']))
+        wkd_ly_sm_cr, wkd_ly_sm_sp = sums['wkd_ly']
+        wkd_ty_sm_cr, wkd_ty_sm_sp = sums['wkd_ty']
         try:
             wke_ly_fl = (wke_ly_sm_cr / wke_ly_sm_sp) * 100
             wke_ty_fl = (wke_ty_sm_cr / wke_ty_sm_sp) * 100
@@ -369,12 +437,8 @@ class quant_metrics:
         self.wkd_yoy = ((wkd_ty_fl - wkd_ly_fl) / wkd_ly_fl) * 100
         # ----------------------------
         # full week fill rate calculations
-        ly = bal_cpy[bal_cpy['py_cy'] == self.prior_yr]
-        ty = bal_cpy[bal_cpy['py_cy'] == self.current_yr]
-        ly_sm_cr = float(np.sum(ly['Cars']))
-        ty_sm_cr = float(np.sum(ty['Cars']))
-        ly_sm_sp = float(np.sum(ly['Spaces']))
-        ty_sm_sp = float(np.sum(ty['Spaces']))
+        ly_sm_cr, ly_sm_sp = sums['ly']
+        ty_sm_cr, ty_sm_sp = sums['ty']
         ly_fl = (ly_sm_cr / ly_sm_sp) * 100
         ty_fl = (ty_sm_cr / ty_sm_sp) * 100
         self.yoy = round((((ty_fl - ly_fl) / ly_fl) * 100), 4)
@@ -386,7 +450,18 @@ class quant_metrics:
         return self.wke_yoy100, self.wkd_yoy100, self.yoy_100, self.wke_yoy, self.wkd_yoy, self.yoy
 
     #-----------------------------#
-    def write_data(self, ticker):
+    def ticker_log_table(self):
+        """
+        Purpose: the metrics_log_table (rsm_tools/metrics_log_table.py) that write_data() writes to: an indexed copy
+        of self.ticker_df, built again whenever self.ticker_df has been replaced
+        :return: a metrics_log_table
+        """
+        if self.ticker_table is None or self.ticker_table.source is not self.ticker_df:
+            self.ticker_table = metrics_log_table(self.ticker_df)
+        return self.ticker_table
+
+    #-----------------------------#
+    def write_data(self, ticker, materialize=True):
         """
         Purpose: Run this after running metric_calc. write_data() will take:
          self.f_wk, self.f_mo, self.f_yr, self.f_time0
@@ -420,6 +495,8 @@ class quant_metrics:
         that should only be nested alongside metric_calc() in full_rehash() or it should be invoked standalone
         with __init__ (when a historic log is not being generated).
 
+        :param materialize: (optional) export the updated rows to self.ticker_df. full_rehash() passes False for every
+        window and exports once at the end (see ticker_log_table())
         :return: a newly updated version of Metrics_Log.xlsx with an evaluation_id
         """
         # (1) obtain a pandas version of Metrics_Log.xlsx; assume that the sheetname here is 'Sheet1'
@@ -441,16 +518,10 @@ class quant_metrics:
         Important: since ticker-subsetting is occurring, ensure that metrics_log is ticker specific:
         Note: during a full_rehash(), metrics_log is likely empty.
         """
-        # self.ticker_df is created within the ticker-loop in ticker_stitch(). It is reset per ticker iteration
-        metrics_log = self.ticker_df
-        # deprecated: metrics_log = self.metrics_log[self.metrics_log['ticker'] == ticker]
-        """
-        try:
-            print "current ticker: %s" % (ticker)
-            metrics_log = metrics_log[metrics_log['ticker']==ticker]
-        except:
-            return None
-        """
+        # self.ticker_df is created within the ticker-loop in ticker_stitch(). It is reset per ticker iteration.
+        # The writes go to its indexed copy (see ticker_log_table()): appends and upserts by evaluation_id do not
+        # copy or scan the frame
+        metrics_log = self.ticker_log_table()
         # RECALLING THE END DATE (possibly  a -1 week-monday from _init_ date that falls between mondays in file)
         # (2) recall self.f_wk, self.f_mo, self.f_yr, self.f_time0, self.yoy
         wrk_wk = self.f_wrk_wk
@@ -462,37 +533,27 @@ class quant_metrics:
         #--#
         # eid = metrics_log[metrics_log['period_id'] == pid].evaluation_id    # currently in float. Will need to be int
         # will also need the exact Monday date of start_date in Timestamp('') format
-        d_str = np.string0(yr) + "-" + "W" + np.string0(wk)
         # input of 2016-01-11 will return 2016-01-11...
-        monday_date = pd.to_datetime(datetime.datetime.strptime(d_str + '-1', "%Y-W%W-%w"))
+        monday_date = pd.Timestamp(week_mondays([yr], [wk])[0])
 
         # (3) set evaluation_id. if period_id (e.g. self.f_time0) already exists in [period_id], evaluation_id
         # equals the lookup evaluation_id of this period_id. if not, evaluation_id is 1 + the last evaluation_id
         # in metrics_log['evaluation_id']
         #----#
-        # (3a) Get a pd array of period_id. pid_array
-        pid_array = metrics_log['period_id']
-
-        # (3b) if pid is contained in pid_array, then evaluation_id equals whatever the eval_id already is
-        # test: test1 = test.append(pd.Series([1])), elm = pd.Series((1)), trythis = elm.isin(test1), any(trythis)
-        pid_eval = pd.Series((pid))
-
+        # (3a) look up pid in the period_id index of metrics_log
+        # (3b) if pid is contained in the period_id's, then evaluation_id equals whatever the eval_id already is
         """
         Ensure that the week of pid is the correct week with blackbox testing:
         print "original pid:"
         print pid
-        print "all prev pid's:"
-        print pid_array
         """
 
-        pid_array_bool = pid_eval.isin(pid_array)
-        if any(pid_array_bool) == True: # if any element of the boolean array is true, then pid is in pid_array already.
+        if metrics_log.has_period(pid): # pid is in the period_id's already.
             # identify the current evaluation_id for this pid and assign eid equal to the value of the pd eid
             # print "write_data(): pid is in pid_array already"
             # obtain the eid of the last observation in the dataset:
-            eid = metrics_log.evaluation_id[-1:].values[0]
-            # eid = int(eid[0])
-        elif any(pid_array_bool) == False:
+            eid = metrics_log.last_eid()
+        else:
             # Purpose: identify
             # print "write_data(): pid is not in pid_array already"
             """
@@ -510,31 +571,15 @@ class quant_metrics:
             """
             if len(metrics_log) == 0:
                 eid = 1
-                eid_insert = pd.DataFrame([[eid]], columns=['evaluation_id'])
-                metrics_log = pd.concat([metrics_log, eid_insert]).reset_index(drop=True)
+                metrics_log.append(eid)
             elif len(metrics_log) == 1:
                 eid = 2
-                eid_insert = pd.DataFrame([[eid]], columns=['evaluation_id'])
-                metrics_log = pd.concat([metrics_log, eid_insert]).reset_index(drop=True)
+                metrics_log.append(eid)
             else:
                 # obtain the last monday date recorded in Timestamp('') format
-                # (a) for each row in the dataset, obtain week/month/year, create a date, and throw this date into an array
-                monday_array = []
-                eid_array = []
-                for index, row in metrics_log.iterrows():   # be sure to handle date values as integers, not as floats
-                    # test: metrics_log1.loc[1]['week'].astype(int)
-                    array_wk = int(row['week'])
-                    array_yr = int(row['year'])
-                    array_d_str = np.string0(array_yr) + "-" + "W" + np.string0(array_wk)
-                    array_date = pd.to_datetime(datetime.datetime.strptime(array_d_str + '-1', "%Y-W%W-%w"))
-                    # append this date to monday_array
-                    monday_array.append(array_date)
-                    # keep track of the eid associated with this date:
-                    l_eid = row.evaluation_id   # currently in float. Will need to be int
-                    eid_array.append(l_eid)
-                # (b) sort this list and choose the last element in the list
-                monday_array.sort()
-                last_monday = monday_array[-1:][0]
+                # (a) for each row in the dataset, the Monday from week/year; (b) choose the last monday. The table
+                # keeps the running maximum, see metrics_log_table.last_monday()
+                last_monday = metrics_log.last_monday()
                 # (c) compare the last monday in the monday array to monday_date
 
                 ########################################################################
@@ -551,34 +596,27 @@ class quant_metrics:
                 # a temporary object created using yr/wk.
                 if monday_date + timedelta(days=7*(wk_window)) > last_monday + timedelta(days=7*(wk_window)):
                     # THIS IS IDEAL: eid index will be = last eid + 1
-                    eid_array.sort()
-                    eid = int(eid_array[-1:][0]) + 1
+                    eid = metrics_log.max_eid() + 1
                     # create a row in metrics_log with this new eid:
-                    eid_insert = pd.DataFrame([[eid]], columns=['evaluation_id'])
-                    metrics_log = pd.concat([metrics_log, eid_insert]).reset_index(drop=True)
+                    metrics_log.append(eid)
                     # proceed populate this new line item: proceed to step (4)
                 else:   # if this is false, that means this evaluation date falls in a previous evaluation window
                     # proposed solution: change the date identifiers for the argument and override the redundant obs
                     # print "preparing to override pre-existing EID and EID attributes..."
-                    wrk_wk = get_week_of_month(last_monday)
-                    wk = last_monday.week
+                    wrk_wk = self.calendar.work_week(last_monday)
+                    wk = self.calendar.week(last_monday)
                     mo = last_monday.date().month
                     yr = last_monday.date().year
-                    pid = np.string0(yr) + "-" + np.string0(mo) + "-" + np.string0(wrk_wk)
+                    pid = self.calendar.period_id(last_monday)
                     # use the preexisting eid
-                    eid = metrics_log.evaluation_id[-1:].values[0]
+                    eid = metrics_log.last_eid()
                     # this will still constitute a change to yoy which is fine
-        else:
-            pass
         # (4) write elements in (2) (including period_id) to the row of the current evaluation_id.
         # this may constitute and override.
         # not needed: eval_row = metrics_log.loc[metrics_log[metrics_log['evaluation_id'] == eid].index]
-        metrics_log.loc[metrics_log.evaluation_id == eid, 'month'] = mo
-        metrics_log.loc[metrics_log.evaluation_id == eid, 'period_id'] = pid
-        metrics_log.loc[metrics_log.evaluation_id == eid, 'week'] = wk
-        metrics_log.loc[metrics_log.evaluation_id == eid, 'year'] = yr
-        metrics_log.loc[metrics_log.evaluation_id == eid, 'yoy_change'] = yoy
-        metrics_log.loc[metrics_log.evaluation_id == eid, 'date'] = monday_date.date()
+        # designate the ticker identifier as well
+        metrics_log.upsert(eid, {'month': mo, 'period_id': pid, 'week': wk, 'year': yr, 'yoy_change': yoy,
+                                 'date': monday_date.date(), 'ticker': ticker})
 
         """
         print "PID:"
@@ -589,8 +627,6 @@ class quant_metrics:
         """
 
         # print monday_date.date()
-        # designate the ticker identifier...
-        metrics_log.loc[metrics_log.evaluation_id == eid, 'ticker'] = ticker
         # Reset attribute values:
         wrk_wk = np.nan
         wk = np.nan
@@ -610,12 +646,22 @@ class quant_metrics:
         # (5) Save over the preexisting version Metrics_Log.xlsx
         metrics_log.to_excel(self.cd + "/Metrics_Log" + ".xlsx", encoding='utf-8')
         """
-        # update the df for this current ticker
-        self.ticker_df = metrics_log
+        # update the df for this current ticker (full_rehash() exports the table once, after its last window)
+        if materialize:
+            self.ticker_df = metrics_log.to_frame()
+            self.ticker_table = None
         # deprecated: self.dict_collate[ticker] = metrics_log
 
     #-----------------------------#
-    def metric_calc(self, ticker, start_date, end_date, apply_balancing=False):
+    def pooling_store(self, apply_balancing):
+        """
+        :return: the report_store that metric_calc() pools the reports from: the full, unparsed reports if the pooled
+        records go to the balancing class, the narrow parsed reports otherwise (see rsm_tools/report_loader.py)
+        """
+        return self.balancing_store if apply_balancing else self.report_store
+
+    #-----------------------------#
+    def metric_calc(self, ticker, start_date, end_date, apply_balancing=False, use_window_sums=False):
         """
         Purpose:
         Calculates a YoY from pooled observations across 1 or more weekly unbalanced reports.
@@ -635,324 +681,173 @@ class quant_metrics:
         note:
         period_id is either generated in __init__ or in the body of full_rehash()
 
+        use_window_sums: (unbalanced only) take the Cars/Spaces sums from the ticker's window_sums grid instead of
+        pooling the reports. self.pooled_wk_rep is then left empty. full_rehash() sets this: its windows overlap.
+
         Example:
         metric_calc(self, self.r_prev_wk_monday, self.last_period)
         """
 
         # PART 1. Data Preparation
-        # (0) identify the working directory and the list of available reports
-        l_dir = self.cd
-        wk_reports = self.weekly_reports
-        rep_dates = self.report_dt
         # (1) identify all reports between start_date and end_date
-        report_list = []
-        """
-        Assumption: the files and their dates listed in weekly_reports are ordered the same as the dates
-        listed in wk_reports
+        # Important: start_date may be 12/31/YYYY. If it is, shift this by 1 day.
+        if start_date == pd.to_datetime(str(1231) + str(start_date.date().year)[2:]):
+            start_date_s = start_date + timedelta(days=(1))
+        else:
+            start_date_s = start_date
+        # IMPORTANT: All reports will be pulled for start date until end date(interval) + wk_window
         """
-        rep_timestamps = zip(wk_reports, rep_dates)
-        for wk_rep in rep_timestamps:
-            # Important: start_date may be 12/31/YYYY. If it is, shift this by 1 day.
-            if start_date == pd.to_datetime(str(1231) + str(start_date.date().year)[2:]):
-                start_date_s = start_date + timedelta(days=(1))
-            else:
-                start_date_s = start_date
-            if wk_rep[1] >= start_date_s - timedelta(days=7*(search_offset)):
-                # IMPORTANT: All reports will be pulled for start date until end date(interval) + wk_window
-                """
-                Very Important: we want report data up to a period out from the start date. The quantopian
-                date that will be reported for the yoy based on these data will be the end date calculated
-                at the end of this function. This end-date will not be the interval-end_date but rather
-                the look-back-window-end_date. 
-                """
-                if wk_rep[1] < start_date_s + timedelta(days=7*(wk_window)):
-                    report_list.append(wk_rep[0])
-                else:
-                    pass
-        # (2) for each eligible report, open it, turn it into a np structured array, and concatenate all reports
-        self.report_dict = {}        # will be storing reports into a dictionary
-        for n, filt_report in enumerate(report_list):
-            # pass filt_report (file name) and directory to gen_data(in_report, directory)
-            c = gen_data(filt_report, l_dir)
-            # take the appropriate subset of this data according to arg --> ticker
-
-            # the ticker might not exist in the data-set.
-            c_subset = c[c['Ticker'] == ticker]
-
-            # store this report in dictionary
-            self.report_dict[n] = c_subset
-        # Important: if no reports are present, set all attributes to np.nan
-
-        # create the end date window:
-        end_date_s = start_date_s + timedelta(days=7 * (wk_window))
+        Very Important: we want report data up to a period out from the start date. The quantopian
+        date that will be reported for the yoy based on these data will be the end date calculated
+        at the end of this function. This end-date will not be the interval-end_date but rather
+        the look-back-window-end_date.
 
-        try:
-            # combine all dictionary elements into one master rec.array
-            self.pooled_wk_rep = np.hstack((self.report_dict[element] for element in self.report_dict))
+        The reports dated within [start - search_offset weeks, start + wk_window weeks) are found with a binary
+        search over the sorted report dates (see rsm_tools/report_index.py).
+        """
+        window_lower = start_date_s - timedelta(days=7*(search_offset))
+        window_upper = start_date_s + timedelta(days=7*(wk_window))
+        # (2) unbalanced yoy of full_rehash(): the Cars/Spaces sums of the pooled reports are prefix-sum differences
+        # of the ticker's window_sums grid (see ticker_window_sums()), no records are pooled
+        grid = None
+        if use_window_sums and apply_balancing == False:
+            grid = self.ticker_window_sums(ticker)
+        if grid is not None:
+            # create the end date window:
+            end_date_s = start_date_s + timedelta(days=7 * (wk_window))
+            lo, hi = self.report_index.span(window_lower, window_upper)
+            self.pooled_wk_rep = []
+            try:
+                with stage_profiler.stage(self.profiler, 'window_sums', ticker):
+                    self.prior_yr, self.current_yr, sums = grid.window(lo, hi, start_date_s, end_date_s,
+                                                                       l_bound, u_bound)
+                self.wke_yoy100, self.wkd_yoy100, self.yoy_100, \
+                self.wke_yoy, self.wkd_yoy, self.yoy = self.yoy_from_sums(sums)
+            except:
+                self.prior_yr = np.nan
+                self.current_yr = np.nan
+                self.yoy = np.nan
+                self.wke_yoy100 = np.nan
+                self.wkd_yoy100 = np.nan
+                self.yoy_100 = np.nan
+                self.wke_yoy = np.nan
+                self.wkd_yoy = np.nan
+        else:
+            report_list = self.report_index.between(window_lower, window_upper)
+            # (2) for each eligible report, open it, turn it into a np structured array, and concatenate all reports
+            self.report_dict = {}        # will be storing reports into a dictionary
+            with stage_profiler.stage(self.profiler, 'report_slices', ticker, len(report_list)):
+                for n, filt_report in enumerate(report_list):
+                    # take the appropriate subset of this data according to arg --> ticker. The report is parsed
+                    # (gen_data) only once; the subset is a zero-copy slice of the cached report.
 
-            """
-            Addendum 2 (v5):
-            Identify cases of hybrid years. For instance if there's a cross-over from late Dec. 2016 into early
-            Jan. 2017 for cy, then that would imply the existence of a Dec. 2015 and Jan. 2016 py. In these cases,
-            yr_u would contain 3-4 year elements.
-
-            Solution:
-            1) identify whether an observation is a cy or py:
-                a) identify the number of unique dates
-                b) if the number of unique dates is greater than 2
-                    i) find the max date
-                    ii) subtract 6 months from this date. Call this mid_divide
-            2) create a ['py_cy'] field that is in numerical format 99999 or 99998
-                a) loop through the rec array. Evaluate dates against mid_divide
-                b) populate the py_cy field appropriately
-            """
+                    # the ticker might not exist in the data-set (empty slice).
+                    c_subset = self.pooling_store(apply_balancing).ticker_slice(filt_report, ticker)
 
-            """
-            Important:
-            Need to find some arbitrary date that separates py from cy observations. This
-            becomes especially necessary when the start date is somewhere near the end of December.
-            Want to reclassify Year into a py and cy classification using 999998/999999
-            """
-            mid_divide = start_date_s - timedelta(days=182)  # heuristic
-
-            n_metrics = recfunctions.rec_append_fields(self.pooled_wk_rep, "py_cy", [], int)
-            # there is now a field called "cy_py" with values all set to 999999
-            for rix in range(len(n_metrics)):
-                rec_date = pd.to_datetime(n_metrics[rix]['Notes'])
-                # evaluate this date:
-                if rec_date <= mid_divide:
-                    # this is a py observation
-                    n_metrics[rix]["py_cy"] = 999998
-                else:
-                    pass
-            """
-            print "number py/999998 obs:"
-            print len(n_metrics[n_metrics["py_cy"]==999998])
-            print "number cy/999999 obs:"
-            print len(n_metrics[n_metrics["py_cy"]==999999])
-            """
-            self.pooled_wk_rep = n_metrics
-            del n_metrics
+                    # store this report in dictionary
+                    self.report_dict[n] = c_subset
+            # Important: if no reports are present, set all attributes to np.nan
 
-            """
-            Addendum 1 (v5):
-            Drop all observations whose dates do not fall within the [start] & [start + week-band-offset]
-            """
-            n_metrics = recfunctions.rec_append_fields(self.pooled_wk_rep, "flag", [], int)
-            # there is now a field called "flag" with values all set to 999999
-            for rix in range(len(n_metrics)):
-                # create time indices (cy), start date:
-                yr1_start = start_date_s.date().year
-
-                # create time indices (cy), end date:
-                yr1_end = end_date_s.date().year
-
-                # Solve for prior year date time stamp
-                if start_date_s.date().day < 10:
-                    start_day_adj = "0"
-                else:
-                    start_day_adj = ""
-                if start_date_s.date().month < 10:
-                    start_month_adj = "0"
-                else:
-                    start_month_adj = ""
-
-                if end_date_s.date().day < 10:
-                    end_day_adj = "0"
-                else:
-                    end_day_adj = ""
-                if end_date_s.date().month < 10:
-                    end_month_adj = "0"
-                else:
-                    end_month_adj = ""
+            # create the end date window:
+            end_date_s = start_date_s + timedelta(days=7 * (wk_window))
 
+            try:
                 """
-                Important: The issue of leap years
-                - for a cy start of 2016-02-01 and a 4 week window, the cy end will be 2016-02-29
-                - for a cy start of 2016-02-29 and a 4 week window, the cy end will be 2016-03-28
-                - Both of these windows contain the 2016 leap year February date 02-29.
-                - The py date equivalent of the 2016 leap year Feb date 02-29 does not exist on the calendar
-                - if 02/29 is found to be a date in start_date_s or end_date_s, then day should be set to 28
+                Addendum 2 (v5):
+                Identify cases of hybrid years. For instance if there's a cross-over from late Dec. 2016 into early
+                Jan. 2017 for cy, then that would imply the existence of a Dec. 2015 and Jan. 2016 py. In these cases,
+                yr_u would contain 3-4 year elements.
+
+                Solution:
+                1) identify whether an observation is a cy or py:
+                    a) identify the number of unique dates
+                    b) if the number of unique dates is greater than 2
+                        i) find the max date
+                        ii) subtract 6 months from this date. Call this mid_divide
+                2) create a ['py_cy'] field that is in numerical format 99999 or 99998
+                    a) evaluate dates against mid_divide
+                    b) populate the py_cy field appropriately
                 """
-                start_md = np.string0(np.string0(start_date_s.date().month) + "-" + \
-                                      np.string0(start_date_s.date().day))
-                end_md = np.string0(np.string0(end_date_s.date().month) + "-" + \
-                                      np.string0(end_date_s.date().day))
-                if end_md == '2-29':
-                    # leap year detected
-                    end_ts = pd.to_datetime("0" + str(2) + \
-                                            "" + str(28) + str(yr1_end - 1)[2:])
-                else:
-                    end_ts = pd.to_datetime(end_month_adj + str(end_date_s.date().month) + \
-                                            end_day_adj + str(end_date_s.date().day) + str(yr1_end - 1)[2:])
-
-                if start_md == '2-29':
-                    # leap year detected
-                    start_ts = pd.to_datetime("0" + str(2) + \
-                                            "" + str(28) + str(yr1_start - 1)[2:])
-                else:
-                    start_ts = pd.to_datetime(start_month_adj + str(start_date_s.date().month) + \
-                                              start_day_adj + str(start_date_s.date().day) + str(yr1_start - 1)[2:])
-
-                # REC DATE EVALUATION
-                rec_date = pd.to_datetime(n_metrics[rix]['Notes'])
-                rec_yr = rec_date.date().year
-
-                if rec_date.date().day < 10:
-                    rec_date_adj = "0"
-                else:
-                    rec_date_adj = ""
-                if rec_date.date().month < 10:
-                    rec_month_adj = "0"
-                else:
-                    rec_month_adj = ""
+
                 """
                 Important:
-                Determine whether the rec_date is a cy or py observation
+                Need to find some arbitrary date that separates py from cy observations. This
+                becomes especially necessary when the start date is somewhere near the end of December.
+                Want to reclassify Year into a py and cy classification using 999998/999999
                 """
-                rec_md = np.string0(np.string0(rec_date.date().month) + "-" + \
-                                    np.string0(rec_date.date().day))
-
-                if n_metrics[rix]['py_cy'] == 999998:    # this is a py observation
-                    if rec_md == '2-29':
-                        # present rec date day is a leap year
-                        opp_rec_date = pd.to_datetime("0" + str(2) + \
-                                                       "" + str(28) + str(rec_yr + 1)[2:])
-                    else:
-                        opp_rec_date = pd.to_datetime(rec_month_adj + str(rec_date.date().month) + \
-                                                       rec_date_adj + str(rec_date.date().day) + str(rec_yr + 1)[2:])
-                    # evaluate this date:
-                    if opp_rec_date >= start_date_s + timedelta(days=7*(l_bound)):
-                        if opp_rec_date <= end_date_s - timedelta(days=7*(u_bound)):
-                            check_cy = 1
-                        else:
-                            check_cy = 0
-                    else:
-                        check_cy = 0
-
-                    if rec_date >= start_ts + timedelta(days=7*(l_bound)):
-                        if rec_date <= end_ts - timedelta(days=7*(u_bound)):
-                            check_py = 1
-                        else:
-                            check_py = 0
-                    else:
-                        check_py = 0
-
-                    if check_py == 1:
-                        if check_cy == 1:
-                            checks = 1
-                        else:
-                            checks = 0
-                    else:
-                        checks = 0
-
-                    if checks == 1:
-                        # keep this observation since it falls within the date band
-                        pass
-                    else:
-                        # flag this observation
-                        n_metrics[rix]["flag"] = 0
-
-                else:   # this is a cy observation
-                    if rec_md == '2-29':
-                        # present rec date day is a leap year
-                        opp_rec_date = pd.to_datetime("0" + str(2) + \
-                                                       "" + str(28) + str(rec_yr - 1)[2:])
-                    else:
-                        opp_rec_date = pd.to_datetime(rec_month_adj + str(rec_date.date().month) + \
-                                                       rec_date_adj + str(rec_date.date().day) + str(rec_yr - 1)[2:])
-                    # evaluate this date:
-                    if rec_date >= start_date_s + timedelta(days=7*(l_bound)):
-                        if rec_date <= end_date_s - timedelta(days=7*(u_bound)):
-                            check_cy = 1
-                        else:
-                            check_cy = 0
-                    else:
-                        check_cy = 0
-
-                    if opp_rec_date >= start_ts + timedelta(days=7*(l_bound)):
-                        if opp_rec_date <= end_ts - timedelta(days=7*(u_bound)):
-                            check_py = 1
-                        else:
-                            check_py = 0
-                    else:
-                        check_py = 0
-
-                    if check_py == 1:
-                        if check_cy == 1:
-                            checks = 1
-                        else:
-                            checks = 0
-                    else:
-                        checks = 0
-
-                    if checks == 1:
-                        # keep this observation since it falls within the date band
-                        pass
-                    else:
-                        # flag this observation
-                        n_metrics[rix]["flag"] = 0
-
-            # drop all observations with flag = 0
-            self.pooled_wk_rep = n_metrics[n_metrics["flag"]!=0].copy()
-
-            del n_metrics
-
-            #----------------------------------------------------------
-            """
-            Set prior year and current year to mid_divide identifiers 999998 and 999999
-            """
-            # Property 2a-2b the prior and current years of this particular data-set
-            self.prior_yr = min(self.pooled_wk_rep["py_cy"])
-            self.current_yr = max(self.pooled_wk_rep["py_cy"])
-
-            # Part 2. Metric Calculations
-            if apply_balancing == False:  # user elects to not balance the data
                 """
-                yoy_change
+                Addendum 1 (v5):
+                Drop all observations whose dates do not fall within the [start] & [start + week-band-offset]
+
+                Both the py/cy field (mid_divide = start_date_s - 182 days) and the date-band flag are computed
+                in one vectorized pass over 'Notes' (see rsm_tools/date_bands.py, which also handles the 02-29 leap
+                year case).
                 """
-                self.wke_yoy100, self.wkd_yoy100, self.yoy_100, \
-                self.wke_yoy, self.wkd_yoy, self.yoy = self.yoy_calc(self.pooled_wk_rep)
-            else:   # user elects the data type to be balanced
-                # Invoke Stepp Type Balancing:
+                # combine all dictionary elements into one master rec.array: the rows within the date band (flag != 0)
+                # of every report are streamed into a single preallocated array that already holds the py_cy and
+                # flag fields (see report_store.pool_slices())
+                with stage_profiler.stage(self.profiler, 'report_pooling', ticker,
+                                          lambda: len(self.pooled_wk_rep)):
+                    self.pooled_wk_rep = pool_slices([self.report_dict[element] for element in self.report_dict],
+                                                     date_bands.band_fields,
+                                                     date_bands.band_selector(start_date_s, end_date_s,
+                                                                              l_bound, u_bound))
+
+                #----------------------------------------------------------
                 """
-                Possible Suggestion:
-                The method self.yoy_calc doesn't need to be turned into overridable class - i.e. a virtual class method. 
-                The reason is that the .yoy_calc() method is class-specific. The below object unmatched is actually
-                a separate object from self (hybrid_obj in the batch script that calls this class).
+                Set prior year and current year to mid_divide identifiers 999998 and 999999
                 """
-                print "Stepp Balancing..."
-                print "----------------------------------"
-                print self.pooled_wk_rep
-                print "----------------------------------"
-                unmatched = class_Wk_Type_Balance_v2.type_balance(self.pooled_wk_rep, self.prior_yr, self.current_yr)
-                # instantiation creates the attribute unmatched.c (gen_data() deprecated in original Stepp function)
-                print "Current reports in processing: %s" % (report_list)
-                print "Sample Size: %s" % (len(self.pooled_wk_rep))
-                print "pass 0"
-                unmatched.type_sample()
-                print "pass 1"
-                unmatched.long_type_sample()  # this must be done to finalize
-                # obtain the type matching yoy
-                self.yoy = unmatched.yoy    # this draws on initial balancing work
-                self.wke_yoy100 =  unmatched.wke_yoy100
-                self.wkd_yoy100 =  unmatched.wkd_yoy100
-                self.yoy_100 = unmatched.yoy_100
-                self.wke_yoy = unmatched.wke_yoy
-                self.wkd_yoy = unmatched.wkd_yoy
-        except:
-            # print "The following reports caused an error in yoy_calc() ~ likely due to divide by 0:"
-            # print report_list
-            self.pooled_wk_rep = []
-            self.prior_yr = np.nan
-            self.current_yr = np.nan
-            self.yoy = np.nan
-            self.wke_yoy100 = np.nan
-            self.wkd_yoy100 = np.nan
-            self.yoy_100 = np.nan
-            self.wke_yoy = np.nan
-            self.wkd_yoy = np.nan
-        # ----------------------------------------------------------
+                # Property 2a-2b the prior and current years of this particular data-set
+                self.prior_yr = min(self.pooled_wk_rep["py_cy"])
+                self.current_yr = max(self.pooled_wk_rep["py_cy"])
+
+                # Part 2. Metric Calculations
+                if apply_balancing == False:  # user elects to not balance the data
+                    """
+                    yoy_change
+                    """
+                    self.wke_yoy100, self.wkd_yoy100, self.yoy_100, \
+                    self.wke_yoy, self.wkd_yoy, self.yoy = self.yoy_calc(self.pooled_wk_rep)
+                else:   # user elects the data type to be balanced
+                    # Invoke Stepp Type Balancing:
+                    """
+                    Possible Suggestion:
+                    The method self.yoy_calc doesn't need to be turned into overridable class - i.e. a virtual class method. 
+                    The reason is that the .yoy_calc() method is class-specific. The below object unmatched is actually
+                    a separate object from self (hybrid_obj in the batch script that calls this class).
+                    """
+                    print "Stepp Balancing..."
+                    print "----------------------------------"
+                    print self.pooled_wk_rep
+                    print "----------------------------------"
+                    unmatched = class_Wk_Type_Balance_v2.type_balance(self.pooled_wk_rep, self.prior_yr, self.current_yr)
+                    # instantiation creates the attribute unmatched.c (gen_data() deprecated in original Stepp function)
+                    print "Current reports in processing: %s" % (report_list)
+                    print "Sample Size: %s" % (len(self.pooled_wk_rep))
+                    print "pass 0"
+                    unmatched.type_sample()
+                    print "pass 1"
+                    unmatched.long_type_sample()  # this must be done to finalize
+                    # obtain the type matching yoy
+                    self.yoy = unmatched.yoy    # this draws on initial balancing work
+                    self.wke_yoy100 =  unmatched.wke_yoy100
+                    self.wkd_yoy100 =  unmatched.wkd_yoy100
+                    self.yoy_100 = unmatched.yoy_100
+                    self.wke_yoy = unmatched.wke_yoy
+                    self.wkd_yoy = unmatched.wkd_yoy
+            except:
+                # print "The following reports caused an error in yoy_calc() ~ likely due to divide by 0:"
+                # print report_list
+                self.pooled_wk_rep = []
+                self.prior_yr = np.nan
+                self.current_yr = np.nan
+                self.yoy = np.nan
+                self.wke_yoy100 = np.nan
+                self.wkd_yoy100 = np.nan
+                self.yoy_100 = np.nan
+                self.wke_yoy = np.nan
+                self.wkd_yoy = np.nan
+            # ----------------------------------------------------------
         # (4) need to get the following stats into Metrics_Log.xlsx (using an alternative method):
         """
         1) start_date.week
@@ -974,15 +869,90 @@ class quant_metrics:
         print "end date to be passed to write_data():"
         print end_date
         """
-        self.f_wk = end_date.week
-        self.f_wrk_wk = get_week_of_month(end_date)  # this number is a work week (like in __Init__)
+        self.f_wk = self.calendar.week(end_date)
+        self.f_wrk_wk = self.calendar.work_week(end_date)  # this number is a work week (like in __Init__)
         self.f_mo = end_date.date().month
         self.f_yr = end_date.date().year
-        self.f_time0 = np.string0(self.f_yr) + "-" + np.string0(self.f_mo) + "-" + \
-                       np.string0(self.f_wrk_wk)
+        self.f_time0 = self.calendar.period_id(end_date)
+
+    #-----------------------------#
+    def ticker_window_sums(self, ticker):
+        """
+        Purpose: the window_sums grid of a ticker (see rsm_tools/window_sums.py), built on first use. Only the grid
+        of the most recent ticker is kept: full_rehash() evaluates one ticker at a time.
+        :return: a window_sums, or None if the ticker's Cars/Spaces are not integer-valued (metric_calc() then
+        pools the reports)
+        """
+        if self.window_grid[0] != ticker:
+            with stage_profiler.stage(self.profiler, 'window_sums_build', ticker):
+                self.window_grid = (ticker, window_sums.build(self.report_store, self.report_index.sorted_reports(),
+                                                              ticker))
+        return self.window_grid[1]
+
+    #-----------------------------#
+    def window_end(self, date_start):
+        """
+        Purpose: the look-back end date of the window starting at date_start (see metric_calc()). The window pools
+        the reports dated before this date.
+        :param date_start: a window start date (Timestamp(''))
+        :return: a Timestamp('')
+        """
+        # Important: start_date may be 12/31/YYYY. If it is, shift this by 1 day.
+        if date_start == pd.to_datetime(str(1231) + str(date_start.date().year)[2:]):
+            date_start = date_start + timedelta(days=(1))
+        return date_start + timedelta(days=7 * (wk_window))
+
+    #-----------------------------#
+    def window_monday(self, date_start):
+        """
+        Purpose: the Monday that metric_calc()/write_data() attach to the window starting at date_start, i.e. the
+        Monday of the week of the look-back end date. This is the 'date' of the window's row in Metrics_Log.
+        :param date_start: a window start date (Timestamp(''))
+        :return: a Timestamp('') Monday
+        """
+        return self.calendar.monday(self.window_end(date_start))
+
+    #-----------------------------#
+    def rehash_windows(self, date_interval):
+        """
+        Purpose:
+        Subdivides [self.first_period, self.last_period] into the date intervals that full_rehash() evaluates.
+        The windows only depend on the report dates, so they are computed once per date_interval and shared by
+        all tickers (and by the incremental mode of ticker_stitch(), which resumes part-way through the list).
+
+        Stopping rule: the windows end with the last window whose Monday (see window_monday()) is not after
+        self.last_period. Signals must not be populated for dates that haven't actually yet occurred.
+
+        :param date_interval: the number of weeks between consecutive window starts
+        :return: a list of (date_start, date_end) tuples
+        """
+        if date_interval in self.rehash_window_cache:
+            return self.rehash_window_cache[date_interval]
+        windows = []
+        # (1) the first window starts one week before the week-Monday of first_period, but never before 01/01 of
+        # first_period's year: periods must not overlap years (see week_calendar.first_window_start())
+        date_start = self.calendar.first_window_start(self.first_period)
+
+        # (2) identify the Monday that is associated with last_period and loop until date_start passes it
+        last_date = self.calendar.monday(self.last_period)
+        # in the following loop, date_start is endogenous (date_start = date_end)
+        while date_start <= last_date:
+            # (2a) the window end: date_interval weeks later, moved to a Monday and capped at 12/31 of date_start's
+            # year (see week_calendar.window_end() for the year-boundary heuristics)
+            date_end = self.calendar.window_end(date_start, date_interval)
+
+            # (2b) the window is evaluated unless its Monday falls after the most recent report
+            if self.window_monday(date_start) > self.last_period:
+                break
+            windows.append((date_start, date_end))
+            # start_date will now be whatever date_end was, unless date_end was 12/31/YYYY
+            date_start = date_end
+
+        self.rehash_window_cache[date_interval] = windows
+        return windows
 
     #-----------------------------#
-    def full_rehash(self, ticker, date_interval, apply_balancing = False):
+    def full_rehash(self, ticker, date_interval, apply_balancing = False, resume_from=None):
         """
         Purpose:
         Subdivides the directory's weekly reports into 2 week segments (using the earliest report and the
@@ -1002,182 +972,160 @@ class quant_metrics:
         Normal updates to Metrics_Log.xlsx should never invoke full_rehash(), but rather only invoke metrics_calc()
         (therefore implicitly also invoking write_data()) using self.time0, self.r_prev_wk_monday, and self.last_period
 
+        :param resume_from: (optional) skip all windows that start before this date. Used by the incremental mode
+        of ticker_stitch(), where self.ticker_df only holds the rows written before resume_from.
         :return: a fully populated Metrics_Log.xlsx file
         """
-        self.stop_metric = False
-        # (1) take first_date from __init__, and identify the 2nd week-monday from this starting point,
-        # if there are 1+ reports within this date range, invoke metric_calc
-        date_start = self.first_period
-        wk = date_start.week
-        yr = date_start.date().year
-        # obtain the monday for this date:
-        d_str = np.string0(yr) + "-" + "W" + np.string0(wk)
-        monday_date_start = pd.to_datetime(datetime.datetime.strptime(d_str + '-1', "%Y-W%W-%w"))
-        """
-        Critical: in some calendar weeks, the identified Monday date is after the first_period. We don't want to
-        leave out any reports - even the first report in the database - so the 1st date range will use a -1 week
-        offset on monday_date_start.
-        """
-        monday_date_start = monday_date_start - timedelta(days=(7*(1)))
-        # note: it is possible that a report in Jan 1 YYYY would then be adjusted to December...
-        #   (1a) if the 1st week-monday is in a different year, then set 1st week-monday to 1/1/YYYY
-
-        ####################################################################################################
-        # Intuition: do not want periods to overlap years because WANT TO AVOID A DATASET THAT HAS MORE    #
-        # THAN 2 YEARS (ONLY WANT A PY AND CY YEAR!!!)                                                     #
-        ####################################################################################################
-
-        if monday_date_start.date().year < date_start.date().year:
-            # create a timestamp for 1/1/YYYY
-            # For example: date_start could be 01/02 and the Monday for that is 12/28. Want a LOWER BOUND date.
-            ts_str = '0101' + str(yr)[2:]
-            # override date_start
-            date_start = pd.to_datetime(ts_str)
+        # write_data() upserts into an indexed copy of self.ticker_df, which is exported once after the last window
+        self.ticker_table = None
+        # (1) the date intervals: [date_start, date_end] windows from the first to the last report (see
+        # rehash_windows())
+        for date_start, date_end in self.rehash_windows(date_interval):
+            if resume_from is not None and date_start < resume_from:
+                continue
+            # (2) given date_start and date_end, invoke metric_calc()
+            self.metric_calc(ticker, start_date=date_start, end_date=date_end, apply_balancing=apply_balancing,
+                             use_window_sums=True)
+            # (3) after metric_calc() is invoked, then invoke write_data()
+            """
+            Important:
+            Since the time stamp is based on start date + week offset, signals will be populated for dates that
+            occur after the most recent report start date + week offset = end date. To prevent write_data() from 
+            being called when hitting the start date (-) week offset, use a boolean check (see rehash_windows()).
+            
+            Note:
+            self.f_wk = end_date.week
+            self.f_wrk_wk = get_week_of_month(end_date)  # this number is a work week (like in __Init__)
+            self.f_mo = end_date.date().month
+            self.f_yr = end_date.date().year
+            """
+            self.write_data(ticker, materialize=False)
+        if self.ticker_table is not None:
+            self.ticker_df = self.ticker_table.to_frame()
+            self.ticker_table = None
+
+    #-----------------------------#
+    def bootstrap_log_store(self, ticker, date_interval, apply_balancing=False):
+        """
+        Purpose: seed self.log_store with a ticker's rows from Metrics_Log.xlsx. If the workbook has no rows for the
+        ticker, the ticker is fully rehashed (and stored) instead.
+
+        The workbook does not record which reports went into it, so the date of the ticker's last row is used as
+        the last processed report: incremental_update() recomputes every window that pools reports from after it.
+
+        :return: the ticker's high-water mark, or None if the ticker was fully rehashed here
+        """
+        metrics_log = self.load_metrics_log()
+        rows = metrics_log[metrics_log['ticker'] == ticker]
+        if len(rows) == 0:
+            self.ticker_df = rows
+            self.full_rehash(ticker, date_interval, apply_balancing=apply_balancing)
+            self.calc_signal_rsm(self.ticker_df, signal_stdh, signal_window, signal_block_off)
+            self.log_store.reset(ticker, self.ticker_df, self.last_period, date_interval)
+            return None
+        rows = rows.sort_values('evaluation_id').reset_index(drop=True)
+        self.log_store.reset(ticker, rows, pd.to_datetime(rows['date']).max(), date_interval)
+        return self.log_store.high_water_mark(ticker)
+
+    #-----------------------------#
+    def incremental_update(self, ticker, date_interval, apply_balancing=False):
+        """
+        Purpose:
+        Bring a ticker's series in the columnar log store (self.log_store) up to date with the weekly reports.
+        Only the windows that can have changed since the last run are evaluated.
+
+        Method:
+        1) a window pools the reports dated before its look-back end date (see window_end()). The windows up to the
+        first one that extends past the last report of the previous run (last_report of the high-water mark) are
+        final; that window and every window after it are recomputed.
+        2) the stored rows of the recomputed windows are dropped and full_rehash() resumes from the first recomputed
+        window, on top of the look-back rows right before it (self.ticker_df), so evaluation_id continues exactly
+        as it would in a full rehash.
+        3) signals are recomputed for the new rows only (the look-back rows supply the rolling window), and the new
+        rows are appended to the store.
+        4) the first max(signal_window + 1, signal_block_off) rows of the series are rewritten as well: their signals
+        come from a slice that wraps around to the end of the series (see signal_engine.head_signals()), so they
+        change whenever the series grows.
+
+        A ticker that is not in the store yet (or was stored with another date_interval) is bootstrapped first,
+        see bootstrap_log_store().
+
+        :return: self.ticker_df holds the look-back rows and the new rows of the ticker
+        """
+        mark = self.log_store.high_water_mark(ticker)
+        if mark is None or mark['date_interval'] != date_interval:
+            mark = self.bootstrap_log_store(ticker, date_interval, apply_balancing=apply_balancing)
+            if mark is None:
+                return
+
+        # (1) identify the first window that pools reports from after the last processed report
+        windows = self.rehash_windows(date_interval)
+        last_report = pd.to_datetime(mark['last_report'])
+        k = 0
+        while k < len(windows) and self.window_end(windows[k][0]) <= last_report:
+            k += 1
+        # a window whose Monday equals the previous window's Monday overrides that window's row in write_data();
+        # recompute both
+        while 0 < k < len(windows) and self.window_monday(windows[k - 1][0]) == self.window_monday(windows[k][0]):
+            k -= 1
+        if k == len(windows):
+            # nothing to recompute
+            self.ticker_df = pd.DataFrame()
+            self.log_store.append(ticker, self.ticker_df, self.last_period, date_interval)
+            return
+        resume_from = windows[k][0]
+
+        # (2) load the look-back rows before the first recomputed window, then resume full_rehash() from there
+        lookback = signal_window + 1 + max(signal_window + 1, signal_block_off)
+        cut_date = self.window_monday(resume_from).date()
+        tail = self.log_store.tail(ticker, cut_date, lookback)
+        self.ticker_df = tail[[d < cut_date for d in tail['date']]].reset_index(drop=True)
+        if len(self.ticker_df) > 0:
+            last_kept = int(self.ticker_df['evaluation_id'].iloc[-1])
+            position_offset = int(self.ticker_df['evaluation_id'].iloc[0]) - 1
         else:
-            # override date_start
-            date_start = monday_date_start
-
-        # (4) Begin a loop. date_start has been initialized. Determine date_end in loop body.
-        # loop until date_end > self.last_period
-        day_offset = (7*(wk_window))
-        # identify the Monday that is associated with last_period
-        last_yr = self.last_period.date().year
-        last_wk = self.last_period.week
-        last_exp = np.string0(last_yr) + "-" + "W" + np.string0(last_wk)
-        last_date = pd.to_datetime(datetime.datetime.strptime(last_exp + '-1', "%Y-W%W-%w"))
-        # in the following loop, date_start is endogenous (date_start = date_end)
-        while date_start  <= last_date:
-            if self.stop_metric == True:
-                break
+            last_kept = 0
+            position_offset = 0
+        self.full_rehash(ticker, date_interval, apply_balancing=apply_balancing, resume_from=resume_from)
+
+        # (3) signals of the new rows, then append them to the store
+        self.ticker_df['signal'] = signal_engine.rolling_signals(self.ticker_df, signal_stdh, signal_window,
+                                                                 signal_block_off, by='ticker',
+                                                                 position_offset=position_offset)
+        new_rows = self.ticker_df[self.ticker_df['evaluation_id'] > last_kept]
+
+        # (4) the signals of the first rows of the series
+        head = min(max(signal_window + 1, signal_block_off), last_kept)
+        if len(new_rows) > 0 and head > 0:
+            if position_offset == 0:
+                # the look-back rows start at the first row, their signals are exact already
+                first_rows = self.ticker_df[self.ticker_df['evaluation_id'] <= head]
             else:
-                #   (1b) generate the date_end, which is equal to an offset of days equal to date_interval
-                date_end = date_start + timedelta(days=7*(date_interval))
-                """
-                Now, the +7th day will always be a Monday, unless the date has been reset to 01/01/YYYY, which
-                means that the +7th day from 01/01/YYYY might be a day other than Monday.
-                That 7th day is a Sunday (07/01/2017) in 2017 for instance.
-                date_end, which is always based on date_start starting at 01/01/YYYY, must be a Monday.
-    
-                The algorithm identifies this Monday by looking (a) looking at the week of the year 01/01/YYYY falls in
-                and then assigning the Monday of that week. Unfortunately, sometimes that week is from the following year,
-                and the corresponding Monday might just be the 2nd day of the following year.
-    
-                If 01/01 falls on the 52/53 week of the preceding year, which happens with
-                01/01/2016 (it's the 53rd week of 2015). The date-creator(week, month) constructs a date using
-                the logic of the 53rd week of year=2016. The Monday of that week is 01/02/2017.
-    
-                To prevent this confusion, we use the following HEURISTIC:
-                a) if the week is not equal to 1, there will be a year discrepancy to the output.
-                b) simply subtract 1 year from the output year
-                """
-                #   (1c) obtain the week and year and identify the correct Monday
-                e_wk = date_end.week
-                e_yr = date_end.date().year
-                e_str = np.string0(e_yr) + "-" + "W" + np.string0(e_wk)
-                """
-                Because week is in the monday constructor, week=52 in Dec. would return 12/2016 and not 12/2015!
-                """
-                monday_date_end = pd.to_datetime(datetime.datetime.strptime(e_str + '-1', "%Y-W%W-%w"))
-                """
-                For some years, like the Monday of 07/27/15, the Monday date constructor above will actually
-                return the subsequent Monday (contrary to 01/18/16). Therefore, ensure that if monday_date_end
-                is greater than date_end, to just subtract 1 week from monday_date_end.
-                
-                By doing this, if we have a 01/01/YYYY start date, we may reset the end-date-Monday to a date
-                after the original computation of end_date. Hence, rule this out by just testing if there's
-                an exact 1 week difference.
-                """
-
-                if int((monday_date_end - date_end).days) == 7:
-                    monday_date_end = monday_date_end - timedelta(days=7)
-
-                if monday_date_end.date().year != e_yr:     # fix for monday-constructor-type error
-                    # prepare a new date string expression:
-                    adj_yr = monday_date_end.date().year
-                    adj_day = monday_date_end.date().day
-                    adj_mo = monday_date_end.date().month
-                    str_adj_day = str(monday_date_end.date().day)
-                    str_adj_mo = str(monday_date_end.date().month)
-                    # if the day and/or month are less than 10, add a 0 to the the input expression
-                    if adj_day < 10:
-                        str_adj_day = str(0) + str_adj_day
-                    if adj_mo < 10:
-                        str_adj_mo = str(0) + str_adj_mo
-                    adj_str = str(str_adj_day) + str(str_adj_mo) + str(adj_yr - 1)[2:]
-
-                    # Apply the date heuristic:
-                    date_end = pd.to_datetime(adj_str)
-                else:
-                    date_end = monday_date_end
+                first_rows = self.log_store.head(ticker, head)
+                # the series, with only its head and tail filled in (all that head_signals() reads)
+                yoy = np.empty(int(new_rows['evaluation_id'].iloc[-1]))
+                yoy[:] = np.nan
+                for rows in (first_rows, self.ticker_df):
+                    yoy[rows['evaluation_id'].values.astype(np.int64) - 1] = rows['yoy_change'].values
+                first_rows['signal'] = signal_engine.head_signals(yoy, signal_stdh, signal_window,
+                                                                  signal_block_off)[:len(first_rows)]
+            new_rows = pd.concat([first_rows, new_rows], sort=False)
+        self.log_store.append(ticker, new_rows, self.last_period, date_interval)
 
-                """
-                Now after doing a lap of end_dates throughout the year. The end_date may spill over to the following year.
-                We always want the last date of a year to be the 31st, so terminate date_end at 12/31.
-                """
-                #   (1d) if the 2nd week-monday is in a different year than date_start, then set 2nd week-monday to 12/31/YYYY
-                # Intuition: as before, we cannot have a data-set that has 2+ years under 'Year'
-                if date_end.date().year > date_start.date().year:
-                    """
-                    Infinite loop prevention: date_start may equal 12/31. To prevent UPPER BOUND capping to stay stuck
-                    on 12/31, need to evaluate if date_start is already 12/31. If it is not, then run UPPER CAPPING.
-                    Otherwise, pass.
-                    """
-                    if date_start == pd.to_datetime(str(1231) + str(date_start.date().year)[2:]):
-                        # date_start is ALREADY currently 12/31. Do not change date_end to 12/31!
-                        pass
-                    else:
-                        # if date_start is anything else, it must be BEFORE 12/31!
-                        # create a timestamp for 12/31/YYYY
-                        # For example, date end could be in 01/02 when date_start is 12/27. Want an UPPER BOUND limit on date.
-                        ts_str = str(1231) + str(date_start.date().year)[2:]
-                        # sd_str = '0101' + str(date_end.date().year + 1)[2:]
-                        # override date_end
-                        date_end = pd.to_datetime(ts_str)
-                        # date_start = pd.to_datetime(sd_str)
-
-                # (2) given date_start and date_end, invoke metric_calc()
-                self.metric_calc(ticker, start_date=date_start, end_date=date_end, apply_balancing=apply_balancing)
-                # (3) after metric_calc() is invoked, then invoke write_data()
-                """
-                Important:
-                Since the time stamp is based on start date + week offset, signals will be populated for dates that
-                occur after the most recent report start date + week offset = end date. To prevent write_data() from 
-                being called when hitting the start date (-) week offset, use a boolean check (see line 738).
-                
-                Note:
-                self.f_wk = end_date.week
-                self.f_wrk_wk = get_week_of_month(end_date)  # this number is a work week (like in __Init__)
-                self.f_mo = end_date.date().month
-                self.f_yr = end_date.date().year
-                """
-                if pd.to_datetime(datetime.datetime.strptime(np.string0(self.f_yr) + "-" + "W" + \
-                                                            np.string0(self.f_wk) + '-1', "%Y-W%W-%w")) > \
-                                                            self.last_period:
-                    date_start = date_end
-                    self.stop_metric = True
-                    continue
-                    # break
-                else:
-                    self.write_data(ticker)
-                    # start_date will now be whatever date_end was, unless date_end was 12/31/YYYY
-                    """
-                    metric_calc() is responsible for the date interval span in the final dataset!
-                    1) There is a parameter (i > 0) that indicates what this interval is.
-                    2) It is possible that any date arithmetic performed on date_end (say 7 days) 
-                    may yield a date_start that is BEFORE the PREVIOUS value of date_start.
-                    3) an if statement should be written to determine if date_end < date_start,
-                    where date_start here is the start-loop value. It should also be determined
-                    if date_end - date_start < 7. If this is true, it must be true that date_end
-                    hit the UPPER BOUND LIMIT 12/31/YYYY. When the second condition is true, the
-                    first is always true.
-                    """
-                    date_start = date_end
-                    """
-                    if int((date_end - date_start).days) < 7:
-                        date_start = date_end
-                    else:
-                        date_start = date_start + timedelta(days=7*(date_interval))
-                    """
+    #-----------------------------#
+    def parallel_rehash(self, date_interval, apply_balancing, workers):
+        """
+        Purpose: run full_rehash() for every ticker in self.ticker_list in a pool of worker processes.
+        The reports are parsed into the report cache first, so the workers share the memory-mapped arrays instead
+        of parsing (or receiving pickled copies of) the reports themselves.
+        :return: a dictionary of ticker -> ticker_df
+        """
+        self.pooling_store(apply_balancing).warm(self.weekly_reports)
+        metrics_log = self.load_metrics_log()
+        ticker_frames = [(ticker_id, metrics_log[metrics_log['ticker'] == ticker_id])
+                         for ticker_id in self.ticker_list]
+        return ticker_pool.rehash_tickers(os.path.abspath(__file__), self.directory, ticker_frames, date_interval,
+                                          apply_balancing, workers, class_name=self.__class__.__name__)
 
     #-------------------------------
     def calc_signal_rsm(self, element, stdh, window, block_off):
@@ -1190,53 +1138,21 @@ class quant_metrics:
             iv) compare the current week (with some lookback period equal to window_wk in the algo above)
             to the standard deviations computed in iv. Determine the corresponding signal
            
-        :param element: a pd df of yoy's for a particular ticker 
+        :param element: a pd df of yoy's, either a single ticker or the stitched panel of all tickers (grouped by 'ticker')
         :param stdh: the desired multiplier to stdev
         :param window: the number of preceding periods to use in a window with summary statistic attributes
+        :param block_off: the number of most recent periods to leave out of the window
         :return: an updated pd df
         """
 
-        for i, row in element.iterrows():
-            # check if yoy_change is not NA
-            if np.isnan(row['yoy_change']) == True:
-                # signal must not be n/a. Set to 0
-                element.loc[element.evaluation_id == int(i + 1), 'signal'] = 0
-                continue
-            # check if the evaluation row's window contains a start value
-            elif row.name - (row.name - window) < 0:
-                # signal must not be n/a. Set to 0
-                element.loc[element.evaluation_id == int(i + 1), 'signal'] = 0
-                continue
-            else:
-                # compute the signal
-                # (a) identify the eid for this row
-                id = row['evaluation_id']
-                # (b) take the yoy_change subset over the window interval
-                subset = element['yoy_change'].iloc[(i - window - 1): i - block_off]
-                # (c) remove any NA values in this subset
-                subset = subset.dropna()
-                # (d) take the average of this subset
-                mean = subset.mean()
-                # (e) calculate the standard deviation and the hurdles
-                stdd = subset.std()
-                stdh_u = mean + stdd * stdh
-                stdh_l = mean - stdd * stdh
-                # (f) evaluate what the signal should be
-                if row['yoy_change'] > stdh_u:
-                    signal = 1
-                elif row['yoy_change'] < stdh_l:
-                    signal = -1
-                else:
-                    signal = 0
-                # print "signal:"
-                # print signal
-                # (g) update the signal for this row
-                # print element.loc[element.evaluation_id == int(i+1)]
-                element.loc[element.evaluation_id == int(i+1), 'signal'] = signal
+        # the original row loop is kept as signal_engine.reference_signals() (python -m rsm_tools.signal_engine
+        # checks the two against each other)
+        element['signal'] = signal_engine.rolling_signals(element, stdh, window, block_off, by='ticker')
 
     #-------------------------------------------------------------
 
-    def ticker_stitch(self, rehash=False, date_interval=1, balance=False):
+    def ticker_stitch(self, rehash=False, date_interval=1, balance=False, incremental=False, export_xlsx=True,
+                      workers=1):
         """
         Purpose:
         Create a time panel dataset of tickers with their YoY's calculated. 
@@ -1259,24 +1175,52 @@ class quant_metrics:
         
         - historical report generation also yields an update to the metrics_log. Each output
         for each ticker calls the override process.
-        
+
+        Incremental mode (incremental=True):
+        - each ticker's series lives in the columnar log store (self.log_store). Only the windows since the
+        ticker's high-water mark are evaluated and only the new rows get their signals recomputed (see
+        incremental_update()). A weekly update therefore costs a few windows per ticker instead of the whole history.
+        - Metrics_Log.xlsx is only read to bootstrap tickers that are not in the store yet, and it is only
+        rewritten (from the store) if export_xlsx is True.
+        - a full rehash (rehash=True) also resets the store, so that later incremental runs pick up from it.
+
+        Parallel full rehash (rehash=True, workers > 1):
+        - the tickers are fanned out to a pool of worker processes (see parallel_rehash()).
+
+        :param export_xlsx: (optional) write the panel to Metrics_Log.xlsx
+        :param workers: (optional) the number of worker processes for a full rehash
         :return: a time panel dataset of ticker YoY's
         """
+        # (0) parallel full rehash: all tickers are rehashed up front by a process pool
+        rehashed = {}
+        if rehash and not incremental and workers > 1:
+            rehashed = self.parallel_rehash(date_interval, balance, workers)
+
         # (1) begin looping through all elements of self.ticker_list
         for ticker_id in self.ticker_list:
+            if ticker_id in rehashed:
+                self.dict_collate[ticker_id] = rehashed[ticker_id]
+                continue
 
             ####################################################
             # Create a holding array for this specific ticker! #
             ####################################################
             print "==================================================================="
             print "Current evaluation ticker is: %s" % (ticker_id)
+            if self.profiler is not None:
+                self.profiler.current_ticker = ticker_id
 
             # self.ticker_df will hold all writes performed for a ticker in write_data()
-            self.ticker_df = self.metrics_log[self.metrics_log['ticker'] == ticker_id]
+            if not incremental:
+                metrics_log = self.load_metrics_log()
+                self.ticker_df = metrics_log[metrics_log['ticker'] == ticker_id]
 
+            # if incremental=True, only evaluate the windows since the ticker's high-water mark,
             # if rehash=True, invoke full_rehash(metric_calc(), write_data()),
             # else invoke metric_calc() and write_data()
-            if rehash:
+            if incremental:
+                self.incremental_update(ticker_id, date_interval, apply_balancing=balance)
+            elif rehash:
                 self.full_rehash(ticker_id, date_interval, apply_balancing=balance)
             # Single Updates, rehash=False
             else:   # for updates using Monday date intervals from _init_
@@ -1301,14 +1245,30 @@ class quant_metrics:
             # Update self.dict_collate
             self.dict_collate[ticker_id] = self.ticker_df
 
-        # (2) calculate signals for each element in self.dict_collate
-        for element in self.dict_collate:
-            # (element, standard deviation hurdle, period window (6 periods is 3 months)
-            self.calc_signal_rsm(self.dict_collate[element], 0.75, 12, 0)
-
-        # (3) self.dict_collate is now ready for collation:
+        # in incremental mode the signals of the new rows were calculated in incremental_update(). The log store
+        # holds the panel; Metrics_Log.xlsx is only exported on demand
+        if self.profiler is not None:
+            self.profiler.current_ticker = None
+        if incremental:
+            if export_xlsx:
+                with stage_profiler.stage(self.profiler, 'to_excel'):
+                    self.log_store.export_xlsx(self.cd + "/Metrics_Log" + ".xlsx", self.ticker_list)
+            self.profile_report()
+            return
+
+        # (2) self.dict_collate is now ready for collation:
         total_collation = pd.concat([self.dict_collate[ticker_id] for ticker_id in self.dict_collate])
 
+        # (3) calculate signals for all tickers in one grouped pass over the stitched panel
+        # (panel, standard deviation hurdle, period window (6 periods is 3 months), block_off)
+        self.calc_signal_rsm(total_collation, signal_stdh, signal_window, signal_block_off)
+
+        # a full rehash replaces the tickers' series in the log store (see incremental_update())
+        if rehash:
+            for ticker_id in self.dict_collate:
+                self.log_store.reset(ticker_id, total_collation[total_collation['ticker'] == ticker_id],
+                                     self.last_period, date_interval)
+
         # (4):
         """
         Notes:
@@ -1323,7 +1283,10 @@ class quant_metrics:
         Hence, write_data() for attribute arguments passed from _init_ will simply update subsets of metrics_log.
         These updated subsets will be stitched together within the list comprehension for total_collation.
         """
-        total_collation.to_excel(self.cd + "/Metrics_Log" + ".xlsx", encoding='utf-8')
+        if export_xlsx:
+            with stage_profiler.stage(self.profiler, 'to_excel', rows=len(total_collation)):
+                total_collation.to_excel(self.cd + "/Metrics_Log" + ".xlsx", encoding='utf-8')
+        self.profile_report()
 
 # END MODULE
 # -------------------------------------------------------------
\ No newline at end of file